@@ -0,0 +1,69 @@
+"""
+Scaling of the surplus/deficit area computation (category_area_highlight).
+
+Usage:
+    python -m benchmarks.diff_area [--sizes 1000 10000 100000 1000000] [--repeat 3]
+
+Times the crossover kernel alone and the whole diff-area pipeline (filter,
+align, crossings, grouping) on two random-walk series that cross often.
+The per-point cost should stay flat as the series grow.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from components.line.chart import _crossover_kernel, _diff_area_df
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_REPEAT = 3
+SEED = 0
+
+
+def make_frame(n_points: int, seed: int = SEED) -> pd.DataFrame:
+    """Long frame with two crossing series ('A', 'B') plus a third one that is filtered out."""
+    rng = np.random.default_rng(seed)
+    x = pd.date_range('2000-01-01', periods=n_points, freq='min')
+    frames = [
+        pd.DataFrame({'x': x, 'y': rng.normal(size=n_points).cumsum(), 'category': category, 'type': 'Actual'})
+        for category in ('A', 'B', 'C')
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    config = {'x_field': 'x', 'y_field': 'y', 'category_field': 'category'}
+    print(f"{'points':>10} {'crossings':>10} {'kernel ms':>10} {'ns/point':>9} {'pipeline ms':>12} {'ns/point':>9}")
+    for n_points in args.sizes:
+        df = make_frame(n_points)
+        pair = df[df['category'] != 'C']
+        wide = pair.pivot(index='x', columns='category', values='y')
+        x, a, b = wide.index.asi8, wide['A'].to_numpy(), wide['B'].to_numpy()
+
+        kernel = best_time(lambda: _crossover_kernel(x, a, b), args.repeat)
+        pipeline = best_time(lambda: _diff_area_df(df, config, ['A', 'B'], forecast=True), args.repeat)
+        crossings = (len(_crossover_kernel(x, a, b)[0]) - n_points) // 2
+        print(
+            f"{n_points:>10,} {crossings:>10,} {kernel * 1e3:>10.1f} {kernel / n_points * 1e9:>9.0f}"
+            f" {pipeline * 1e3:>12.1f} {pipeline / n_points * 1e9:>9.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
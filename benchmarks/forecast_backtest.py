@@ -0,0 +1,126 @@
+"""
+Rolling-origin backtest of forecast engines over every dashboard series.
+
+Usage:
+    python -m benchmarks.forecast_backtest [--horizon 6] [--origins 4] [--engines prophet holt]
+
+Each run appends one row per (chart, category, engine, settings) to the
+results CSV, stamped with the run time, so defaults can be chosen per chart
+(config['forecast_engine']) and regressions tracked across runs.
+"""
+
+import argparse
+import json
+import logging
+import os
+import warnings
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from components.bar.forecast import _convert_to_datetime, _infer_frequency
+from utils.backtesting import DEFAULT_HORIZON, DEFAULT_ORIGINS, backtest_series
+from utils.chart_loader import resolve_df
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'forecast_backtest.csv')
+
+# (engine, settings) pairs evaluated on every series
+CANDIDATES = [
+    ('prophet', {}),
+    ('prophet', {'n_changepoints': 5}),
+    ('prophet', {'yearly_seasonality': False}),
+    ('holt', {}),
+    ('drift', {}),
+    ('seasonal_naive', {}),
+]
+
+
+def iter_chart_configs(configs: list):
+    """Yield every line/bar chart config with its df resolved, flattening column layouts."""
+    for tab in configs:
+        for item in tab['items']:
+            for chart in item.get('columns', [item]):
+                if chart.get('type') in ('line', 'bar'):
+                    resolve_df(chart)  # Cube and pipeline charts have no df until then
+                    yield chart
+
+
+def iter_series(chart: dict):
+    """Yield (category, ds, y, freq) for each forecastable series of a chart."""
+    df = chart['df']
+    x_field, y_field = chart['x_field'], chart['y_field']
+    try:
+        ds = _convert_to_datetime(df[x_field])
+    except (ValueError, TypeError):
+        return  # categorical x-axis: nothing to forecast
+    frame = pd.DataFrame({'ds': pd.to_datetime(ds), 'y': df[y_field].to_numpy()})
+    category_field = chart.get('category_field')
+    groups = frame.groupby(df[category_field].to_numpy()) if category_field else [(None, frame)]
+    for category, series in groups:
+        if len(series) < 3:
+            continue  # too short to infer a frequency, let alone backtest
+        series = series.sort_values('ds')
+        yield category, series['ds'], series['y'].to_numpy(), _infer_frequency(series['ds'])
+
+
+def run(candidates: list, horizon: int, n_origins: int, measure_memory: bool) -> pd.DataFrame:
+    from streamlit_app import all_configs
+
+    run_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    rows = []
+    seen = set()
+    for chart in iter_chart_configs(all_configs):
+        for category, ds, y, freq in iter_series(chart):
+            series_id = (chart['title'], chart['y_field'], category, len(y))
+            if series_id in seen:
+                continue  # the docs tab reuses sample datasets across charts
+            seen.add(series_id)
+            for engine, settings in candidates:
+                metrics = backtest_series(ds, y, freq, engine, settings, horizon, n_origins, measure_memory)
+                if metrics is None:
+                    continue
+                rows.append({
+                    'run_at': run_at,
+                    'chart': chart['title'],
+                    'y_field': chart['y_field'],
+                    'category': category,
+                    'freq': freq,
+                    'engine': engine,
+                    'settings': json.dumps(settings, sort_keys=True),
+                    **metrics,
+                })
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON)
+    parser.add_argument('--origins', type=int, default=DEFAULT_ORIGINS)
+    parser.add_argument('--engines', nargs='+', help='Only evaluate these engines')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    # Prophet and CmdStan are chatty; keep the report readable
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+    warnings.filterwarnings('ignore')
+
+    candidates = [c for c in CANDIDATES if not args.engines or c[0] in args.engines]
+    results = run(candidates, args.horizon, args.origins, not args.no_memory)
+    if results.empty:
+        print("No forecastable series found.")
+        return
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    results.to_csv(args.output, mode='a', header=not os.path.exists(args.output), index=False)
+
+    # Best candidate per series by MASE, with its cost
+    best = results.loc[results.groupby(['chart', 'category'], dropna=False)['mase'].idxmin()]
+    columns = ['chart', 'category', 'engine', 'settings', 'mase', 'mape', 'fit_seconds', 'peak_memory_mb']
+    print(best[columns].to_string(index=False))
+    print(f"\n{len(results)} rows appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Cost of assembling a line chart's plot frame as the number of series grows.
+
+Usage:
+    python -m benchmarks.plot_frame [--categories 1 10 100 1000] [--points 100] [--repeat 3]
+
+Builds actual rows (points per series) and a forecast of MAX_FORECAST_PERIODS
+steps per series, then times plot_frame: connector rows plus one concat of
+actual, forecast and connector rows. The time should grow with the number
+of rows, not with a per-series overhead.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from components.line.forecast import MAX_FORECAST_PERIODS, plot_frame
+
+DEFAULT_CATEGORIES = [1, 10, 100, 1_000]
+DEFAULT_POINTS = 100
+DEFAULT_REPEAT = 3
+SEED = 0
+
+
+def make_frames(n_categories: int, n_points: int, seed: int = SEED) -> tuple:
+    """(actual, forecast) frames with n_categories series of n_points and MAX_FORECAST_PERIODS rows."""
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"series {i:04d}" for i in range(n_categories)], dtype=object)
+    history = pd.date_range('2000-01-01', periods=n_points, freq='MS')
+    future = pd.date_range(history[-1], periods=MAX_FORECAST_PERIODS + 1, freq='MS')[1:]
+    actual = pd.DataFrame({
+        'x': np.tile(history, n_categories),
+        'y': rng.normal(size=n_categories * n_points),
+        'category': np.repeat(labels, n_points),
+    })
+    forecast = pd.DataFrame({
+        'x': np.tile(future, n_categories),
+        'y': rng.normal(size=n_categories * MAX_FORECAST_PERIODS),
+        'type': "Forecast",
+        'category': np.repeat(labels, MAX_FORECAST_PERIODS),
+    })
+    return actual, forecast
+
+
+def best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categories', type=int, nargs='+', default=DEFAULT_CATEGORIES)
+    parser.add_argument('--points', type=int, default=DEFAULT_POINTS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    print(f"{'series':>8} {'rows':>10} {'ms':>8} {'us/series':>10} {'ns/row':>8}")
+    for n_categories in args.categories:
+        actual, forecast = make_frames(n_categories, args.points)
+        elapsed = best_time(lambda: plot_frame(actual, forecast, 'x', 'y', 'category'), args.repeat)
+        rows = len(actual) + len(forecast) + 2 * n_categories
+        print(
+            f"{n_categories:>8,} {rows:>10,} {elapsed * 1e3:>8.1f}"
+            f" {elapsed / n_categories * 1e6:>10.1f} {elapsed / rows * 1e9:>8.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,12 @@
 import streamlit as st
 import pandas as pd
 
-from .chart import build_chart
+from utils.filters import filter_config
+from utils.large_data import chart_rows
+from utils.resample import select_granularity
+from utils.vega import cached_spec, spec_key
+
+from .chart import chart_spec
 
 
 def render_area_chart(config: dict) -> None:
@@ -15,15 +20,31 @@ def render_area_chart(config: dict) -> None:
             - title (str): Title of the chart.
             - description (str): Description or caption for the chart.
             - df (pd.DataFrame): DataFrame containing the data to plot.
+            - cube (dict, optional): Take df from the time-entry rollup cube instead: `utils.cube.query` keyword arguments (by, where, measures).
+            - pipeline (list, optional): Build df from the raw tables instead: source, filter, join, groupby/agg, resample and pivot steps (see `utils.pipeline`).
             - x_field (str): Name of the column to use for the x-axis (should be datetime or convertible).
             - y_field (str): Name of the column to use for the y-axis.
             - category_field (str): Name of the column for categorical grouping (required for stacking).
             - category_label (str, optional): Title of the column for categorical grouping.
+            - large_data (bool, optional): Aggregate rows per x value and category on the server before drawing (default: when df has more than 5,000 rows).
+            - aggregate (str, optional): Aggregation used in large-data mode and granularity rollups: 'sum', 'mean', 'median', 'min', 'max' or 'count' (default: 'sum').
+            - max_categories (int, optional): Keep the categories with the largest y total and fold the rest into one 'Other' series, per x value (default: all categories).
+            - granularity (bool | str, optional): Show a day/week/month/quarter/year selector that rolls the data up with `aggregate`; True starts at the data's own granularity, a level name at that level (default: False).
     """
     st.subheader(config['title'])
     st.caption(config['description'])
 
-    actual_df = config['df'].copy()
+    chart_key = f"area_chart_{id(config)}"
+
+    # Dashboard-wide date range and filters: later steps only see the rows they keep
+    config = filter_config(config)
+
+    # Coarser time granularity picked by the viewer: charted from a rollup
+    level = select_granularity(config, chart_key)
+    if level:
+        config = {**config, 'granularity_level': level}
+
+    actual_df = chart_rows(config['df'], config).copy()
     x_field = config['x_field']
     category_field = config.get('category_field')
 
@@ -38,9 +59,9 @@ def render_area_chart(config: dict) -> None:
         except (ValueError, TypeError):
             pass
 
-    # Build and display chart
-    chart = build_chart(actual_df, config)
-    st.altair_chart(chart, use_container_width=True)
+    # Build (or reuse) and display chart
+    spec = cached_spec(spec_key(__name__, actual_df, config), lambda: chart_spec(actual_df, config))
+    st.vega_lite_chart(spec, use_container_width=True)
 
 
 __all__ = ['render_area_chart']
@@ -1,8 +1,18 @@
-"""Chart building logic for stacked area charts"""
+"""Chart building logic for stacked area charts
+
+Stacking happens on the server: rows are summed per x value and category,
+missing combinations count as zero (as Vega-Lite imputes them), and each
+band's bottom and top (STACK_START, STACK_END) come from cumulative sums
+across categories. The spec draws plain y/y2 areas, with no stack or
+impute transform left for the browser.
+"""
 
 import altair as alt
+import numpy as np
 import pandas as pd
 
+from utils.vega import template_spec
+
 
 # Area chart styling
 AREA_COLOR_SCHEME = "tableau20"
@@ -10,13 +20,69 @@ AREA_SINGLE_COLOR = "#0b7dcfff"
 AREA_OPACITY = 0.7
 AREA_INTERPOLATE = "monotone"  # Makes area edges smoother and more rounded
 
+# Named datasets the spec reads; their frames come from chart_data
+MAIN_DATA = "main"
+REFERENCE_DATA = "reference"
+
+# Band bounds computed by _stack_frame
+STACK_START = "y0"
+STACK_END = "y1"
+
+
+def chart_spec(plot_df: pd.DataFrame, config: dict) -> dict:
+    """Vega-Lite dict for the chart: its cached template filled with this data."""
+    datasets = chart_data(plot_df, config)
+    variant = {'datasets': sorted(datasets)}
+    return template_spec(__name__, config, variant, datasets, lambda: build_chart(variant, config))
+
+
+def chart_data(plot_df: pd.DataFrame, config: dict) -> dict:
+    """Frames behind each named dataset of the chart."""
+    datasets = {MAIN_DATA: _stack_frame(plot_df, config)}
+    if 'reference_line' in config:
+        axis, value, _label = config['reference_line']
+        datasets[REFERENCE_DATA] = pd.DataFrame({'y' if axis == 'y' else 'x': [value]})
+    return datasets
+
 
-def build_chart(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _stack_frame(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+    """
+    One row per x value and category with the band's bounds, stacked like Vega-Lite.
+
+    Categories stack in sorted order (the legend's), positive values upwards
+    from zero and negative values downwards.
+    """
+    x_field, y_field, category_field = config['x_field'], config['y_field'], config['category_field']
+    valid = df[[x_field, y_field, category_field]].dropna()
+    x_codes, x_values = pd.factorize(valid[x_field], sort=True)
+    category_codes, categories = pd.factorize(valid[category_field], sort=True)
+    n_x, n_categories = len(x_values), len(categories)
+
+    # Dense (x, category) grid of sums; absent combinations stay zero
+    values = np.bincount(
+        x_codes * n_categories + category_codes,
+        weights=valid[y_field].to_numpy(dtype=float),
+        minlength=n_x * n_categories,
+    ).reshape(n_x, n_categories)
+    upward = np.cumsum(np.where(values >= 0, values, 0), axis=1)
+    downward = np.cumsum(np.where(values < 0, values, 0), axis=1)
+    end = np.where(values >= 0, upward, downward)
+
+    return pd.DataFrame({
+        x_field: np.repeat(x_values, n_categories),
+        category_field: np.tile(np.asarray(categories, dtype=object), n_x),
+        y_field: values.ravel(),
+        STACK_START: (end - values).ravel(),
+        STACK_END: end.ravel(),
+    })
+
+
+def build_chart(variant: dict, config: dict) -> alt.Chart:
     """
     Build a stacked area chart using Altair.
 
     Args:
-        df (pd.DataFrame): DataFrame containing the data to plot.
+        variant (dict): Facts about the data that shape the spec (see chart_spec).
         config (dict): Configuration dictionary with chart settings.
 
     Returns:
@@ -30,10 +96,11 @@ def build_chart(df: pd.DataFrame, config: dict) -> alt.Chart:
     y_label = config.get('y_label', y_field)
     category_label = config.get('category_label', category_field)
 
-    # Base chart
-    base = alt.Chart(df).encode(
+    # Base chart: bands between precomputed stack bounds
+    base = alt.Chart(alt.NamedData(name=MAIN_DATA)).encode(
         x=alt.X(f'{x_field}:T', title=x_label),
-        y=alt.Y(f'{y_field}:Q', title=y_label),
+        y=alt.Y(f'{STACK_END}:Q', title=y_label),
+        y2=alt.Y2(f'{STACK_START}:Q'),
         color=alt.Color(
             f'{category_field}:N',
             title=category_label,
@@ -52,11 +119,11 @@ def build_chart(df: pd.DataFrame, config: dict) -> alt.Chart:
     chart = area
 
     # Add reference line if specified
-    if 'reference_line' in config:
-        axis, value, label = config['reference_line']
+    if REFERENCE_DATA in variant['datasets']:
+        axis, _value, label = config['reference_line']
         
         if axis == 'y':
-            ref_line = alt.Chart(pd.DataFrame({'y': [value]})).mark_rule(
+            ref_line = alt.Chart(alt.NamedData(name=REFERENCE_DATA)).mark_rule(
                 strokeDash=[5, 5],
                 color='gray'
             ).encode(
@@ -64,7 +131,7 @@ def build_chart(df: pd.DataFrame, config: dict) -> alt.Chart:
                 tooltip=[alt.Tooltip('y:Q', title=label)]
             )
         else:  # axis == 'x'
-            ref_line = alt.Chart(pd.DataFrame({'x': [value]})).mark_rule(
+            ref_line = alt.Chart(alt.NamedData(name=REFERENCE_DATA)).mark_rule(
                 strokeDash=[5, 5],
                 color='gray'
             ).encode(
@@ -1,10 +1,17 @@
 """Bar chart component with Prophet-based forecasting capability"""
 
+import numpy as np
 import streamlit as st
 import pandas as pd
 
-from .chart import build_chart
-from .forecast import create_forecast_df, DEFAULT_FORECAST_PERIODS, FORECAST_OPTIONS
+from utils.filters import filter_config
+from utils.forecast_pool import ForecastPoolBusy, ForecastTimeout
+from utils.large_data import chart_rows
+from utils.resample import select_granularity
+from utils.vega import cached_spec, spec_key
+
+from .chart import chart_spec
+from .forecast import create_forecast_df
 
 
 def _is_time_based(df: pd.DataFrame, x_field: str) -> bool:
@@ -30,21 +37,44 @@ def render_bar_chart(config: dict) -> None:
             - title (str): Title of the chart.
             - description (str): Description or caption for the chart.
             - df (pd.DataFrame): DataFrame containing the data to plot.
+            - cube (dict, optional): Take df from the time-entry rollup cube instead: `utils.cube.query` keyword arguments (by, where, measures).
+            - pipeline (list, optional): Build df from the raw tables instead: source, filter, join, groupby/agg, resample and pivot steps (see `utils.pipeline`).
             - x_field (str): Name of the column to use for the x-axis.
             - y_field (str): Name of the column to use for the y-axis.
             - category_field (str, optional): Name of the column for categorical grouping (optional).
             - category_label (str, optional): Title of the column for categorical grouping (optional).
             - forecast (bool, optional): Whether to enable forecasting (default: False).
-            - trendline (bool, optional): Whether to show a trendline for single bar charts (default: False).
+            - forecast_source (str, optional): Read precomputed forecasts written by `python -m utils.bulk_forecast` (series set name or directory) instead of fitting; entities map to category_field.
+            - forecast_engine (str, optional): Forecast engine name: 'prophet', 'holt', 'drift' or 'seasonal_naive' (default: 'prophet').
+            - forecast_tuning (bool, optional): Tune engine and hyperparameters per series in the background and reuse the winners (default: False).
+            - forecast_interval (bool | str, optional): Uncertainty band around the forecast: True/'analytic' or 'bootstrap' (default: False).
+            - forecast_interval_level (float, optional): Coverage of the uncertainty band (default: 0.8).
+            - forecast_hierarchy (bool | str, optional): For category charts, reconcile category forecasts so their stack matches a forecast of the total: True/'bottom_up' or 'mint' (default: False).
+            - trendline (bool, optional): Whether to show a linear trendline per series on vertical bars (default: False).
+            - moving_average (int, optional): Window, in points, of a trailing moving average drawn per series (default: none).
+            - rolling_regression (int, optional): Window, in points, of a rolling linear trend drawn per series (default: none).
             - orientation (str, optional): Bar orientation - 'vertical' or 'horizontal' (default: 'vertical').
+            - display_decimals (int, optional): Decimals kept in the data sent to the browser (default: 2).
+            - large_data (bool, optional): Aggregate rows per x value and category on the server before drawing and forecasting (default: when df has more than 5,000 rows).
+            - aggregate (str, optional): Aggregation used in large-data mode and granularity rollups: 'sum', 'mean', 'median', 'min', 'max' or 'count' (default: 'sum').
+            - max_categories (int, optional): Keep the categories with the largest y total and fold the rest into one 'Other' series, per x value (default: all categories).
+            - granularity (bool | str, optional): For time-based x, show a day/week/month/quarter/year selector that rolls the data up with `aggregate`; True starts at the data's own granularity, a level name at that level (default: False).
     """
     st.subheader(config['title'])
     st.caption(config['description'])
 
     # Generate unique key for this chart instance
     chart_key = f"bar_chart_{id(config)}"
+
+    # Dashboard-wide date range and filters: later steps only see the rows they keep
+    config = filter_config(config)
+
+    # Coarser time granularity picked by the viewer: charted (and forecast) from a rollup
+    level = select_granularity(config, chart_key)
+    if level:
+        config = {**config, 'granularity_level': level}
+
     forecast_enabled_key = f"{chart_key}_forecast_enabled"
-    forecast_periods_key = f"{chart_key}_forecast_periods"
     
     # Check if x-axis is time-based for forecast capability
     is_time_series = _is_time_based(config['df'], config['x_field'])
@@ -61,33 +91,32 @@ def render_bar_chart(config: dict) -> None:
                 if st.checkbox("Forecast", key=f"{chart_key}_checkbox"):
                     st.session_state[forecast_enabled_key] = True
                     st.rerun()
-        else:
-            col1, col2 = st.columns([3, 1])
-            with col2:
-                forecast_periods = st.selectbox(
-                    "Forecast periods",
-                    options=FORECAST_OPTIONS,
-                    index=FORECAST_OPTIONS.index(DEFAULT_FORECAST_PERIODS),
-                    key=forecast_periods_key
-                )
 
-    actual_df = config['df'].copy()
-    actual_df["type"] = "Actual"
+    # Forecast progress is shown where the chart will be drawn
+    chart_placeholder = st.empty()
+
+    actual_df = chart_rows(config['df'], config)
 
     # Generate forecast if enabled and time-based
     forecast_df = pd.DataFrame()
     if is_time_series and st.session_state[forecast_enabled_key]:
         # Update config to enable forecast
         config['forecast'] = True
-        periods = st.session_state.get(forecast_periods_key, DEFAULT_FORECAST_PERIODS)
-        forecast_df = create_forecast_df(config, forecast_periods=periods)
+        try:
+            forecast_df = create_forecast_df(config, placeholder=chart_placeholder)
+        except (ForecastPoolBusy, ForecastTimeout) as exc:
+            st.warning(str(exc), icon=":material/schedule:")
+        except ValueError as exc:
+            # A misconfigured forecast (e.g. a hierarchy with a 'Total' category) only costs this chart its forecast
+            st.error(str(exc))
 
     # Combine all data for plotting
     plot_df = pd.concat([actual_df, forecast_df], ignore_index=True)
+    plot_df["type"] = np.repeat(np.array(["Actual", "Forecast"], dtype=object), [len(actual_df), len(forecast_df)])
 
-    # Build and display chart
-    chart = build_chart(plot_df, config)
-    st.altair_chart(chart, use_container_width=True)
+    # Build (or reuse) and display chart
+    spec = cached_spec(spec_key(__name__, plot_df, config), lambda: chart_spec(plot_df, config))
+    chart_placeholder.vega_lite_chart(spec, use_container_width=True)
 
 
 __all__ = ['render_bar_chart']
\ No newline at end of file
@@ -3,13 +3,20 @@
 import pandas as pd
 import altair as alt
 
+from utils.forecast_intervals import LOWER_FIELD, UPPER_FIELD
+from utils.overlays import OVERLAY_FIELD, overlay_frame, overlay_labels
+from utils.vega import template_spec
+
+from .forecast import DEFAULT_FORECAST_PERIODS, FORECAST_OPTIONS, STEP_FIELD
+
 # Bar chart styling
 BAR_COLOR_SCHEME = "tableau20"
 BAR_SINGLE_COLOR = "#0b7dcfff"
 BAR_FORECAST_OPACITY = 0.5
 BAR_CORNER_RADIUS = 4  # Rounded corners for smoother appearance
+FORECAST_ERRORBAR_COLOR = "#333333"
 
-# Trendline styling
+# Trendline and rolling-statistics overlay styling
 TRENDLINE_COLOR = "#ffd600ff"
 TRENDLINE_DASH = [5, 5]
 TRENDLINE_WIDTH = 3
@@ -23,6 +30,15 @@ REFERENCE_LINE_WIDTH = 2
 # Chart dimensions
 CHART_HEIGHT = 400
 
+# Forecast horizon picker, evaluated in the browser (no rerun)
+HORIZON_PARAM = "forecast_horizon"
+HORIZON_FILTER = f"!isValid(datum.{STEP_FIELD}) || datum.{STEP_FIELD} <= {HORIZON_PARAM}"
+
+# Named datasets the spec reads; their frames come from chart_data
+MAIN_DATA = "main"
+OVERLAY_DATA = "overlays"
+REFERENCE_DATA = "reference"
+
 # Tooltip formatting
 TOOLTIP_NUMBER_FORMAT = ","
 TOOLTIP_AXIS_FORMAT = ",.0f"
@@ -84,36 +100,87 @@ def _is_time_or_sequential(df: pd.DataFrame, x_field: str) -> bool:
     return False
 
 
-def build_chart(plot_df: pd.DataFrame, config: dict) -> alt.Chart:
-    """Build Altair bar chart based on configuration."""
+def chart_spec(plot_df: pd.DataFrame, config: dict) -> dict:
+    """Vega-Lite dict for the chart: its cached template filled with this data."""
+    datasets = chart_data(plot_df, config)
+    variant = chart_variant(datasets, config)
+    return template_spec(__name__, config, variant, datasets, lambda: build_chart(variant, config))
+
+
+def chart_data(plot_df: pd.DataFrame, config: dict) -> dict:
+    """Frames behind each named dataset of the chart; all pandas work happens here."""
+    datasets = {MAIN_DATA: plot_df}
     has_forecast = config.get('forecast', False) and "type" in plot_df.columns
+    
+    # Trendline and rolling overlays only for vertical bars
+    if not has_forecast and config.get('orientation', 'vertical') == 'vertical':
+        overlay_df = overlay_frame(plot_df, config)
+        if overlay_df is not None:
+            datasets[OVERLAY_DATA] = overlay_df
+    
+    if config.get('reference_line'):
+        ref_df = _reference_df(plot_df, config)
+        if ref_df is not None:
+            datasets[REFERENCE_DATA] = ref_df
+    
+    return datasets
+
+
+def chart_variant(datasets: dict, config: dict) -> dict:
+    """Facts about the data that shape the spec; build_chart sees nothing else."""
+    df = datasets[MAIN_DATA]
+    return {
+        'datasets': sorted(datasets),
+        'forecast': bool(config.get('forecast', False)) and "type" in df.columns,
+        'band': _has_forecast_band(df),
+        'x_type': _get_x_encoding_type(df, config['x_field']),
+        # Use color scheme only for truly categorical data (not time-series or sequential)
+        'categorical_x': not _is_time_or_sequential(df, config['x_field']),
+    }
+
+
+def build_chart(variant: dict, config: dict) -> alt.Chart:
+    """Build Altair bar chart based on configuration; layers read the named datasets."""
+    has_forecast = variant['forecast']
     has_categories = config.get('category_field') is not None
     
     if has_forecast and has_categories:
-        chart = _build_multi_forecast(plot_df, config)
+        chart = _build_multi_forecast(variant, config)
     elif has_forecast:
-        chart = _build_single_forecast(plot_df, config)
+        chart = _build_single_forecast(variant, config)
     elif has_categories:
-        chart = _build_multi_bar(plot_df, config)
+        chart = _build_multi_bar(variant, config)
     else:
-        chart = _build_single_bar(plot_df, config)
+        chart = _build_single_bar(variant, config)
     
     # Add reference line if configured
-    if config.get('reference_line'):
-        ref_line = _build_reference_line(plot_df, config)
-        if ref_line:
-            chart = chart + ref_line
+    if REFERENCE_DATA in variant['datasets']:
+        chart = chart + _build_reference_line(variant, config)
+    
+    if has_forecast:
+        chart = chart.add_params(_horizon_param())
     
     return chart
 
 
-def _build_single_bar(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _named(name: str) -> alt.NamedData:
+    return alt.NamedData(name=name)
+
+
+def _horizon_param() -> alt.Parameter:
+    """Forecast periods picker bound below the chart; forecast layers filter on it."""
+    return alt.param(
+        name=HORIZON_PARAM,
+        value=DEFAULT_FORECAST_PERIODS,
+        bind=alt.binding_select(options=FORECAST_OPTIONS, name="Forecast periods "),
+    )
+
+
+def _build_single_bar(variant: dict, config: dict) -> alt.Chart:
     """Single bar chart without forecast."""
-    x_type = _get_x_encoding_type(df, config['x_field'])
+    x_type = variant['x_type']
     orientation = config.get('orientation', 'vertical')
-    
-    # Use color scheme only for truly categorical data (not time-series or sequential)
-    is_categorical_only = not _is_time_or_sequential(df, config['x_field'])
+    is_categorical_only = variant['categorical_x']
     
     color_encoding = alt.Color(
         f"{config['x_field']}:N",
@@ -143,9 +210,9 @@ def _build_single_bar(df: pd.DataFrame, config: dict) -> alt.Chart:
         }
         if color_encoding:
             encoding['color'] = color_encoding
-            bars = alt.Chart(df).mark_bar(cornerRadiusEnd=BAR_CORNER_RADIUS).encode(**encoding)
+            bars = alt.Chart(_named(MAIN_DATA)).mark_bar(cornerRadiusEnd=BAR_CORNER_RADIUS).encode(**encoding)
         else:
-            bars = alt.Chart(df).mark_bar(color=BAR_SINGLE_COLOR, cornerRadiusEnd=BAR_CORNER_RADIUS).encode(**encoding)
+            bars = alt.Chart(_named(MAIN_DATA)).mark_bar(color=BAR_SINGLE_COLOR, cornerRadiusEnd=BAR_CORNER_RADIUS).encode(**encoding)
     else:
         encoding = {
             'x': alt.X(
@@ -165,61 +232,62 @@ def _build_single_bar(df: pd.DataFrame, config: dict) -> alt.Chart:
         }
         if color_encoding:
             encoding['color'] = color_encoding
-            bars = alt.Chart(df).mark_bar(cornerRadiusTopLeft=BAR_CORNER_RADIUS, cornerRadiusTopRight=BAR_CORNER_RADIUS).encode(**encoding)
+            bars = alt.Chart(_named(MAIN_DATA)).mark_bar(cornerRadiusTopLeft=BAR_CORNER_RADIUS, cornerRadiusTopRight=BAR_CORNER_RADIUS).encode(**encoding)
         else:
-            bars = alt.Chart(df).mark_bar(color=BAR_SINGLE_COLOR, cornerRadiusTopLeft=BAR_CORNER_RADIUS, cornerRadiusTopRight=BAR_CORNER_RADIUS).encode(**encoding)
+            bars = alt.Chart(_named(MAIN_DATA)).mark_bar(color=BAR_SINGLE_COLOR, cornerRadiusTopLeft=BAR_CORNER_RADIUS, cornerRadiusTopRight=BAR_CORNER_RADIUS).encode(**encoding)
     
     chart = bars
     
-    # Add trendline if requested (only for vertical orientation)
-    if config.get('trendline', False) and orientation == 'vertical':
-        trendline = _create_trendline(df, config, x_type)
-        chart = bars + trendline
+    # Add trendline and rolling overlays if requested (only for vertical orientation)
+    if OVERLAY_DATA in variant['datasets']:
+        chart = bars + _create_overlays(config, x_type)
     
     return chart.properties(height=CHART_HEIGHT)
 
 
-def _create_trendline(df: pd.DataFrame, config: dict, x_type: str) -> alt.Chart:
-    """Create a trendline layer using linear regression."""
-    import numpy as np
-    
-    # Prepare data for regression
-    df_sorted = df.sort_values(by=config['x_field']).reset_index(drop=True)
-    x_numeric = np.arange(len(df_sorted))
-    y_values = df_sorted[config['y_field']].values
-    
-    # Calculate linear regression
-    coefficients = np.polyfit(x_numeric, y_values, 1)
-    slope, intercept = coefficients[0], coefficients[1]
-    
-    # Create trendline points at start and end
-    trendline_data = pd.DataFrame({
-        config['x_field']: [df_sorted[config['x_field']].iloc[0], df_sorted[config['x_field']].iloc[-1]],
-        config['y_field']: [intercept, slope * (len(df_sorted) - 1) + intercept]
-    })
-    
-    return alt.Chart(trendline_data).mark_line(
-        color=TRENDLINE_COLOR,
-        strokeDash=TRENDLINE_DASH,
-        size=TRENDLINE_WIDTH,
-        opacity=TRENDLINE_OPACITY
-    ).encode(
-        x=alt.X(f"{config['x_field']}:{x_type}"),
-        y=alt.Y(f"{config['y_field']}:Q")
-    )
+def _create_overlays(config: dict, x_type: str) -> alt.Chart:
+    """Trendline and rolling-statistics lines, one per overlay and series."""
+    labels = overlay_labels(config)
+    category_field = config.get('category_field')
 
+    mark = {'size': TRENDLINE_WIDTH, 'opacity': TRENDLINE_OPACITY}
+    tooltip = [
+        alt.Tooltip(f"{config['x_field']}:{x_type}", title=config['x_label']),
+        alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
+        alt.Tooltip(f"{OVERLAY_FIELD}:N", title="Overlay"),
+    ]
+    encoding = {
+        'x': alt.X(f"{config['x_field']}:{x_type}"),
+        'y': alt.Y(f"{config['y_field']}:Q"),
+        'detail': alt.Detail(f"{OVERLAY_FIELD}:N"),
+    }
+    if category_field:
+        # Same colors as the series' bars
+        encoding['color'] = alt.Color(f"{category_field}:N", scale=alt.Scale(scheme=BAR_COLOR_SCHEME), legend=None)
+        tooltip.append(alt.Tooltip(f"{category_field}:N", title=config.get('category_label') or category_field))
+    else:
+        mark['color'] = TRENDLINE_COLOR
+    if len(labels) > 1:
+        encoding['strokeDash'] = alt.StrokeDash(
+            f"{OVERLAY_FIELD}:N", scale=alt.Scale(domain=labels), legend=alt.Legend(title="Overlay")
+        )
+    else:
+        mark['strokeDash'] = TRENDLINE_DASH
+
+    return alt.Chart(_named(OVERLAY_DATA)).mark_line(**mark).encode(tooltip=tooltip, **encoding)
 
-def _build_multi_bar(df: pd.DataFrame, config: dict) -> alt.Chart:
+
+def _build_multi_bar(variant: dict, config: dict) -> alt.Chart:
     """Multi-bar chart without forecast."""
     category_label = config.get('category_label', config.get('category_field', ''))
-    x_type = _get_x_encoding_type(df, config['x_field'])
+    x_type = variant['x_type']
     orientation = config.get('orientation', 'vertical')
     
     label_limit = config.get('axis_label_limit', AXIS_LABEL_LIMIT)
     rotate = config.get('rotate_labels', False)
     
     if orientation == 'horizontal':
-        return alt.Chart(df).mark_bar(cornerRadiusEnd=BAR_CORNER_RADIUS).encode(
+        return alt.Chart(_named(MAIN_DATA)).mark_bar(cornerRadiusEnd=BAR_CORNER_RADIUS).encode(
             x=alt.X(
                 f"{config['y_field']}:Q",
                 title=config['y_label'],
@@ -242,7 +310,7 @@ def _build_multi_bar(df: pd.DataFrame, config: dict) -> alt.Chart:
             ]
         ).properties(height=CHART_HEIGHT)
     else:
-        return alt.Chart(df).mark_bar(cornerRadiusTopLeft=BAR_CORNER_RADIUS, cornerRadiusTopRight=BAR_CORNER_RADIUS).encode(
+        bars = alt.Chart(_named(MAIN_DATA)).mark_bar(cornerRadiusTopLeft=BAR_CORNER_RADIUS, cornerRadiusTopRight=BAR_CORNER_RADIUS).encode(
             x=alt.X(
                 f"{config['x_field']}:{x_type}",
                 title=config['x_label'],
@@ -263,14 +331,44 @@ def _build_multi_bar(df: pd.DataFrame, config: dict) -> alt.Chart:
                 alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
                 alt.Tooltip(f"{config['category_field']}:N", title=category_label),
             ]
-        ).properties(height=CHART_HEIGHT)
+        )
+        if OVERLAY_DATA in variant['datasets']:
+            bars = bars + _create_overlays(config, x_type)
+        return bars.properties(height=CHART_HEIGHT)
 
 
-def _build_single_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _has_forecast_band(df: pd.DataFrame) -> bool:
+    """Whether the forecast rows carry uncertainty bounds."""
+    return LOWER_FIELD in df.columns and df[LOWER_FIELD].notna().any()
+
+
+def _band_tooltip(variant: dict) -> list:
+    """Bound tooltips for forecast bars (empty without a band)."""
+    if not variant['band']:
+        return []
+    return [
+        alt.Tooltip(f"{LOWER_FIELD}:Q", title="Lower bound", format=TOOLTIP_NUMBER_FORMAT),
+        alt.Tooltip(f"{UPPER_FIELD}:Q", title="Upper bound", format=TOOLTIP_NUMBER_FORMAT),
+    ]
+
+
+def _forecast_errorbars(base: alt.Chart, config: dict, x_type: str, orientation: str) -> alt.Chart:
+    """Uncertainty whiskers on single-series forecast bars."""
+    x_encoding = f"{config['x_field']}:{x_type}"
+    if orientation == 'horizontal':
+        bounds = {'x': alt.X(f"{LOWER_FIELD}:Q"), 'x2': alt.X2(f"{UPPER_FIELD}:Q"), 'y': alt.Y(x_encoding)}
+    else:
+        bounds = {'y': alt.Y(f"{LOWER_FIELD}:Q"), 'y2': alt.Y2(f"{UPPER_FIELD}:Q"), 'x': alt.X(x_encoding)}
+    return base.transform_filter(alt.datum.type == "Forecast").mark_errorbar(
+        ticks=True, color=FORECAST_ERRORBAR_COLOR
+    ).encode(**bounds)
+
+
+def _build_single_forecast(variant: dict, config: dict) -> alt.Chart:
     """Single bar chart with forecast."""
-    x_type = _get_x_encoding_type(df, config['x_field'])
+    x_type = variant['x_type']
     orientation = config.get('orientation', 'vertical')
-    base = alt.Chart(df)
+    base = alt.Chart(_named(MAIN_DATA)).transform_filter(HORIZON_FILTER)
     
     label_limit = config.get('axis_label_limit', AXIS_LABEL_LIMIT)
     rotate = config.get('rotate_labels', False)
@@ -313,7 +411,7 @@ def _build_single_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
                 alt.Tooltip(f"{config['x_field']}:{x_type}", title=config['x_label']),
                 alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
                 alt.Tooltip("type:N", title="Type"),
-            ]
+            ] + _band_tooltip(variant)
         )
     else:
         actual = base.transform_filter(alt.datum.type == "Actual").mark_bar(
@@ -353,18 +451,21 @@ def _build_single_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
                 alt.Tooltip(f"{config['x_field']}:{x_type}", title=config['x_label']),
                 alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
                 alt.Tooltip("type:N", title="Type"),
-            ]
+            ] + _band_tooltip(variant)
         )
     
-    return (actual + forecast).properties(height=CHART_HEIGHT)
+    chart = actual + forecast
+    if variant['band']:
+        chart = chart + _forecast_errorbars(base, config, x_type, orientation)
+    return chart.properties(height=CHART_HEIGHT)
 
 
-def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
-    """Multi-bar chart with forecast."""
+def _build_multi_forecast(variant: dict, config: dict) -> alt.Chart:
+    """Multi-bar chart with forecast (stacked, so uncertainty bounds are shown in the tooltip)."""
     category_label = config.get('category_label', config.get('category_field', ''))
-    x_type = _get_x_encoding_type(df, config['x_field'])
+    x_type = variant['x_type']
     orientation = config.get('orientation', 'vertical')
-    base = alt.Chart(df)
+    base = alt.Chart(_named(MAIN_DATA)).transform_filter(HORIZON_FILTER)
     
     label_limit = config.get('axis_label_limit', AXIS_LABEL_LIMIT)
     rotate = config.get('rotate_labels', False)
@@ -419,7 +520,7 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
                 alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
                 alt.Tooltip(f"{config['category_field']}:N", title=category_label),
                 alt.Tooltip("type:N", title="Type"),
-            ]
+            ] + _band_tooltip(variant)
         )
     else:
         actual = base.transform_filter(alt.datum.type == "Actual").mark_bar(
@@ -471,15 +572,15 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
                 alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
                 alt.Tooltip(f"{config['category_field']}:N", title=category_label),
                 alt.Tooltip("type:N", title="Type"),
-            ]
+            ] + _band_tooltip(variant)
         )
     
     return (actual + forecast).properties(height=CHART_HEIGHT)
 
 
-def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _reference_df(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     """
-    Build a reference line (horizontal or vertical dashed line).
+    Data for a reference line (horizontal or vertical dashed line).
     
     Args:
         df: DataFrame (used for domain inference)
@@ -487,7 +588,7 @@ def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
                where axis is 'x' or 'y', value is the reference value, and label is optional
     
     Returns:
-        Altair Chart with reference line or None if invalid configuration
+        Single-row DataFrame or None if invalid configuration
     """
     reference_line = config.get('reference_line')
     if not reference_line or len(reference_line) < 2:
@@ -495,49 +596,45 @@ def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
     
     axis = reference_line[0]
     value = reference_line[1]
-    label = reference_line[2] if len(reference_line) > 2 else "Target"
-    orientation = config.get('orientation', 'vertical')
     
     if axis.lower() == 'y':
         # Horizontal reference line
-        ref_df = pd.DataFrame({config['y_field']: [value]})
-        return alt.Chart(ref_df).mark_rule(
-            strokeDash=REFERENCE_LINE_DASH,
-            color=REFERENCE_LINE_COLOR,
-            strokeWidth=REFERENCE_LINE_WIDTH
-        ).encode(
-            y=alt.Y(f"{config['y_field']}:Q"),
-            tooltip=[alt.Tooltip(f"{config['y_field']}:Q", title=label, format=TOOLTIP_NUMBER_FORMAT)]
-        )
+        return pd.DataFrame({config['y_field']: [value]})
     
     elif axis.lower() == 'x':
         # Vertical reference line
         x_field = config['x_field']
-        x_type = _get_x_encoding_type(df, x_field)
         
         # Handle datetime conversion if needed
         x_value = value
         if pd.api.types.is_datetime64_any_dtype(df[x_field]):
             if not isinstance(value, pd.Timestamp):
                 x_value = pd.to_datetime(value)
-            ref_df = pd.DataFrame({x_field: [x_value]})
-            return alt.Chart(ref_df).mark_rule(
-                strokeDash=REFERENCE_LINE_DASH,
-                color=REFERENCE_LINE_COLOR,
-                strokeWidth=REFERENCE_LINE_WIDTH
-            ).encode(
-                x=alt.X(f"{x_field}:T"),
-                tooltip=[alt.Tooltip(f"{x_field}:T", title=label)]
-            )
-        else:
-            ref_df = pd.DataFrame({x_field: [x_value]})
-            return alt.Chart(ref_df).mark_rule(
-                strokeDash=REFERENCE_LINE_DASH,
-                color=REFERENCE_LINE_COLOR,
-                strokeWidth=REFERENCE_LINE_WIDTH
-            ).encode(
-                x=alt.X(f"{x_field}:{x_type}"),
-                tooltip=[alt.Tooltip(f"{x_field}:{x_type}", title=label)]
-            )
+        return pd.DataFrame({x_field: [x_value]})
     
     return None
+
+
+def _build_reference_line(variant: dict, config: dict) -> alt.Chart:
+    """Build the reference line layer from its single-row dataset."""
+    axis, _value, *rest = config['reference_line']
+    label = rest[0] if rest else "Target"
+    rule = alt.Chart(_named(REFERENCE_DATA)).mark_rule(
+        strokeDash=REFERENCE_LINE_DASH,
+        color=REFERENCE_LINE_COLOR,
+        strokeWidth=REFERENCE_LINE_WIDTH
+    )
+    
+    if axis.lower() == 'y':
+        return rule.encode(
+            y=alt.Y(f"{config['y_field']}:Q"),
+            tooltip=[alt.Tooltip(f"{config['y_field']}:Q", title=label, format=TOOLTIP_NUMBER_FORMAT)]
+        )
+    
+    # Vertical line on the bars' x scale (temporal for datetime x)
+    x_field = config['x_field']
+    x_type = variant['x_type']
+    return rule.encode(
+        x=alt.X(f"{x_field}:{x_type}"),
+        tooltip=[alt.Tooltip(f"{x_field}:{x_type}", title=label)]
+    )
@@ -1,13 +1,17 @@
 """Prophet-based forecasting for bar charts"""
 
 from typing import Optional
-import streamlit as st
 import pandas as pd
-from prophet import Prophet
 
-MAX_FORECAST_PERIODS = 24
+from utils.bulk_forecast import load_forecasts
+from utils.chart_forecast import MAX_FORECAST_PERIODS, compute_forecast_df
+from utils.forecast_hierarchy import TOTAL_LABEL
+from utils.large_data import chart_rows
+from utils.series_store import SeriesStore
+
 DEFAULT_FORECAST_PERIODS = 12
 FORECAST_OPTIONS = [6, 12, 18, 24]
+STEP_FIELD = "forecast_step"  # Periods ahead of the last actual; the chart filters on it in the browser
 
 
 def _convert_to_datetime(series: pd.Series) -> pd.Series:
@@ -27,12 +31,17 @@ def _convert_to_datetime(series: pd.Series) -> pd.Series:
         return pd.to_datetime(series, infer_datetime_format=True)
 
 
-def create_forecast_df(config, forecast_periods: int = DEFAULT_FORECAST_PERIODS):
-    """Generate (and slice) forecast dataframe. UI selection handled by caller."""
+def create_forecast_df(config, forecast_periods: int = MAX_FORECAST_PERIODS, placeholder=None):
+    """
+    Generate the forecast dataframe with a STEP_FIELD column.
+
+    Charts embed all MAX_FORECAST_PERIODS steps and let the viewer pick the
+    horizon client-side; forecast_periods only trims rows server-side.
+    """
     if not config.get('forecast', False):
         return pd.DataFrame()
 
-    df = config['df'].copy()
+    df = chart_rows(config['df'], config).copy()
     x_field = config['x_field']
     category_field = config.get('category_field')
     
@@ -42,85 +51,27 @@ def create_forecast_df(config, forecast_periods: int = DEFAULT_FORECAST_PERIODS)
     # Normalize historical dates to date-only (remove time component)
     df[x_field] = df[x_field].dt.date
     
-    # Generate forecast once with maximum periods (cached across reloads)
-    with st.spinner("Generating forecast..."):
-        full_forecast_df = _generate_forecast_df(
-            df, x_field, config['y_field'], MAX_FORECAST_PERIODS, category_field
-        )
+    if config.get('forecast_source'):
+        # Precomputed by utils.bulk_forecast: nothing to fit during the rerun
+        entities = df[category_field].unique() if category_field else None
+        full_forecast_df = load_forecasts(config['forecast_source'], x_field, config['y_field'], category_field, entities)
+    else:
+        full_forecast_df = compute_forecast_df(config, df, _infer_frequency, placeholder)
+        if category_field and config.get('forecast_hierarchy', False) and not full_forecast_df.empty:
+            # Coherent categories; the stacked bars already show the total
+            full_forecast_df = full_forecast_df[full_forecast_df[category_field] != TOTAL_LABEL]
     
     if full_forecast_df.empty:
         return pd.DataFrame()
     
-    if category_field:
-        # Slice each category separately
-        sliced_forecasts = [
-            full_forecast_df[full_forecast_df[category_field] == category]
-                .sort_values(by=x_field)
-                .head(forecast_periods)
-            for category in full_forecast_df[category_field].unique()
-        ]
-        return pd.concat(sliced_forecasts, ignore_index=True)
-    
-    return full_forecast_df.sort_values(by=x_field).head(forecast_periods)
-
-
-@st.cache_data(show_spinner=False)
-def _generate_forecast_df(
-    df: pd.DataFrame,
-    x_field: str,
-    y_field: str,
-    periods: int,
-    category_field: Optional[str] = None
-) -> pd.DataFrame:
-    """Generate forecast using Prophet model."""
-    
-    if category_field is None:
-        return _forecast_single(df, x_field, y_field, periods)
+    # Date-only forecast dates, like the historical ones
+    full_forecast_df = full_forecast_df.assign(**{x_field: full_forecast_df[x_field].dt.date})
     
-    # Forecast each category separately
-    all_forecasts = []
-    for category in sorted(df[category_field].unique()):
-        category_df = df[df[category_field] == category].copy()
-        if len(category_df) >= 2:
-            forecast_df = _forecast_single(category_df, x_field, y_field, periods)
-            forecast_df[category_field] = str(category)
-            all_forecasts.append(forecast_df)
-    
-    return pd.concat(all_forecasts, ignore_index=True) if all_forecasts else pd.DataFrame()
-
+    # Number the steps of each series so the horizon can be filtered in the browser
+    full_forecast_df = full_forecast_df.sort_values(by=x_field, kind='mergesort').reset_index(drop=True)
+    full_forecast_df[STEP_FIELD] = SeriesStore(full_forecast_df, x_field, category_field).ranks() + 1
+    return full_forecast_df[full_forecast_df[STEP_FIELD] <= forecast_periods].reset_index(drop=True)
 
-def _forecast_single(df: pd.DataFrame, x_field: str, y_field: str, periods: int) -> pd.DataFrame:
-    """Forecast a single time series."""
-    # Prepare data for Prophet
-    prophet_df = df[[x_field, y_field]].rename(columns={x_field: "ds", y_field: "y"})
-    
-    # Infer frequency from time series
-    freq = _infer_frequency(df[x_field])
-    
-    # Train Prophet model with specified seasonality and changepoints
-    model = Prophet(
-        yearly_seasonality=True,
-        weekly_seasonality=False,
-        daily_seasonality=False,
-        n_changepoints=10,
-        seasonality_mode="additive",
-        interval_width=0.0,
-    )
-    model.fit(prophet_df)
-    
-    # Generate future dates and predict values
-    future = model.make_future_dataframe(
-        periods=periods,
-        freq=freq,
-        include_history=False
-    )
-    forecast = model.predict(future)
-    
-    return pd.DataFrame({
-        x_field: forecast['ds'].dt.date,
-        y_field: forecast['yhat'],
-        "type": "Forecast"
-    })
 
 def _infer_frequency(date_series: pd.Series) -> str:
     """Infer frequency from a datetime series, defaulting to daily."""
@@ -3,8 +3,15 @@
 import streamlit as st
 import pandas as pd
 
-from .chart import build_chart
-from .forecast import create_forecast_df, create_connector_df, DEFAULT_FORECAST_PERIODS, FORECAST_OPTIONS
+from utils.forecast_hierarchy import TOTAL_LABEL, with_total
+from utils.filters import filter_config
+from utils.forecast_pool import ForecastPoolBusy, ForecastTimeout
+from utils.large_data import chart_rows
+from utils.resample import select_granularity
+from utils.vega import cached_spec, spec_key
+
+from .chart import chart_spec
+from .forecast import create_forecast_df, plot_frame
 
 
 def _is_time_based(df: pd.DataFrame, x_field: str) -> bool:
@@ -30,20 +37,44 @@ def render_line_chart(config: dict) -> None:
             - title (str): Title of the chart.
             - description (str): Description or caption for the chart.
             - df (pd.DataFrame): DataFrame containing the data to plot.
+            - cube (dict, optional): Take df from the time-entry rollup cube instead: `utils.cube.query` keyword arguments (by, where, measures).
+            - pipeline (list, optional): Build df from the raw tables instead: source, filter, join, groupby/agg, resample and pivot steps (see `utils.pipeline`).
             - x_field (str): Name of the column to use for the x-axis (should be datetime or convertible).
             - y_field (str): Name of the column to use for the y-axis.
             - category_field (str, optional): Name of the column for categorical grouping (optional).
             - category_label (str, optional): (chart) Title of the column for categorical grouping (optional).
             - forecast (bool, optional): Whether to enable forecasting (default: False).
-            - trendline (bool, optional): Whether to show a trendline for single line charts (default: False).
+            - forecast_source (str, optional): Read precomputed forecasts written by `python -m utils.bulk_forecast` (series set name or directory) instead of fitting; entities map to category_field.
+            - forecast_engine (str, optional): Forecast engine name: 'prophet', 'holt', 'drift' or 'seasonal_naive' (default: 'prophet').
+            - forecast_tuning (bool, optional): Tune engine and hyperparameters per series in the background and reuse the winners (default: False).
+            - forecast_interval (bool | str, optional): Uncertainty band around the forecast: True/'analytic' or 'bootstrap' (default: False).
+            - forecast_interval_level (float, optional): Coverage of the uncertainty band (default: 0.8).
+            - forecast_hierarchy (bool | str, optional): For category charts, forecast categories together and add a reconciled 'Total' series: True/'bottom_up' or 'mint' (default: False).
+            - trendline (bool, optional): Whether to show a linear trendline per series (default: False).
+            - moving_average (int, optional): Window, in points, of a trailing moving average drawn per series (default: none).
+            - rolling_regression (int, optional): Window, in points, of a rolling linear trend drawn per series (default: none).
+            - max_points (int, optional): Points drawn per series; longer series are downsampled with LTTB (0 disables, default: 1000).
+            - display_decimals (int, optional): Decimals kept in the data sent to the browser (default: 2).
+            - large_data (bool, optional): Aggregate rows per x value and category on the server before drawing and forecasting (default: when df has more than 5,000 rows).
+            - aggregate (str, optional): Aggregation used in large-data mode and granularity rollups: 'sum', 'mean', 'median', 'min', 'max' or 'count' (default: 'sum').
+            - max_categories (int, optional): Keep the categories with the largest y total and fold the rest into one 'Other' series, per x value (default: all categories).
+            - granularity (bool | str, optional): For time-based x, show a day/week/month/quarter/year selector that rolls the data up with `aggregate`; True starts at the data's own granularity, a level name at that level (default: False).
     """
     st.subheader(config['title'])
     st.caption(config['description'])
 
     # Generate unique key for this chart instance
     chart_key = f"line_chart_{id(config)}"
+
+    # Dashboard-wide date range and filters: later steps only see the rows they keep
+    config = filter_config(config)
+
+    # Coarser time granularity picked by the viewer: charted (and forecast) from a rollup
+    level = select_granularity(config, chart_key)
+    if level:
+        config = {**config, 'granularity_level': level}
+
     forecast_enabled_key = f"{chart_key}_forecast_enabled"
-    forecast_periods_key = f"{chart_key}_forecast_periods"
     
     # Check if x-axis is time-based for forecast capability
     is_time_series = _is_time_based(config['df'], config['x_field'])
@@ -61,17 +92,11 @@ def render_line_chart(config: dict) -> None:
                 if st.checkbox("Forecast", key=f"{chart_key}_checkbox"):
                     st.session_state[forecast_enabled_key] = True
                     st.rerun()
-        else:
-            col1, col2 = st.columns([3, 1])
-            with col2:
-                forecast_periods = st.selectbox(
-                    "Forecast periods",
-                    options=FORECAST_OPTIONS,
-                    index=FORECAST_OPTIONS.index(DEFAULT_FORECAST_PERIODS),
-                    key=forecast_periods_key
-                )
     
-    actual_df = config['df'].copy()
+    # Forecast progress is shown where the chart will be drawn
+    chart_placeholder = st.empty()
+
+    actual_df = chart_rows(config['df'], config)
     x_field = config['x_field']
     y_field = config['y_field']
     category_field = config.get('category_field')
@@ -79,27 +104,31 @@ def render_line_chart(config: dict) -> None:
     # Convert x-axis to datetime if needed (for forecasting or reference lines)
     if not pd.api.types.is_datetime64_any_dtype(actual_df[x_field]):
         try:
-            actual_df[x_field] = pd.to_datetime(actual_df[x_field])
+            actual_df = actual_df.assign(**{x_field: pd.to_datetime(actual_df[x_field])})
         except (ValueError, TypeError):
             pass  # Keep original type if conversion fails
 
-    actual_df["type"] = "Actual"
-
     # Generate forecast if enabled and time-based
     forecast_df = pd.DataFrame()
-    connector_df = pd.DataFrame()
     if is_time_series and st.session_state[forecast_enabled_key]:
         config['forecast'] = True
-        periods = st.session_state.get(forecast_periods_key, DEFAULT_FORECAST_PERIODS)
-        forecast_df = create_forecast_df(config, forecast_periods=periods)
-        connector_df = create_connector_df(actual_df, forecast_df, x_field, y_field, category_field)
-
-    # Combine all data for plotting
-    plot_df = pd.concat([actual_df, forecast_df, connector_df], ignore_index=True)
-
-    # Build and display chart
-    chart = build_chart(plot_df, config)
-    st.altair_chart(chart, use_container_width=True)
+        try:
+            forecast_df = create_forecast_df(config, placeholder=chart_placeholder)
+        except (ForecastPoolBusy, ForecastTimeout) as exc:
+            st.warning(str(exc), icon=":material/schedule:")
+        except ValueError as exc:
+            # A misconfigured forecast (e.g. a hierarchy with a 'Total' category) only costs this chart its forecast
+            st.error(str(exc))
+        if category_field and not forecast_df.empty and (forecast_df[category_field] == TOTAL_LABEL).any():
+            # Hierarchical forecast: show the actual total next to its reconciled forecast
+            actual_df = with_total(actual_df, x_field, y_field, category_field)
+
+    # Combine actual, forecast and connector rows for plotting
+    plot_df = plot_frame(actual_df, forecast_df, x_field, y_field, category_field)
+
+    # Build (or reuse) and display chart
+    spec = cached_spec(spec_key(__name__, plot_df, config), lambda: chart_spec(plot_df, config))
+    chart_placeholder.vega_lite_chart(spec, use_container_width=True)
 
 
 __all__ = ['render_line_chart']
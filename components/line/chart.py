@@ -1,8 +1,17 @@
 """Chart building for line charts"""
 
+import numpy as np
 import pandas as pd
 import altair as alt
 
+from utils.downsample import DEFAULT_MAX_POINTS, downsample
+from utils.forecast_intervals import LOWER_FIELD, UPPER_FIELD
+from utils.overlays import OVERLAY_FIELD, overlay_frame, overlay_labels
+from utils.series_store import SeriesStore
+from utils.vega import template_spec
+
+from .forecast import DEFAULT_FORECAST_PERIODS, FORECAST_OPTIONS, STEP_FIELD
+
 # Line chart styling
 LINE_COLOR_SCHEME = "tableau20"
 LINE_STROKE_WIDTH = 3
@@ -22,16 +31,32 @@ AREA_DEFICIT_COLOR = "#fc8d6280"
 # Chart dimensions
 CHART_HEIGHT = 400
 
+# Forecast horizon picker, evaluated in the browser (no rerun)
+HORIZON_PARAM = "forecast_horizon"
+HORIZON_FILTER = f"!isValid(datum.{STEP_FIELD}) || datum.{STEP_FIELD} <= {HORIZON_PARAM}"
+
+# Fixed names for the legend toggle and the views it binds to. Altair would
+# number them (param_1, view_3, ...) from a process-wide counter, so the same
+# chart would produce a different spec on every build.
+CATEGORY_SELECTION = "category_toggle"
+
+# Named datasets the spec reads; their frames come from chart_data
+MAIN_DATA = "main"
+DIFF_AREA_DATA = "diff_area"
+OVERLAY_DATA = "overlays"
+REFERENCE_DATA = "reference"
+
 # Forecast styling
 FORECAST_DASH = [5, 5]
 CONNECTOR_SHOW_POINTS = False
+FORECAST_BAND_OPACITY = 0.2
 
 # Reference line styling
 REFERENCE_LINE_COLOR = "#FF6B6B"
 REFERENCE_LINE_DASH = [8, 4]
 REFERENCE_LINE_WIDTH = 2
 
-# Trendline styling
+# Trendline and rolling-statistics overlay styling
 TRENDLINE_COLOR = "#ffd600ff"
 TRENDLINE_DASH = [5, 5]
 TRENDLINE_WIDTH = 3
@@ -42,29 +67,105 @@ TOOLTIP_NUMBER_FORMAT = ","
 TOOLTIP_AXIS_FORMAT = ",.0f"
 
 
-def build_chart(plot_df: pd.DataFrame, config: dict) -> alt.Chart:
-    """Build Altair chart based on configuration."""
+def chart_spec(plot_df: pd.DataFrame, config: dict) -> dict:
+    """Vega-Lite dict for the chart: its cached template filled with this data."""
+    datasets = chart_data(plot_df, config)
+    variant = chart_variant(datasets, config)
+    return template_spec(__name__, config, variant, datasets, lambda: build_chart(variant, config))
+
+
+def chart_data(plot_df: pd.DataFrame, config: dict) -> dict:
+    """Frames behind each named dataset of the chart; all pandas work happens here."""
     has_forecast = config.get('forecast', False) and "type" in plot_df.columns
     has_categories = config.get('category_field') is not None
+    # Derived layers below use every point; only the drawn lines are thinned
+    datasets = {MAIN_DATA: _downsample_actuals(plot_df, config, config.get('max_points', DEFAULT_MAX_POINTS))}
+
+    highlight_cats = config.get('category_area_highlight', [])
+    if has_categories and len(highlight_cats) == 2:
+        diff_df = _diff_area_df(plot_df, config, highlight_cats, forecast=has_forecast)
+        if diff_df is not None:
+            datasets[DIFF_AREA_DATA] = diff_df
+
+    if not has_forecast:
+        overlay_df = overlay_frame(plot_df, config)
+        if overlay_df is not None:
+            datasets[OVERLAY_DATA] = overlay_df
+
+    if config.get('reference_line'):
+        ref_df = _reference_df(plot_df, config)
+        if ref_df is not None:
+            datasets[REFERENCE_DATA] = ref_df
+
+    return datasets
+
+
+def _downsample_actuals(plot_df: pd.DataFrame, config: dict, max_points: int) -> pd.DataFrame:
+    """LTTB per category over the actual rows; forecast and connector rows are kept."""
+    if not max_points or len(plot_df) <= max_points:
+        return plot_df
+    is_actual = plot_df['type'] == "Actual" if "type" in plot_df.columns else pd.Series(True, index=plot_df.index)
+    actual = downsample(
+        plot_df[is_actual], config['x_field'], config['y_field'], config.get('category_field'), max_points,
+    )
+    if len(actual) == is_actual.sum():
+        return plot_df
+    return pd.concat([actual, plot_df[~is_actual]], ignore_index=True)
+
+
+def chart_variant(datasets: dict, config: dict) -> dict:
+    """Facts about the data that shape the spec; build_chart sees nothing else."""
+    df = datasets[MAIN_DATA]
+    category_field = config.get('category_field')
+    return {
+        'forecast': bool(config.get('forecast', False)) and "type" in df.columns,
+        'band': _has_forecast_band(df),
+        'categories': sorted(df[category_field].unique().tolist()) if category_field else [],
+        # Datetime columns per dataset (x encodings are temporal or quantitative)
+        'temporal': {
+            name: [str(col) for col in frame.columns if pd.api.types.is_datetime64_any_dtype(frame[col])]
+            for name, frame in sorted(datasets.items())
+        },
+    }
+
+
+def build_chart(variant: dict, config: dict) -> alt.Chart:
+    """Build Altair chart based on configuration; layers read the named datasets."""
+    has_forecast = variant['forecast']
+    has_categories = config.get('category_field') is not None
     
     if has_forecast and has_categories:
-        chart = _build_multi_forecast(plot_df, config)
+        chart = _build_multi_forecast(variant, config)
     elif has_forecast:
-        chart = _build_single_forecast(plot_df, config)
+        chart = _build_single_forecast(variant, config)
     elif has_categories:
-        chart = _build_multi_line(plot_df, config)
+        chart = _build_multi_line(variant, config)
     else:
-        chart = _build_single_line(plot_df, config)
+        chart = _build_single_line(variant, config)
     
     # Add reference line if configured
-    if config.get('reference_line'):
-        ref_line = _build_reference_line(plot_df, config)
-        if ref_line:
-            chart = chart + ref_line
+    if REFERENCE_DATA in variant['temporal']:
+        chart = chart + _build_reference_line(variant, config)
+    
+    if has_forecast:
+        chart = chart.add_params(_horizon_param())
     
     return chart
 
 
+def _named(name: str) -> alt.NamedData:
+    return alt.NamedData(name=name)
+
+
+def _horizon_param() -> alt.Parameter:
+    """Forecast periods picker bound below the chart; forecast layers filter on it."""
+    return alt.param(
+        name=HORIZON_PARAM,
+        value=DEFAULT_FORECAST_PERIODS,
+        bind=alt.binding_select(options=FORECAST_OPTIONS, name="Forecast periods "),
+    )
+
+
 def _get_base_encoding(config: dict, include_type: bool = False, include_category: bool = False) -> dict:
     """Get common encoding configuration."""
     category_label = config.get('category_label') or config.get('category_field', '')
@@ -95,13 +196,42 @@ def _get_base_encoding(config: dict, include_type: bool = False, include_categor
     return encoding
 
 
-def _build_single_line(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _has_forecast_band(df: pd.DataFrame) -> bool:
+    """Whether the forecast rows carry uncertainty bounds."""
+    return LOWER_FIELD in df.columns and df[LOWER_FIELD].notna().any()
+
+
+def _forecast_band(config: dict, subset=None, **encoding) -> alt.Chart:
+    """Shaded uncertainty band under the forecast line."""
+    tooltip = [
+        alt.Tooltip(f"{config['x_field']}:T", title=config['x_label']),
+        alt.Tooltip(f"{LOWER_FIELD}:Q", title="Lower bound", format=TOOLTIP_NUMBER_FORMAT),
+        alt.Tooltip(f"{UPPER_FIELD}:Q", title="Upper bound", format=TOOLTIP_NUMBER_FORMAT),
+    ]
+    if config.get('category_field'):
+        tooltip.append(alt.Tooltip(f"{config['category_field']}:N", title=config.get('category_label') or config['category_field']))
+    band = alt.Chart(_named(MAIN_DATA))
+    if subset is not None:
+        band = band.transform_filter(subset)
+    return band.transform_filter(alt.datum.type == "Forecast").transform_filter(HORIZON_FILTER).mark_area(
+        opacity=FORECAST_BAND_OPACITY,
+        interpolate=LINE_INTERPOLATE
+    ).encode(
+        x=alt.X(f"{config['x_field']}:T"),
+        y=alt.Y(f"{LOWER_FIELD}:Q"),
+        y2=alt.Y2(f"{UPPER_FIELD}:Q"),
+        tooltip=tooltip,
+        **encoding
+    )
+
+
+def _build_single_line(variant: dict, config: dict) -> alt.Chart:
     """Single line chart without forecast."""
     encoding = _get_base_encoding(config)
     
     point_config = alt.OverlayMarkDef(size=POINT_SIZE, filled=False, fill=POINT_FILL, stroke=POINT_STROKE) if not POINT_VISIBLE else True
     
-    line = alt.Chart(df).mark_line(
+    line = alt.Chart(_named(MAIN_DATA)).mark_line(
         point=point_config, 
         color=LINE_SINGLE_COLOR,
         strokeWidth=LINE_STROKE_WIDTH,
@@ -110,59 +240,67 @@ def _build_single_line(df: pd.DataFrame, config: dict) -> alt.Chart:
     
     chart = line
     
-    # Add trendline if requested
-    if config.get('trendline', False):
-        trendline = _create_trendline(df, config)
-        chart = line + trendline
+    # Add trendline and rolling overlays if requested
+    if OVERLAY_DATA in variant['temporal']:
+        chart = line + _create_overlays(variant, config)
     
     return chart.properties(height=CHART_HEIGHT)
 
 
-def _create_trendline(df: pd.DataFrame, config: dict) -> alt.Chart:
-    """Create a trendline layer using linear regression."""
-    import numpy as np
-    
-    # Prepare data for regression
-    df_sorted = df.sort_values(by=config['x_field']).reset_index(drop=True)
-    x_numeric = np.arange(len(df_sorted))
-    y_values = df_sorted[config['y_field']].values
-    
-    # Calculate linear regression
-    coefficients = np.polyfit(x_numeric, y_values, 1)
-    slope, intercept = coefficients[0], coefficients[1]
-    
-    # Create trendline points at start and end
-    trendline_data = pd.DataFrame({
-        config['x_field']: [df_sorted[config['x_field']].iloc[0], df_sorted[config['x_field']].iloc[-1]],
-        config['y_field']: [intercept, slope * (len(df_sorted) - 1) + intercept]
-    })
-    
-    # Determine x encoding type
-    x_type = "T" if pd.api.types.is_datetime64_any_dtype(df_sorted[config['x_field']]) else "Q"
-    
-    return alt.Chart(trendline_data).mark_line(
-        color=TRENDLINE_COLOR,
-        strokeDash=TRENDLINE_DASH,
-        size=TRENDLINE_WIDTH,
-        opacity=TRENDLINE_OPACITY
-    ).encode(
-        x=alt.X(f"{config['x_field']}:{x_type}"),
-        y=alt.Y(f"{config['y_field']}:Q")
-    )
+def _create_overlays(variant: dict, config: dict, selection=None) -> alt.Chart:
+    """Trendline and rolling-statistics lines, one per overlay and series."""
+    x_type = "T" if config['x_field'] in variant['temporal'][OVERLAY_DATA] else "Q"
+    labels = overlay_labels(config)
+    category_field = config.get('category_field')
+
+    mark = {'size': TRENDLINE_WIDTH, 'opacity': TRENDLINE_OPACITY}
+    tooltip = [
+        alt.Tooltip(f"{config['x_field']}:{x_type}", title=config['x_label']),
+        alt.Tooltip(f"{config['y_field']}:Q", title=config['y_label'], format=TOOLTIP_NUMBER_FORMAT),
+        alt.Tooltip(f"{OVERLAY_FIELD}:N", title="Overlay"),
+    ]
+    encoding = {
+        'x': alt.X(f"{config['x_field']}:{x_type}"),
+        'y': alt.Y(f"{config['y_field']}:Q"),
+        'detail': alt.Detail(f"{OVERLAY_FIELD}:N"),
+    }
+    if category_field:
+        # Same colors as the series' lines
+        encoding['color'] = alt.Color(
+            f"{category_field}:N",
+            scale=alt.Scale(domain=variant['categories'], scheme=LINE_COLOR_SCHEME),
+            legend=None
+        )
+        tooltip.append(alt.Tooltip(f"{category_field}:N", title=config.get('category_label') or category_field))
+    else:
+        mark['color'] = TRENDLINE_COLOR
+    if len(labels) > 1:
+        encoding['strokeDash'] = alt.StrokeDash(
+            f"{OVERLAY_FIELD}:N", scale=alt.Scale(domain=labels), legend=alt.Legend(title="Overlay")
+        )
+    else:
+        mark['strokeDash'] = TRENDLINE_DASH
+    if selection is not None:
+        # Overlays follow their series when lines are toggled from the legend
+        encoding['opacity'] = alt.condition(selection, alt.value(TRENDLINE_OPACITY), alt.value(0))
 
+    return alt.Chart(_named(OVERLAY_DATA)).mark_line(**mark).encode(tooltip=tooltip, **encoding)
 
-def _build_multi_line(df: pd.DataFrame, config: dict) -> alt.Chart:
+
+def _build_multi_line(variant: dict, config: dict) -> alt.Chart:
     """Multi-line chart without forecast + interactive toggling."""
     category_field = config['category_field']
     highlight_cats = config.get('category_area_highlight', [])
-    all_categories = sorted(df[category_field].unique())
+    all_categories = variant['categories']
     has_highlight_pair = len(highlight_cats) == 2
+    is_highlight = alt.FieldOneOfPredicate(field=category_field, oneOf=list(highlight_cats))
 
     # Selection (legend) applies only to non-highlight categories (or all if no highlight pair)
     selectable_categories = [c for c in all_categories if (not has_highlight_pair or c not in highlight_cats)]
     selection = None
     if selectable_categories:
         selection = alt.selection_point(
+            name=CATEGORY_SELECTION,
             fields=[category_field],
             bind='legend',
             toggle='true',
@@ -171,16 +309,15 @@ def _build_multi_line(df: pd.DataFrame, config: dict) -> alt.Chart:
 
     # Area (if highlight pair)
     area_chart = None
-    if has_highlight_pair:
-        area_chart = _build_diff_area(df, config, highlight_cats, forecast=False)
+    if DIFF_AREA_DATA in variant['temporal']:
+        area_chart = _encode_diff_area(variant, config, highlight_cats)
 
     point_config = alt.OverlayMarkDef(size=POINT_SIZE, filled=False, fill=POINT_FILL, stroke=POINT_STROKE) if not POINT_VISIBLE else True
 
     # Highlight lines (always visible, no legend entries)
     highlight_layer = None
     if has_highlight_pair:
-        highlight_df = df[df[category_field].isin(highlight_cats)]
-        highlight_layer = alt.Chart(highlight_df).mark_line(
+        highlight_layer = alt.Chart(_named(MAIN_DATA)).transform_filter(is_highlight).mark_line(
             point=point_config, 
             strokeWidth=LINE_STROKE_WIDTH,
             interpolate=LINE_INTERPOLATE
@@ -200,8 +337,10 @@ def _build_multi_line(df: pd.DataFrame, config: dict) -> alt.Chart:
         )
 
     # Other (toggle) lines
-    other_df = df if not has_highlight_pair else df[~df[category_field].isin(highlight_cats)]
-    other_layer = alt.Chart(other_df).mark_line(
+    other_layer = alt.Chart(_named(MAIN_DATA))
+    if has_highlight_pair:
+        other_layer = other_layer.transform_filter(alt.LogicalNotPredicate(**{'not': is_highlight}))
+    other_layer = other_layer.mark_line(
         point=point_config, 
         strokeWidth=LINE_STROKE_WIDTH,
         interpolate=LINE_INTERPOLATE
@@ -226,7 +365,7 @@ def _build_multi_line(df: pd.DataFrame, config: dict) -> alt.Chart:
             alt.value(1),
             alt.value(0) if selectable_categories else alt.value(1)  # was 0.15
         )
-        other_layer = other_layer.add_params(selection)
+        other_layer = other_layer.add_params(selection).properties(name="toggle_lines")
 
     other_layer = other_layer.encode(**other_encoding)
 
@@ -236,6 +375,8 @@ def _build_multi_line(df: pd.DataFrame, config: dict) -> alt.Chart:
     if highlight_layer is not None:
         layers.append(highlight_layer)
     layers.append(other_layer)
+    if OVERLAY_DATA in variant['temporal']:
+        layers.append(_create_overlays(variant, config, selection))
 
     chart = alt.layer(*layers)
     if area_chart is not None:
@@ -244,9 +385,9 @@ def _build_multi_line(df: pd.DataFrame, config: dict) -> alt.Chart:
     return chart.properties(height=CHART_HEIGHT)
 
 
-def _build_single_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _build_single_forecast(variant: dict, config: dict) -> alt.Chart:
     """Single line chart with forecast."""
-    base = alt.Chart(df)
+    base = alt.Chart(_named(MAIN_DATA)).transform_filter(HORIZON_FILTER)
     encoding = _get_base_encoding(config, include_type=True)
     
     point_config = alt.OverlayMarkDef(size=POINT_SIZE, filled=False, fill=POINT_FILL, stroke=POINT_STROKE) if not POINT_VISIBLE else True
@@ -286,20 +427,24 @@ def _build_single_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
         y=alt.Y(f"{config['y_field']}:Q"),
     )
     
-    return (actual + forecast + connector).properties(height=CHART_HEIGHT)
+    chart = actual + forecast + connector
+    if variant['band']:
+        chart = _forecast_band(config, color=alt.value(LINE_SINGLE_COLOR)) + chart
+    return chart.properties(height=CHART_HEIGHT)
 
 
-def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _build_multi_forecast(variant: dict, config: dict) -> alt.Chart:
     """Multi-line forecast chart + interactive toggling for non-highlight categories."""
     category_field = config['category_field']
     highlight_cats = config.get('category_area_highlight', [])
     has_highlight_pair = len(highlight_cats) == 2
-    all_categories = sorted(df[category_field].unique())
+    all_categories = variant['categories']
     selectable_categories = [c for c in all_categories if (not has_highlight_pair or c not in highlight_cats)]
 
     selection = None
     if selectable_categories:
         selection = alt.selection_point(
+            name=CATEGORY_SELECTION,
             fields=[category_field],
             bind='legend',
             toggle='true',
@@ -308,12 +453,12 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
 
     # Area only for Actual data
     area_chart = None
-    if has_highlight_pair:
-        area_chart = _build_diff_area(df, config, highlight_cats, forecast=True)
+    if DIFF_AREA_DATA in variant['temporal']:
+        area_chart = _encode_diff_area(variant, config, highlight_cats)
 
     point_config = alt.OverlayMarkDef(size=POINT_SIZE, filled=False, fill=POINT_FILL, stroke=POINT_STROKE) if not POINT_VISIBLE else True
 
-    def _line_layer(sub_df, type_value, dash=None, legend=True):
+    def _line_layer(subset, type_value, dash=None, legend=True):
         mark_kwargs = {
             'point': point_config,
             'strokeWidth': LINE_STROKE_WIDTH,
@@ -322,7 +467,10 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
         if dash is not None:
             mark_kwargs['strokeDash'] = dash
             
-        mark = alt.Chart(sub_df[sub_df['type'] == type_value]).mark_line(**mark_kwargs)
+        mark = alt.Chart(_named(MAIN_DATA))
+        if subset is not None:
+            mark = mark.transform_filter(subset)
+        mark = mark.transform_filter(alt.datum.type == type_value).transform_filter(HORIZON_FILTER).mark_line(**mark_kwargs)
         enc = {
             'x': alt.X(f"{config['x_field']}:T", title=config['x_label']),
             'y': alt.Y(f"{config['y_field']}:Q", title=config['y_label'], axis=alt.Axis(format=TOOLTIP_AXIS_FORMAT)),
@@ -340,23 +488,43 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
         }
         if selection and legend:
             enc['opacity'] = alt.condition(selection, alt.value(1), alt.value(0))  # was 0.15
-            mark = mark.add_params(selection)
+            mark = mark.add_params(selection).properties(name=f"toggle_{type_value.lower()}")
         return mark.encode(**enc)
 
     # Split highlight vs others
-    highlight_df = df[df[category_field].isin(highlight_cats)] if has_highlight_pair else pd.DataFrame(columns=df.columns)
-    other_df = df if not has_highlight_pair else df[~df[category_field].isin(highlight_cats)]
+    is_highlight = alt.FieldOneOfPredicate(field=category_field, oneOf=list(highlight_cats))
+    has_highlight_rows = has_highlight_pair and any(c in highlight_cats for c in all_categories)
+    highlight_subset = is_highlight if has_highlight_pair else None
+    other_subset = alt.LogicalNotPredicate(**{'not': is_highlight}) if has_highlight_pair else None
 
     layers = []
 
     if area_chart is not None:
         layers.append(area_chart)
 
+    def _band_layer(subset, toggle):
+        color = alt.Color(
+            f"{category_field}:N",
+            scale=alt.Scale(domain=all_categories, scheme=LINE_COLOR_SCHEME),
+            legend=None
+        )
+        if selection and toggle:
+            return _forecast_band(config, subset, color=color, opacity=alt.condition(
+                selection, alt.value(FORECAST_BAND_OPACITY), alt.value(0)
+            ))
+        return _forecast_band(config, subset, color=color)
+
+    has_band = variant['band']
+
     # Highlight layers (always full opacity, no legend)
-    if has_highlight_pair and not highlight_df.empty:
-        layers.append(_line_layer(highlight_df, "Actual", legend=False))
-        layers.append(_line_layer(highlight_df, "Forecast", dash=FORECAST_DASH, legend=False))
-        connector = alt.Chart(highlight_df[highlight_df['type'] == "Connector"]).mark_line(
+    if has_highlight_rows:
+        if has_band:
+            layers.append(_band_layer(highlight_subset, toggle=False))
+        layers.append(_line_layer(highlight_subset, "Actual", legend=False))
+        layers.append(_line_layer(highlight_subset, "Forecast", dash=FORECAST_DASH, legend=False))
+        connector = alt.Chart(_named(MAIN_DATA)).transform_filter(highlight_subset).transform_filter(
+            alt.datum.type == "Connector"
+        ).mark_line(
             point=CONNECTOR_SHOW_POINTS, strokeDash=FORECAST_DASH, strokeWidth=LINE_STROKE_WIDTH
         ).encode(
             x=alt.X(f"{config['x_field']}:T"),
@@ -370,9 +538,14 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
         layers.append(connector)
 
     # Toggle-enabled layers
-    layers.append(_line_layer(other_df, "Actual", legend=True))
-    layers.append(_line_layer(other_df, "Forecast", dash=FORECAST_DASH, legend=True))
-    connector_other = alt.Chart(other_df[other_df['type'] == "Connector"]).mark_line(
+    if has_band and selectable_categories:
+        layers.append(_band_layer(other_subset, toggle=True))
+    layers.append(_line_layer(other_subset, "Actual", legend=True))
+    layers.append(_line_layer(other_subset, "Forecast", dash=FORECAST_DASH, legend=True))
+    connector_other = alt.Chart(_named(MAIN_DATA))
+    if other_subset is not None:
+        connector_other = connector_other.transform_filter(other_subset)
+    connector_other = connector_other.transform_filter(alt.datum.type == "Connector").mark_line(
         point=CONNECTOR_SHOW_POINTS, 
         strokeDash=FORECAST_DASH, 
         strokeWidth=LINE_STROKE_WIDTH,
@@ -388,7 +561,7 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
         opacity=alt.condition(selection, alt.value(1), alt.value(0)) if selection else alt.value(1)  # was 0.15
     )
     if selection:
-        connector_other = connector_other.add_params(selection)
+        connector_other = connector_other.add_params(selection).properties(name="toggle_connector")
     layers.append(connector_other)
 
     chart = alt.layer(*layers)
@@ -398,160 +571,111 @@ def _build_multi_forecast(df: pd.DataFrame, config: dict) -> alt.Chart:
     return chart.properties(height=CHART_HEIGHT)
 
 
-def _build_diff_area(df: pd.DataFrame, config: dict, highlight_cats, forecast: bool = False) -> alt.Chart:
-    """
-    Orchestrates building the differential (Surplus/Deficit) area layer.
+def _diff_area_df(df: pd.DataFrame, config: dict, highlight_cats, forecast: bool = False) -> pd.DataFrame:
     """
-    category_field = config['category_field']
-    x_field = config['x_field']
-    y_field = config['y_field']
-    baseline, other = highlight_cats
+    Differential (Surplus/Deficit) area data for the highlight pair.
 
-    pivot_df, to_datetime = _prepare_diff_area_base(
-        df=df,
-        config=config,
-        highlight_cats=highlight_cats,
-        forecast=forecast
-    )
-    if pivot_df is None:
-        return None
-
-    pivot_df, to_datetime = _insert_crossover_points(
-        pivot_df=pivot_df,
-        x_field=x_field,
-        baseline=baseline,
-        other=other,
-        to_datetime=to_datetime
-    )
-
-    pivot_df = _finalize_diff_area_df(
-        pivot_df=pivot_df,
-        baseline=baseline,
-        other=other
-    )
-
-    return _encode_diff_area(
-        pivot_df=pivot_df,
-        config=config,
-        baseline=baseline,
-        other=other,
-        to_datetime=to_datetime
-    )
-
-
-# ---------------------------
-# Differential area helpers
-# ---------------------------
-
-def _prepare_diff_area_base(df: pd.DataFrame, config: dict, highlight_cats, forecast: bool):
-    """
-    Filter, pivot and compute initial diff state.
-    Returns (pivot_df, to_datetime_flag) or (None, None).
+    Both series on their shared x values, with crossover points inserted
+    where they swap order, split into groups of constant sign.
+    Returns None when the pair has no x value in common.
     """
     category_field = config['category_field']
     x_field = config['x_field']
     y_field = config['y_field']
     baseline, other = highlight_cats
 
-    base_df = df.copy()
-    if forecast and "type" in base_df.columns:
-        base_df = base_df[base_df['type'] == "Actual"]
-
-    base_df = base_df[base_df[category_field].isin(highlight_cats)]
-
-    pivot_df = (
-        base_df
-        .pivot(index=x_field, columns=category_field, values=y_field)
-        .dropna()
-        .reset_index()
-    )
-    if pivot_df.empty:
-        return None, None
-
-    pivot_df['diff'] = pivot_df[baseline] - pivot_df[other]
-    pivot_df['is_positive'] = pivot_df['diff'] >= 0
-
-    to_datetime = pd.api.types.is_datetime64_any_dtype(pivot_df[x_field])
-    return pivot_df, to_datetime
+    # Inner join of the two series on x (what pivot + dropna would give), in NumPy
+    present = (df[x_field].notna() & df[y_field].notna()).to_numpy()
+    store = SeriesStore(df, x_field, category_field, mask=present, categories=highlight_cats)
+    x_all, y_all = store.column(x_field), store.column(y_field).astype(float)
+    key_all = x_all.view('int64') if x_all.dtype.kind == 'M' else x_all
+    actual = store.column('type') == "Actual" if forecast and "type" in df.columns else None
+    pair = []
+    for category in (baseline, other):
+        series = store.slices()[store.index(category)] if category in store.labels else slice(0, 0)
+        key, y = key_all[series], y_all[series]
+        if actual is not None:
+            key, y = key[actual[series]], y[actual[series]]
+        if (key[1:] == key[:-1]).any():
+            raise ValueError(f"Duplicate {x_field} values within '{category}'; aggregate them first")
+        pair.append((key, y))
+    (base_key, y_base), (other_key, y_other) = pair
+    at = np.minimum(np.searchsorted(other_key, base_key), max(len(other_key) - 1, 0))
+    in_base = np.flatnonzero(other_key[at] == base_key) if len(other_key) else np.array([], dtype=np.int64)
+    if len(in_base) == 0:
+        return None
+    y_base, y_other = y_base[in_base], y_other[at[in_base]]
+    shared = base_key[in_base]
+
+    x = pd.Index(shared.view(x_all.dtype) if x_all.dtype.kind == 'M' else shared)
+    if not pd.api.types.is_datetime64_any_dtype(x) and not pd.api.types.is_numeric_dtype(x):
+        x = pd.to_datetime(x)  # Likely datetime strings
+    to_datetime = pd.api.types.is_datetime64_any_dtype(x)
+    x_values = x.as_unit('ns').asi8 if to_datetime else x.to_numpy(dtype=float)
+
+    x_out, b_out, o_out, is_positive = _crossover_kernel(x_values, y_base, y_other)
+    group_id = np.cumsum(np.r_[True, is_positive[1:] != is_positive[:-1]])
+    return pd.DataFrame({
+        x_field: x_out.view('datetime64[ns]') if to_datetime else x_out,
+        baseline: b_out,
+        other: o_out,
+        'diff': b_out - o_out,
+        'is_positive': is_positive,
+        'group_id': group_id,
+        'diff_label': pd.Categorical.from_codes(is_positive.astype(np.int8), ['Deficit', 'Surplus']),
+        'upper': np.maximum(b_out, o_out),
+        'lower': np.minimum(b_out, o_out),
+    })
 
 
-def _insert_crossover_points(pivot_df: pd.DataFrame, x_field: str, baseline: str, other: str, to_datetime: bool):
+def _crossover_kernel(x: np.ndarray, baseline: np.ndarray, other: np.ndarray) -> tuple:
     """
     Insert interpolated crossover points so adjacent positive/negative
     areas meet without gaps.
-    """
-    # Determine if we need datetime conversion
-    needs_datetime_conversion = False
-    if to_datetime:
-        x_numeric = pivot_df[x_field].view('int64').to_list()
-    else:
-        # Check if x_field is numeric, if not try to convert to datetime first
-        if pd.api.types.is_numeric_dtype(pivot_df[x_field]):
-            x_numeric = pivot_df[x_field].astype(float).to_list()
-        else:
-            # Likely datetime strings - convert to datetime then to numeric
-            pivot_df[x_field] = pd.to_datetime(pivot_df[x_field])
-            x_numeric = pivot_df[x_field].view('int64').to_list()
-            to_datetime = True
-            needs_datetime_conversion = True
-
-    b_vals = pivot_df[baseline].to_list()
-    o_vals = pivot_df[other].to_list()
-    is_pos = pivot_df['is_positive'].to_list()
-
-    new_rows = []
-    for i in range(len(pivot_df) - 1):
-        if is_pos[i] != is_pos[i + 1]:
-            db = b_vals[i + 1] - b_vals[i]
-            do = o_vals[i + 1] - o_vals[i]
-            denom = (db - do)
-            if denom == 0:
-                continue
-            f = (o_vals[i] - b_vals[i]) / denom
-            if not (0 < f < 1):
-                continue
-            x_cross_num = x_numeric[i] + f * (x_numeric[i + 1] - x_numeric[i])
-            y_cross = b_vals[i] + f * db
-            x_cross = pd.to_datetime(int(x_cross_num)) if to_datetime else x_cross_num
-            new_rows.append({
-                x_field: x_cross,
-                baseline: y_cross,
-                other: y_cross,
-                'diff': 0.0,
-                'is_positive': is_pos[i]
-            })
-            new_rows.append({
-                x_field: x_cross,
-                baseline: y_cross,
-                other: y_cross,
-                'diff': 0.0,
-                'is_positive': is_pos[i + 1]
-            })
-
-    if new_rows:
-        pivot_df = pd.concat([pivot_df, pd.DataFrame(new_rows)], ignore_index=True)
-        pivot_df = pivot_df.sort_values(x_field, kind='mergesort').reset_index(drop=True)
-
-    return pivot_df, to_datetime
-
-
-def _finalize_diff_area_df(pivot_df: pd.DataFrame, baseline: str, other: str) -> pd.DataFrame:
-    """
-    After crossover insertion, recompute grouping and bounds.
-    """
-    pivot_df['group_id'] = (pivot_df['is_positive'] != pivot_df['is_positive'].shift()).cumsum()
-    pivot_df['diff_label'] = pivot_df['is_positive'].map({True: 'Surplus', False: 'Deficit'})
-    pivot_df['upper'] = pivot_df[[baseline, other]].max(axis=1)
-    pivot_df['lower'] = pivot_df[[baseline, other]].min(axis=1)
-    return pivot_df
-
 
-def _encode_diff_area(pivot_df: pd.DataFrame, config: dict, baseline: str, other: str, to_datetime: bool):
+    Where the sign of baseline - other flips between consecutive points the
+    lines meet at a linearly interpolated x; two points are added there, the
+    first closing the area on one side and the second opening the other.
+    x is sorted (int64 nanoseconds or floats). Returns (x, baseline, other,
+    is_positive) with the crossings in place.
+    """
+    is_positive = baseline - other >= 0
+    flips = np.flatnonzero(is_positive[:-1] != is_positive[1:])
+    db = baseline[flips + 1] - baseline[flips]
+    do = other[flips + 1] - other[flips]
+    denom = db - do
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = (other[flips] - baseline[flips]) / denom
+    crossing = (denom != 0) & (f > 0) & (f < 1)
+    flips, f, db = flips[crossing], f[crossing], db[crossing]
+
+    step = f * (x[flips + 1] - x[flips])
+    x_cross = x[flips] + (step.astype(x.dtype) if x.dtype.kind in 'iu' else step)
+    y_cross = baseline[flips] + f * db
+
+    # Each original point moves down by two slots per crossing before it
+    n, k = len(x), len(flips)
+    original = np.arange(n) + 2 * np.searchsorted(flips, np.arange(n), side='left')
+    first = flips + 1 + 2 * np.arange(k)
+    out_x = np.empty(n + 2 * k, dtype=x.dtype)
+    out_b = np.empty(n + 2 * k)
+    out_o = np.empty(n + 2 * k)
+    out_positive = np.empty(n + 2 * k, dtype=bool)
+    out_x[original], out_b[original], out_o[original], out_positive[original] = x, baseline, other, is_positive
+    for slot, side in ((first, flips), (first + 1, flips + 1)):
+        out_x[slot], out_b[slot], out_o[slot] = x_cross, y_cross, y_cross
+        out_positive[slot] = is_positive[side]
+    return out_x, out_b, out_o, out_positive
+
+
+def _encode_diff_area(variant: dict, config: dict, highlight_cats):
     """
     Encode the Altair differential area chart.
     """
     x_field = config['x_field']
-    area = alt.Chart(pivot_df).mark_area().encode(
+    baseline, other = highlight_cats
+    to_datetime = x_field in variant['temporal'][DIFF_AREA_DATA]
+    area = alt.Chart(_named(DIFF_AREA_DATA)).mark_area().encode(
         x=f"{x_field}:T" if to_datetime else alt.X(f"{x_field}:Q"),
         y="upper:Q",
         y2="lower:Q",
@@ -571,9 +695,9 @@ def _encode_diff_area(pivot_df: pd.DataFrame, config: dict, baseline: str, other
     return area
 
 
-def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
+def _reference_df(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     """
-    Build a reference line (horizontal or vertical dashed line).
+    Data for a reference line (horizontal or vertical dashed line).
     
     Args:
         df: DataFrame (used for domain inference)
@@ -581,7 +705,7 @@ def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
                where axis is 'x' or 'y', value is the reference value, and label is optional
     
     Returns:
-        Altair Chart with reference line or None if invalid configuration
+        Single-row DataFrame or None if invalid configuration
     """
     reference_line = config.get('reference_line')
     if not reference_line or len(reference_line) < 2:
@@ -589,19 +713,10 @@ def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
     
     axis = reference_line[0]
     value = reference_line[1]
-    label = reference_line[2] if len(reference_line) > 2 else "Target"
     
     if axis.lower() == 'y':
         # Horizontal reference line
-        ref_df = pd.DataFrame({config['y_field']: [value]})
-        return alt.Chart(ref_df).mark_rule(
-            strokeDash=REFERENCE_LINE_DASH,
-            color=REFERENCE_LINE_COLOR,
-            strokeWidth=REFERENCE_LINE_WIDTH
-        ).encode(
-            y=alt.Y(f"{config['y_field']}:Q"),
-            tooltip=[alt.Tooltip(f"{config['y_field']}:Q", title=label, format=TOOLTIP_NUMBER_FORMAT)]
-        )
+        return pd.DataFrame({config['y_field']: [value]})
     
     elif axis.lower() == 'x':
         # Vertical reference line
@@ -612,24 +727,30 @@ def _build_reference_line(df: pd.DataFrame, config: dict) -> alt.Chart:
         if pd.api.types.is_datetime64_any_dtype(df[x_field]):
             if not isinstance(value, pd.Timestamp):
                 x_value = pd.to_datetime(value)
-            ref_df = pd.DataFrame({x_field: [x_value]})
-            return alt.Chart(ref_df).mark_rule(
-                strokeDash=REFERENCE_LINE_DASH,
-                color=REFERENCE_LINE_COLOR,
-                strokeWidth=REFERENCE_LINE_WIDTH
-            ).encode(
-                x=alt.X(f"{x_field}:T"),
-                tooltip=[alt.Tooltip(f"{x_field}:T", title=label)]
-            )
-        else:
-            ref_df = pd.DataFrame({x_field: [x_value]})
-            return alt.Chart(ref_df).mark_rule(
-                strokeDash=REFERENCE_LINE_DASH,
-                color=REFERENCE_LINE_COLOR,
-                strokeWidth=REFERENCE_LINE_WIDTH
-            ).encode(
-                x=alt.X(f"{x_field}:Q"),
-                tooltip=[alt.Tooltip(f"{x_field}:Q", title=label)]
-            )
+        return pd.DataFrame({x_field: [x_value]})
+    
+    return None
+
+
+def _build_reference_line(variant: dict, config: dict) -> alt.Chart:
+    """Build the reference line layer from its single-row dataset."""
+    axis, _value, *rest = config['reference_line']
+    label = rest[0] if rest else "Target"
+    rule = alt.Chart(_named(REFERENCE_DATA)).mark_rule(
+        strokeDash=REFERENCE_LINE_DASH,
+        color=REFERENCE_LINE_COLOR,
+        strokeWidth=REFERENCE_LINE_WIDTH
+    )
     
-    return None
\ No newline at end of file
+    if axis.lower() == 'y':
+        return rule.encode(
+            y=alt.Y(f"{config['y_field']}:Q"),
+            tooltip=[alt.Tooltip(f"{config['y_field']}:Q", title=label, format=TOOLTIP_NUMBER_FORMAT)]
+        )
+    
+    x_field = config['x_field']
+    x_type = "T" if x_field in variant['temporal'][REFERENCE_DATA] else "Q"
+    return rule.encode(
+        x=alt.X(f"{x_field}:{x_type}"),
+        tooltip=[alt.Tooltip(f"{x_field}:{x_type}", title=label)]
+    )
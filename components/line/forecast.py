@@ -1,103 +1,47 @@
 """Prophet-based forecasting"""
 
 from typing import Optional
-import streamlit as st
+import numpy as np
 import pandas as pd
-from prophet import Prophet
 
-MAX_FORECAST_PERIODS = 24
+from utils.bulk_forecast import load_forecasts
+from utils.chart_forecast import MAX_FORECAST_PERIODS, compute_forecast_df
+from utils.large_data import chart_rows
+from utils.series_store import SeriesStore
+
 DEFAULT_FORECAST_PERIODS = 12
 FORECAST_OPTIONS = [6, 12, 18, 24]
+STEP_FIELD = "forecast_step"  # Periods ahead of the last actual; the chart filters on it in the browser
+
+def create_forecast_df(config, forecast_periods: int = MAX_FORECAST_PERIODS, placeholder=None):
+    """
+    Generate the forecast dataframe with a STEP_FIELD column.
 
-def create_forecast_df(config, forecast_periods: int = DEFAULT_FORECAST_PERIODS):
-    """Generate (and slice) forecast dataframe. UI selection is handled by caller."""
+    Charts embed all MAX_FORECAST_PERIODS steps and let the viewer pick the
+    horizon client-side; forecast_periods only trims rows server-side.
+    """
     if not config.get('forecast', False):
         return pd.DataFrame()
 
-    df = config['df'].copy()
+    df = chart_rows(config['df'], config).copy()
     x_field = config['x_field']
     category_field = config.get('category_field')
     
-    # Generate forecast once with maximum periods (cached across reloads)
-    with st.spinner("Generating forecast..."):
-        full_forecast_df = _generate_forecast_df(
-            df, x_field, config['y_field'], MAX_FORECAST_PERIODS, category_field
-        )
+    if config.get('forecast_source'):
+        # Precomputed by utils.bulk_forecast: nothing to fit during the rerun
+        entities = df[category_field].unique() if category_field else None
+        full_forecast_df = load_forecasts(config['forecast_source'], x_field, config['y_field'], category_field, entities)
+    else:
+        full_forecast_df = compute_forecast_df(config, df, _infer_frequency, placeholder)
     
     if full_forecast_df.empty:
         return pd.DataFrame()
     
-    # Slice forecast based on provided forecast_periods (no internal UI)
-    if category_field:
-        # Slice each category separately
-        sliced_forecasts = [
-            full_forecast_df[full_forecast_df[category_field] == category]
-                .sort_values(by=x_field)
-                .head(forecast_periods)
-            for category in full_forecast_df[category_field].unique()
-        ]
-        return pd.concat(sliced_forecasts, ignore_index=True)
-    
-    return full_forecast_df.sort_values(by=x_field).head(forecast_periods)
-
+    # Number the steps of each series so the horizon can be filtered in the browser
+    full_forecast_df = full_forecast_df.sort_values(by=x_field, kind='mergesort').reset_index(drop=True)
+    full_forecast_df[STEP_FIELD] = SeriesStore(full_forecast_df, x_field, category_field).ranks() + 1
+    return full_forecast_df[full_forecast_df[STEP_FIELD] <= forecast_periods].reset_index(drop=True)
 
-@st.cache_data(show_spinner=False)
-def _generate_forecast_df(
-    df: pd.DataFrame,
-    x_field: str,
-    y_field: str,
-    periods: int,
-    category_field: Optional[str] = None
-) -> pd.DataFrame:
-    """Generate forecast using Prophet model."""
-    
-    if category_field is None:
-        return _forecast_single(df, x_field, y_field, periods)
-    
-    # Forecast each category separately
-    all_forecasts = []
-    for category in sorted(df[category_field].unique()):
-        category_df = df[df[category_field] == category].copy()
-        if len(category_df) >= 2:
-            forecast_df = _forecast_single(category_df, x_field, y_field, periods)
-            forecast_df[category_field] = str(category)
-            all_forecasts.append(forecast_df)
-    
-    return pd.concat(all_forecasts, ignore_index=True) if all_forecasts else pd.DataFrame()
-
-
-def _forecast_single(df: pd.DataFrame, x_field: str, y_field: str, periods: int) -> pd.DataFrame:
-    """Forecast a single time series."""
-    # Prepare data for Prophet
-    prophet_df = df[[x_field, y_field]].rename(columns={x_field: "ds", y_field: "y"})
-    
-    # Infer frequency from time series
-    freq = _infer_frequency(df[x_field])
-    
-    # Train Prophet model with specified seasonality and changepoints
-    model = Prophet(
-        yearly_seasonality=True,      # Enable yearly seasonality
-        weekly_seasonality=False,     # Disable weekly seasonality
-        daily_seasonality=False,      # Disable daily seasonality
-        n_changepoints=10,            # Number of changepoints for trend flexibility
-        seasonality_mode="additive",  # Use additive seasonality
-        interval_width=0.0,           # No uncertainty interval
-    )
-    model.fit(prophet_df)             # Fit model to historical data
-    
-    # Generate future dates and predict values
-    future = model.make_future_dataframe(
-        periods=periods,              # Number of periods to forecast
-        freq=freq,                    # Frequency inferred from data
-        include_history=False         # Only forecast future, exclude history
-    )
-    forecast = model.predict(future)  # Predict future values
-    
-    return pd.DataFrame({
-        x_field: forecast['ds'],
-        y_field: forecast['yhat'],
-        "type": "Forecast"
-    })
 
 def _infer_frequency(date_series: pd.Series) -> str:
     """Infer frequency from a datetime series, defaulting to daily."""
@@ -123,7 +67,7 @@ def _infer_frequency(date_series: pd.Series) -> str:
     
     return "D"  # Default to daily
 
-def create_connector_df(
+def plot_frame(
     actual_df: pd.DataFrame,
     forecast_df: pd.DataFrame,
     x_field: str,
@@ -131,68 +75,36 @@ def create_connector_df(
     category_field: Optional[str] = None
 ) -> pd.DataFrame:
     """
-    Create connecting lines between actual and forecasted data.
-    
+    Actual, forecast and connector rows in one frame, told apart by a "type" column.
+
     Connectors provide a visual bridge between the last actual point
-    and the first forecast point for smooth chart transitions.
+    and the first forecast point of each series for smooth chart transitions.
+    All rows are gathered into a single concat whatever the number of series.
     """
-    if forecast_df.empty:
-        return pd.DataFrame()
-    
-    if category_field is None:
-        return _create_single_connector(actual_df, forecast_df, x_field, y_field)
-    
-    return _create_multi_connector(actual_df, forecast_df, x_field, y_field, category_field)
+    parts = [actual_df]
+    if not forecast_df.empty:
+        parts += [forecast_df, _connector_rows(actual_df, forecast_df, x_field, y_field, category_field)]
+    plot_df = pd.concat(parts, ignore_index=True)
+    types = np.array(["Actual", "Forecast", "Connector"][:len(parts)], dtype=object)
+    plot_df["type"] = np.repeat(types, [len(part) for part in parts])
+    return plot_df
 
-def _create_single_connector(
-    actual_df: pd.DataFrame, 
-    forecast_df: pd.DataFrame, 
-    x_field: str, 
-    y_field: str
-) -> pd.DataFrame:
-    """Create connector for single series."""
-    last_actual = actual_df.sort_values(by=x_field).iloc[-1]
-    first_forecast = forecast_df.sort_values(by=x_field).iloc[0]
-    
-    return pd.DataFrame([
-        {x_field: last_actual[x_field], y_field: last_actual[y_field], "type": "Connector"},
-        {x_field: first_forecast[x_field], y_field: first_forecast[y_field], "type": "Connector"}
-    ])
 
-def _create_multi_connector(
-    actual_df: pd.DataFrame, 
-    forecast_df: pd.DataFrame, 
-    x_field: str, 
+def _connector_rows(
+    actual_df: pd.DataFrame,
+    forecast_df: pd.DataFrame,
+    x_field: str,
     y_field: str,
-    category_field: str
+    category_field: Optional[str] = None
 ) -> pd.DataFrame:
-    """Create connectors for multi-series."""
-    connectors = []
-    
-    for category in sorted(actual_df[category_field].unique()):
-        category = str(category)
-        cat_actual = actual_df[actual_df[category_field] == category].sort_values(by=x_field)
-        cat_forecast = forecast_df[forecast_df[category_field] == category].sort_values(by=x_field)
-        
-        if cat_actual.empty or cat_forecast.empty:
-            continue
-        
-        last_actual = cat_actual.iloc[-1]
-        first_forecast = cat_forecast.iloc[0]
-        
-        connectors.append(pd.DataFrame([
-            {
-                x_field: last_actual[x_field], 
-                y_field: last_actual[y_field],
-                category_field: category,
-                "type": "Connector"
-            },
-            {
-                x_field: first_forecast[x_field], 
-                y_field: first_forecast[y_field],
-                category_field: category,
-                "type": "Connector"
-            }
-        ]))
-    
-    return pd.concat(connectors, ignore_index=True) if connectors else pd.DataFrame()
+    """Last actual and first forecast point of every series that has both, in pairs."""
+    fields = [x_field, y_field] + ([category_field] if category_field else [])
+    ends = pd.concat([
+        SeriesStore(actual_df, x_field, category_field).tail()[fields],
+        SeriesStore(forecast_df, x_field, category_field).head()[fields],
+    ], ignore_index=True)
+    if category_field:
+        # Forecast categories are labels; keep those with both ends, each as (last actual, first forecast)
+        ends[category_field] = ends[category_field].astype(str)
+        ends = ends[ends.duplicated(category_field, keep=False)].sort_values(category_field, kind='mergesort')
+    return ends
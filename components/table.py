@@ -2,8 +2,11 @@
 
 import streamlit as st
 
+from utils.filters import filter_config
+
 
 def render_table(config):
+    config = filter_config(config)
     st.subheader(config['title'])
     st.caption(config['description'])
     st.dataframe(
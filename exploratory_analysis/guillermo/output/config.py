@@ -1,5 +1,5 @@
-import pandas as pd
-def csv_to_df(f): return pd.read_csv(__file__.replace('config.py', f'{f}.csv'))
+from utils.datasets import read_csv
+def csv_to_df(f): return read_csv(__file__.replace('config.py', f'{f}.csv'))
 
 
 config = [
@@ -17,8 +17,8 @@ config = [
                 'category_label': 'Metric',
                 'category_area_highlight': ['recorded_logged_hours', 'defined_role_hours'],
                 'y_field': 'hours',
-                'y_label': 'Total Hours per Month',
-                
+                'y_label': 'Total Hours',
+                'granularity': True,
             },
             
 
@@ -1,6 +1,7 @@
-import pandas as pd
 import os
 
+from utils.datasets import read_csv
+
 # Helper function to read CSVs from outputs folder
 
 
@@ -9,7 +10,7 @@ def csv_to_df(f):
     config_dir = os.path.dirname(os.path.abspath(__file__))
     # Look for CSV in output/ subfolder
     csv_path = os.path.join(config_dir, '', f'{f}.csv')
-    return pd.read_csv(csv_path)
+    return read_csv(csv_path)
 
 
 # Read KPIs for markdown
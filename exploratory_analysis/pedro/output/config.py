@@ -1,5 +1,5 @@
-import pandas as pd
-def csv_to_df(f): return pd.read_csv(__file__.replace('config.py', f'{f}.csv'))
+from utils.datasets import read_csv
+def csv_to_df(f): return read_csv(__file__.replace('config.py', f'{f}.csv'))
 
 
 config = [
@@ -24,12 +24,22 @@ config = [
                         'title': 'Common Configuration Fields',
                         'content': """
                         - `df`: DataFrame source for the chart.
+                        - `pipeline`: Instead of `df`, a list of steps run on the raw tables in `resources/raw_data`: `source`, then any `filter`, `join`, `groupby`/`agg`, `resample` and `pivot` steps (see the Pipeline example below). Steps shared by several charts are computed once.
                         - `x_field`, `x_label`: Field and label for the x-axis.
                         - `y_field`, `y_label`: Field and label for the y-axis.
                         - `category_field`, `category_label`: For charts with multiple categories.
                         - `reference_line`: Tuple for axis reference markers, e.g. `('y', 7500, 'Target')`.
-                        - `trendline`: Boolean to add a regression line.
+                        - `trendline`: Boolean to add a regression line (one per series on multi-category charts).
+                        - `moving_average`, `rolling_regression`: Window in points of a trailing moving average or rolling linear trend drawn over each series (line charts and vertical bar charts without forecast).
+                        - `forecast_engine`: Forecast engine for time-based charts (`'prophet'` by default; `'holt'`, `'drift'` or `'seasonal_naive'` are cheaper). Compare them with `python -m benchmarks.forecast_backtest`.
+                        - `forecast_tuning`: Boolean to tune the forecast engine and its settings per series (in the background, results are reused).
+                        - `forecast_interval`: `True`/`'analytic'` or `'bootstrap'` to shade an uncertainty band around the forecast (`forecast_interval_level`, default 0.8).
+                        - `forecast_hierarchy`: `True`/`'bottom_up'` or `'mint'` to forecast the categories of a `category_field` chart together so they add up to a reconciled total.
+                        - `forecast_source`: Name of a series set precomputed with `python -m utils.bulk_forecast` (e.g. `'consultants'`, `'projects'`); its entities are matched to `category_field` and nothing is fitted while rendering.
+                        - `max_points`: Points drawn per line (default 1000); longer series are downsampled with LTTB, which keeps their peaks and troughs. `0` draws every point.
                         - `orientation`: `'horizontal'` for horizontal bar charts.
+                        - `large_data`: Aggregate rows per x value and category on the server before drawing (on by default above 5,000 rows), so raw per-entry frames can be plotted; `aggregate` picks `'sum'` (default), `'mean'`, `'median'`, `'min'`, `'max'` or `'count'`.
+                        - `max_categories`: For `category_field` charts, keep the N categories with the largest total and fold the rest into an `'Other'` series (smaller legend and spec, fewer forecasts). Highlighted categories (`category_area_highlight`) are always kept.
 
                         See each example below for specific configurations.
                         """
@@ -505,6 +515,55 @@ config = [
                 ],
             },
 
+            {
+                'columns': [
+                    {
+                        'type': 'line',
+                        'title': 'Pipeline Chart',
+                        'description': 'Billable hours per client and quarter, built from the raw time entries',
+                        'pipeline': [
+                            {'source': 'fct__time_entries'},
+                            {'join': 'dim__projects__anonymized', 'on': 'project_id', 'columns': ['client_anon']},
+                            {'filter': {'billable': True}},
+                            {'resample': 'quarter', 'on': 'dt', 'groupby': ['client_anon'], 'agg': {'hours': 'sum'}},
+                        ],
+                        'x_field': 'dt',
+                        'x_label': 'Quarter',
+                        'category_field': 'client_anon',
+                        'category_label': 'Client',
+                        'y_field': 'hours',
+                        'y_label': 'Billable Hours',
+                        'max_categories': 5,
+                    },
+                    {
+                        'type': 'markdown',
+                        'title': 'Config',
+                        'content': """
+                        ```javascript
+                        {
+                            'type': 'line',
+                            'title': 'Pipeline Chart',
+                            'description': 'Billable hours per client and quarter, built from the raw time entries',
+                            'pipeline': [
+                                {'source': 'fct__time_entries'},
+                                {'join': 'dim__projects__anonymized', 'on': 'project_id', 'columns': ['client_anon']},
+                                {'filter': {'billable': True}},
+                                {'resample': 'quarter', 'on': 'dt', 'groupby': ['client_anon'], 'agg': {'hours': 'sum'}},
+                            ],
+                            'x_field': 'dt',
+                            'x_label': 'Quarter',
+                            'category_field': 'client_anon',
+                            'category_label': 'Client',
+                            'y_field': 'hours',
+                            'y_label': 'Billable Hours',
+                            'max_categories': 5,
+                        }
+                        ```
+                        """
+                    },
+                ]
+            },
+
             {
                 'columns': [
                     {
@@ -1,9 +1,10 @@
 from pathlib import Path
-import pandas as pd
+
+from utils.datasets import read_csv
 
 HERE = Path(__file__).resolve()
 def csv_to_df(name): 
-    return pd.read_csv(HERE.parent / f"{name}.csv")
+    return read_csv(HERE.parent / f"{name}.csv")
 
 INTRO_RS = """
 **Why this matters**
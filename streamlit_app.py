@@ -5,7 +5,9 @@ Entry point for the Data Edge Dashboard (Streamlit).
 import streamlit as st
 from collections import defaultdict
 
-from utils.chart_loader import render_chart
+from utils.chart_loader import render_chart, resolve_df
+from utils.filters import select_filters
+from utils.time_index import select_date_range, time_bounds
 
 from utils.overview import config as overview_config
 from exploratory_analysis.pedro.output.config import config as pedro_config
@@ -48,6 +50,20 @@ def render_header() -> None:
     Group 6: Guillermo Contreras, Osei Caesar, Pedro Netto and Waldean Nelson
     """)
 
+def render_filters() -> None:
+    """Render the sidebar date range and attribute filters that every chart is narrowed to."""
+    items = [
+        column_item
+        for config in chart_configs
+        for item in config['items']
+        for column_item in item.get('columns', [item])
+    ]
+    # Cube and pipeline charts get their frame first, so their data counts towards the bounds
+    for item in items:
+        resolve_df(item)
+    select_date_range(time_bounds(items))
+    select_filters(items)
+
 def render_nav_and_content() -> None:
     """Render navigation tabs and chart content, with a standalone summary/intro tab."""
     # Create a summary/intro tab as the first tab
@@ -78,6 +94,7 @@ def render_nav_and_content() -> None:
 def main() -> None:
     configure_page()
     render_header()
+    render_filters()
     render_nav_and_content()
 
 
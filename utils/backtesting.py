@@ -0,0 +1,102 @@
+"""Rolling-origin evaluation of forecast engines"""
+
+import time
+import tracemalloc
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.forecast_engines import get_engine, season_length
+
+DEFAULT_HORIZON = 6
+DEFAULT_ORIGINS = 4
+MIN_TRAIN_SIZE = 12
+
+
+def rolling_origins(n_obs: int, horizon: int, n_origins: int, min_train: int = MIN_TRAIN_SIZE) -> list:
+    """
+    Training-set end indices for rolling-origin evaluation.
+
+    The last origin leaves exactly `horizon` points to score; earlier origins
+    step back one horizon at a time. Origins with too little history are dropped.
+    """
+    ends = [n_obs - horizon * (i + 1) for i in range(n_origins)]
+    return sorted(end for end in ends if end >= min_train)
+
+
+def mape(actual: np.ndarray, predicted: np.ndarray) -> float:
+    """Mean absolute percentage error (zeros in actual are ignored)."""
+    mask = actual != 0
+    if not mask.any():
+        return float("nan")
+    return float(np.mean(np.abs((actual[mask] - predicted[mask]) / actual[mask])) * 100)
+
+
+def mase(actual: np.ndarray, predicted: np.ndarray, train: np.ndarray, m: int = 1) -> float:
+    """Mean absolute scaled error against the in-sample seasonal naive forecast."""
+    m = m if len(train) > m else 1
+    scale = np.mean(np.abs(train[m:] - train[:-m])) if len(train) > m else float("nan")
+    if not scale:
+        return float("nan")
+    return float(np.mean(np.abs(actual - predicted)) / scale)
+
+
+def backtest_series(
+    ds: pd.Series,
+    y: np.ndarray,
+    freq: str,
+    engine: str,
+    settings: Optional[dict] = None,
+    horizon: int = DEFAULT_HORIZON,
+    n_origins: int = DEFAULT_ORIGINS,
+    measure_memory: bool = True,
+) -> Optional[dict]:
+    """
+    Rolling-origin backtest of one engine/setting on one series.
+
+    Returns averaged fit/predict seconds, MAPE and MASE across origins plus
+    the peak Python heap of one fit+predict (tracemalloc, so memory used by
+    CmdStan's subprocess is not included). None if the series is too short.
+    """
+    settings = settings or {}
+    ds = pd.to_datetime(pd.Series(ds)).reset_index(drop=True)
+    y = np.asarray(y, dtype=float)
+    origins = rolling_origins(len(y), horizon, n_origins)
+    if not origins:
+        return None
+
+    m = season_length(freq)
+    fit_times, predict_times, mapes, mases = [], [], [], []
+    for end in origins:
+        model = get_engine(engine, **settings)
+        start = time.perf_counter()
+        model.fit(ds.iloc[:end], y[:end])
+        fit_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        predicted = model.predict(horizon, freq)['yhat'].to_numpy()
+        predict_times.append(time.perf_counter() - start)
+
+        actual = y[end:end + horizon]
+        mapes.append(mape(actual, predicted))
+        mases.append(mase(actual, predicted, y[:end], m))
+
+    # Memory is measured separately: tracemalloc would distort the timings above
+    peak_mb = float("nan")
+    if measure_memory:
+        tracemalloc.start()
+        get_engine(engine, **settings).fit(ds.iloc[:origins[-1]], y[:origins[-1]]).predict(horizon, freq)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    return {
+        'n_obs': len(y),
+        'horizon': horizon,
+        'origins': len(origins),
+        'fit_seconds': float(np.mean(fit_times)),
+        'predict_seconds': float(np.mean(predict_times)),
+        'peak_memory_mb': peak_mb,
+        'mape': float(np.nanmean(mapes)),
+        'mase': float(np.nanmean(mases)),
+    }
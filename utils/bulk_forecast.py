@@ -0,0 +1,288 @@
+"""
+Batch forecasts for many entity-level series (consultants, projects, ...).
+
+Usage:
+    python -m utils.bulk_forecast consultants [--engine holt] [--workers 8]
+    python -m utils.bulk_forecast projects --restart
+
+Series are forecast in parallel, in chunks. Every finished chunk is written
+as its own Parquet part file, so an interrupted run picks up where it
+stopped: entities already present in the output directory are skipped.
+The dashboard reads the results with config['forecast_source'] instead of
+fitting those series on every rerun.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from utils.cache import LRUCache
+from utils.fingerprint import make_key
+from utils.forecast_engines import get_engine
+from utils.forecast_intervals import DEFAULT_INTERVAL_LEVEL, LOWER_FIELD, UPPER_FIELD, add_interval
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIME_ENTRIES_PATH = os.path.join(ROOT, 'resources', 'raw_data', 'fct__time_entries.csv')
+FORECASTS_DIR = os.path.join(ROOT, 'resources', 'forecasts')
+
+DEFAULT_ENGINE = "holt"  # Cheap enough for hundreds of series; see benchmarks/forecast_backtest.py
+DEFAULT_PERIODS = 24     # Matches MAX_FORECAST_PERIODS so charts can slice any horizon
+DEFAULT_FREQ = "MS"
+CHUNK_SIZE = 25          # Series per task and per checkpoint file
+MIN_OBSERVATIONS = 3
+
+# Column names of the output files
+ENTITY_COLUMN = "entity"
+MANIFEST_NAME = "_manifest.json"
+
+_loaded = LRUCache(max_size=16)
+
+
+def consultant_utilization(time_entries: pd.DataFrame) -> pd.DataFrame:
+    """Monthly logged utilization (% of logged hours that are billable) per consultant."""
+    entries = time_entries.assign(
+        month=pd.to_datetime(time_entries['dt']).dt.to_period('M').dt.to_timestamp(),
+        billable_hours=time_entries['hours'].where(time_entries['billable'].astype(bool), 0.0),
+    )
+    monthly = entries.groupby(['user_id', 'month'], as_index=False)[['billable_hours', 'hours']].sum()
+    monthly = monthly[monthly['hours'] > 0]
+    monthly['utilization'] = monthly['billable_hours'] / monthly['hours'] * 100
+    return monthly[['user_id', 'month', 'utilization']]
+
+
+def project_hours(time_entries: pd.DataFrame) -> pd.DataFrame:
+    """Monthly logged hours per project, with idle months inside a project's lifetime as zero."""
+    entries = time_entries.assign(month=pd.to_datetime(time_entries['dt']).dt.to_period('M').dt.to_timestamp())
+    monthly = entries.groupby(['project_id', 'month'])['hours'].sum()
+    filled = [
+        group.droplevel(0).reindex(pd.date_range(group.index[0][1], group.index[-1][1], freq='MS'), fill_value=0.0)
+            .rename_axis('month').reset_index().assign(project_id=project_id)
+        for project_id, group in monthly.groupby(level=0)
+    ]
+    return pd.concat(filled, ignore_index=True)[['project_id', 'month', 'hours']]
+
+
+# name -> (builder, id field, value field)
+SERIES_SETS = {
+    'consultants': (consultant_utilization, 'user_id', 'utilization'),
+    'projects': (project_hours, 'project_id', 'hours'),
+}
+
+
+def _forecast_chunk(
+    chunk: list,
+    engine: str,
+    settings: dict,
+    periods: int,
+    freq: str,
+    interval: Optional[tuple],
+) -> tuple:
+    """Forecast a list of (entity, ds, y). Runs on a worker process; returns (frame, failed ids)."""
+    frames, failed = [], []
+    for entity, ds, y in chunk:
+        try:
+            model = get_engine(engine, **settings).fit(ds, y)
+            forecast = model.predict(periods, freq)
+            if interval is not None:
+                method, level = interval
+                forecast = add_interval(forecast, model.residuals(freq), level, method)
+                forecast = forecast.rename(columns={'yhat_lower': LOWER_FIELD, 'yhat_upper': UPPER_FIELD})
+            frames.append(forecast.assign(**{ENTITY_COLUMN: str(entity)}))
+        except Exception:
+            failed.append(str(entity))  # one bad series must not sink the chunk
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return frame, failed
+
+
+def _completed_entities(output_dir: str) -> set:
+    parts = [name for name in os.listdir(output_dir) if name.endswith('.parquet')]
+    if not parts:
+        return set()
+    return set(pd.read_parquet(output_dir, columns=[ENTITY_COLUMN])[ENTITY_COLUMN].unique())
+
+
+def _write_part(output_dir: str, frame: pd.DataFrame, entities: list) -> None:
+    # Named after its entities, so retrying a chunk overwrites rather than duplicates
+    path = os.path.join(output_dir, f"part-{make_key(*sorted(entities))[:16]}.parquet")
+    tmp_path = f"{path}.tmp"
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _is_output_file(name: str) -> bool:
+    """Whether a file name is one forecast_many writes: a part, a part being written, or the manifest."""
+    return name == MANIFEST_NAME or (name.startswith('part-') and name.endswith(('.parquet', '.parquet.tmp')))
+
+
+def _clear_output(output_dir: str) -> None:
+    """Remove earlier results from output_dir, refusing if it holds anything else."""
+    names = os.listdir(output_dir)
+    others = [name for name in names if not _is_output_file(name)]
+    if others:
+        raise ValueError(
+            f"{output_dir} holds files that are not forecast results "
+            f"({', '.join(sorted(others)[:3])}{', ...' if len(others) > 3 else ''}); pick another directory"
+        )
+    for name in names:
+        os.remove(os.path.join(output_dir, name))
+
+
+def _prepare_output(output_dir: str, manifest: dict, restart: bool) -> None:
+    if restart and os.path.isdir(output_dir):
+        _clear_output(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise ValueError(
+                f"{output_dir} holds forecasts made with {previous}; pass --restart to replace them"
+            )
+    else:
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def forecast_many(
+    df: pd.DataFrame,
+    id_field: str,
+    x_field: str,
+    y_field: str,
+    output_dir: str,
+    engine: str = DEFAULT_ENGINE,
+    settings: Optional[dict] = None,
+    periods: int = DEFAULT_PERIODS,
+    freq: str = DEFAULT_FREQ,
+    interval: Optional[tuple] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    restart: bool = False,
+) -> dict:
+    """
+    Forecast every series of a long-format frame (one row per entity and date).
+
+    Results go to Parquet part files in output_dir with columns ds, yhat,
+    entity (plus forecast_lower/forecast_upper when interval is a
+    (method, level) pair). Returns counts of forecast, skipped (too short),
+    failed and already-completed series.
+    """
+    settings = settings or {}
+    manifest = {'engine': engine, 'settings': settings, 'periods': periods, 'freq': freq,
+                'interval': list(interval) if interval else None}
+    _prepare_output(output_dir, manifest, restart)
+    done = _completed_entities(output_dir)
+
+    series, skipped = [], 0
+    frame = df[[id_field, x_field, y_field]].dropna()
+    for entity, group in frame.groupby(id_field, sort=True):
+        if str(entity) in done:
+            continue
+        group = group.sort_values(x_field)
+        if len(group) < MIN_OBSERVATIONS:
+            skipped += 1
+            continue
+        series.append((entity, pd.to_datetime(group[x_field]).reset_index(drop=True), group[y_field].to_numpy(dtype=float)))
+
+    chunks = [series[i:i + chunk_size] for i in range(0, len(series), chunk_size)]
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor, tqdm(total=len(series), unit="series") as progress:
+        futures = {
+            executor.submit(_forecast_chunk, chunk, engine, settings, periods, freq, interval): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            chunk = futures[future]
+            result, chunk_failed = future.result()
+            if not result.empty:
+                _write_part(output_dir, result, [str(entity) for entity, _, _ in chunk])
+            failed.extend(chunk_failed)
+            progress.update(len(chunk))
+
+    return {'forecast': len(series) - len(failed), 'skipped': skipped, 'failed': len(failed), 'resumed': len(done)}
+
+
+def load_forecasts(
+    source: str,
+    x_field: str,
+    y_field: str,
+    category_field: Optional[str] = None,
+    entities: Optional[list] = None,
+) -> pd.DataFrame:
+    """
+    Read precomputed forecasts in a chart's column layout.
+
+    source is a series set name under resources/forecasts or a directory.
+    Entities become category_field values; without a category_field the
+    source should hold a single series.
+    """
+    output_dir = source if os.path.isdir(source) else os.path.join(FORECASTS_DIR, source)
+    if not os.path.isdir(output_dir):
+        return pd.DataFrame()
+    parts = sorted(name for name in os.listdir(output_dir) if name.endswith('.parquet'))
+    if not parts:
+        return pd.DataFrame()
+    # Re-read only when a part file was added or rewritten
+    key = make_key(output_dir, [(name, os.path.getmtime(os.path.join(output_dir, name))) for name in parts])
+    forecasts = _loaded.get(key)
+    if forecasts is None:
+        forecasts = pd.read_parquet(output_dir)
+        _loaded.set(key, forecasts)
+
+    if entities is not None:
+        forecasts = forecasts[forecasts[ENTITY_COLUMN].isin([str(entity) for entity in entities])]
+    result = forecasts.rename(columns={'ds': x_field, 'yhat': y_field})
+    if category_field:
+        result = result.rename(columns={ENTITY_COLUMN: category_field})
+    else:
+        result = result.drop(columns=ENTITY_COLUMN)
+    return result.assign(type="Forecast").reset_index(drop=True)
+
+
+def main() -> None:
+    import logging
+    import warnings
+
+    from utils.forecast_engines import ENGINES
+    from utils.forecast_intervals import INTERVAL_METHODS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('series_set', choices=sorted(SERIES_SETS))
+    parser.add_argument('--engine', default=DEFAULT_ENGINE, choices=sorted(ENGINES))
+    parser.add_argument('--periods', type=int, default=DEFAULT_PERIODS)
+    parser.add_argument('--interval', choices=INTERVAL_METHODS, help="Also write uncertainty bounds")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', help="Output directory (default: resources/forecasts/<series_set>)")
+    parser.add_argument('--restart', action='store_true', help="Discard earlier results instead of resuming")
+    args = parser.parse_args()
+
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    warnings.filterwarnings('ignore')
+
+    builder, id_field, y_field = SERIES_SETS[args.series_set]
+    long_df = builder(pd.read_csv(TIME_ENTRIES_PATH))
+    interval = (args.interval, DEFAULT_INTERVAL_LEVEL) if args.interval else None
+    try:
+        counts = forecast_many(
+            long_df, id_field, 'month', y_field,
+            output_dir=args.output or os.path.join(FORECASTS_DIR, args.series_set),
+            engine=args.engine,
+            periods=args.periods,
+            interval=interval,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            restart=args.restart,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(", ".join(f"{count} {label}" for label, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
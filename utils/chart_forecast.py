@@ -0,0 +1,149 @@
+"""Forecast fitting shared by the line and bar charts
+
+Each chart's create_forecast_df prepares its rows and adapts the result to
+its axis; compute_forecast_df reads the engine, tuning, interval and
+hierarchy settings from the config and fits every series on the forecast
+pool. Charts pass their own frequency inference, which the fit runs with.
+"""
+
+from typing import Callable, Optional
+
+import pandas as pd
+
+from utils.fingerprint import frame_fingerprint, make_key
+from utils.forecast_engines import DEFAULT_ENGINE, get_engine
+from utils.forecast_hierarchy import check_categories, forecast_hierarchy, hierarchy_method
+from utils.forecast_intervals import (
+    DEFAULT_INTERVAL_LEVEL, LOWER_FIELD, UPPER_FIELD, add_interval, interval_method
+)
+from utils.forecast_pool import PRIORITY_INTERACTIVE, run_forecast
+from utils.forecast_tuning import request_tuning, split_series, tuned_params
+from utils.series_store import SeriesStore
+
+MAX_FORECAST_PERIODS = 24  # Periods fitted once; charts slice shorter horizons from them
+
+
+def compute_forecast_df(
+    config: dict,
+    df: pd.DataFrame,
+    infer_frequency: Callable[[pd.Series], str],
+    placeholder=None,
+) -> pd.DataFrame:
+    """Generate the forecast once with maximum periods on the forecast pool (shared across sessions)."""
+    x_field = config['x_field']
+    category_field = config.get('category_field')
+    engine = config.get('forecast_engine', DEFAULT_ENGINE)
+    tuned = None
+    if config.get('forecast_tuning', False):
+        # Reuse persisted per-series winners; tune the rest in the background
+        series = split_series(df, x_field, config['y_field'], category_field)
+        tuned = tuned_params(series)
+        request_tuning({label: s for label, s in series.items() if label not in tuned}, infer_frequency)
+    interval = None
+    if config.get('forecast_interval', False):
+        interval = (
+            interval_method(config['forecast_interval']),
+            config.get('forecast_interval_level', DEFAULT_INTERVAL_LEVEL),
+        )
+    hierarchy = None
+    if category_field and config.get('forecast_hierarchy', False):
+        hierarchy = hierarchy_method(config['forecast_hierarchy'])
+        check_categories(df[category_field].unique())
+    args = (
+        df, x_field, config['y_field'], MAX_FORECAST_PERIODS, infer_frequency,
+        category_field, engine, tuned, interval, hierarchy,
+    )
+    # A function's repr differs between processes: key the frequency rules by name
+    key_args = (*args[1:4], f"{infer_frequency.__module__}.{infer_frequency.__qualname__}", *args[5:])
+    return run_forecast(
+        make_key(__name__, frame_fingerprint(df), *key_args),
+        generate_forecast_df,
+        *args,
+        priority=config.get('forecast_priority', PRIORITY_INTERACTIVE),
+        placeholder=placeholder,
+        # Same chart and fields, any data version: serves the old forecast while a new one fits
+        stale_key=make_key(__name__, config.get('title'), *key_args),
+    )
+
+
+def generate_forecast_df(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    periods: int,
+    infer_frequency: Callable[[pd.Series], str],
+    category_field: Optional[str] = None,
+    engine: str = DEFAULT_ENGINE,
+    tuned: Optional[dict] = None,
+    interval: Optional[tuple] = None,
+    hierarchy: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Generate forecast with the configured engine. Runs inside a forecast pool worker.
+
+    infer_frequency maps a series' dates to a pandas frequency. tuned maps series labels ('' for a single series) to tuned engine/settings
+    that override the configured engine. interval is an optional
+    (method, level) pair for uncertainty bands. hierarchy ('bottom_up' or
+    'mint') forecasts all categories together and reconciles them with
+    their total.
+    """
+    tuned = tuned or {}
+    default = {'engine': engine, 'settings': {}}
+
+    if category_field is None:
+        params = tuned.get('', default)
+        return forecast_single(
+            df, x_field, y_field, periods, infer_frequency, params['engine'], params['settings'], interval
+        )
+
+    # All categories plus their reconciled total in one pass
+    if hierarchy is not None:
+        dates = pd.Series(pd.to_datetime(df[x_field]).unique())
+        return forecast_hierarchy(
+            df, x_field, y_field, category_field, periods, infer_frequency(dates), hierarchy, engine, tuned, interval
+        )
+
+    # Forecast each category separately
+    all_forecasts = []
+    for category, category_df in SeriesStore(df, x_field, category_field).items():
+        if len(category_df) >= 2:
+            params = tuned.get(str(category), default)
+            forecast_df = forecast_single(
+                category_df, x_field, y_field, periods, infer_frequency,
+                params['engine'], params['settings'], interval,
+            )
+            forecast_df[category_field] = str(category)
+            all_forecasts.append(forecast_df)
+
+    return pd.concat(all_forecasts, ignore_index=True) if all_forecasts else pd.DataFrame()
+
+
+def forecast_single(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    periods: int,
+    infer_frequency: Callable[[pd.Series], str],
+    engine: str = DEFAULT_ENGINE,
+    settings: Optional[dict] = None,
+    interval: Optional[tuple] = None,
+) -> pd.DataFrame:
+    """Forecast a single time series, with an uncertainty band if interval is set."""
+    # Infer frequency from time series
+    freq = infer_frequency(df[x_field])
+
+    # Fit the engine (Prophet by default) and predict future values
+    model = get_engine(engine, **(settings or {})).fit(df[x_field], df[y_field].to_numpy())
+    forecast = model.predict(periods, freq)
+
+    result = pd.DataFrame({
+        x_field: forecast['ds'],
+        y_field: forecast['yhat'].to_numpy(),
+        "type": "Forecast"
+    })
+    if interval is not None:
+        method, level = interval
+        band = add_interval(forecast, model.residuals(freq), level, method)
+        result[LOWER_FIELD] = band['yhat_lower'].to_numpy()
+        result[UPPER_FIELD] = band['yhat_upper'].to_numpy()
+    return result
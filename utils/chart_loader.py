@@ -1,9 +1,15 @@
+from functools import partial
+
 from components.area import render_area_chart
 from components.bar import render_bar_chart
 from components.image import render_image
 from components.line import render_line_chart
 from components.markdown import render_markdown
 from components.table import render_table
+from utils.cube import query_config_df
+from utils.datasets import dataset_source, is_refreshing, refresh_config_df
+from utils.pipeline import pipeline_config_df
+from utils.refresh import render_refreshing_badge
 
 CHART_RENDERERS = {
     'area': render_area_chart,
@@ -15,5 +21,17 @@ CHART_RENDERERS = {
 }
 
 
+def resolve_df(chart_config) -> None:
+    """Set the df of charts built from the rollup cube or a transform pipeline."""
+    # Looked up on every render (from memoized results), so they follow source changes
+    query_config_df(chart_config)
+    pipeline_config_df(chart_config)
+
+
 def render_chart(chart_config):
+    resolve_df(chart_config)
+    # Serve the last good data while a regenerated source file is reloaded
+    if refresh_config_df(chart_config):
+        source = dataset_source(chart_config['df'])
+        render_refreshing_badge(partial(is_refreshing, source), label="Refreshing data")
     return CHART_RENDERERS[chart_config['type']](config=chart_config)
@@ -0,0 +1,288 @@
+"""
+Materialized rollup cube over time entries.
+
+Usage:
+    python -m utils.cube [--restart]
+
+Hours logged in fct__time_entries are summed per (month, user, project,
+client, billable, seniority) and stored as Parquet, one part file per month.
+Charts ask for slices and roll-ups with query() (or config['cube']) instead
+of scanning raw entries.
+
+Refreshes are incremental: every month part is written with a fingerprint
+of the joined entries it was built from, and only months whose entries (or
+project/seniority lookups) changed are rebuilt. The dashboard refreshes the
+cube on first use and whenever a source file changes; the command line
+builds it ahead of time.
+
+Seniority comes from the HR-to-time-tracking user link built in
+Matching_clients_projects.ipynb (the newest SENIORITY_LINK_PATTERN file);
+users it does not match get UNKNOWN.
+
+The cube directory holds nothing but the cube: refresh() only ever removes
+its own part files and manifest, and refuses a non-empty directory that has
+no manifest rather than overwrite files it did not write.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache
+from utils.fingerprint import make_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIME_ENTRIES_PATH = os.path.join(ROOT, 'resources', 'raw_data', 'fct__time_entries.csv')
+PROJECTS_PATH = os.path.join(ROOT, 'resources', 'raw_data', 'dim__projects__anonymized.csv')
+# Dated user_id -> seniority link files; the newest one is used
+SENIORITY_LINK_PATTERN = os.path.join(
+    ROOT, 'exploratory_analysis', 'guillermo', 'data', 'processed', 'linking_tables', 'link__hr_to_time_users__*.csv'
+)
+CUBE_DIR = os.path.join(ROOT, 'resources', 'cube')
+
+CUBE_VERSION = 3  # Bump when the cube's layout changes: forces a full rebuild
+UNKNOWN = "Unknown"  # Client or seniority of entries the lookups do not cover
+QUERY_CACHE_SIZE = 64
+
+DIMENSIONS = ('month', 'user_id', 'project_id', 'client', 'billable', 'seniority')
+MEASURES = ('hours', 'billable_hours', 'entries')
+# Measures computed from summed ones after a roll-up (never summed themselves)
+DERIVED_MEASURES = {
+    'utilization': lambda frame: frame['billable_hours'] / frame['hours'].where(frame['hours'] != 0) * 100,
+}
+MANIFEST_NAME = "_manifest.json"
+
+_loaded = LRUCache(max_size=4)
+_queries = LRUCache(max_size=QUERY_CACHE_SIZE)
+_refresh_lock = threading.Lock()
+
+
+def _seniority_path() -> Optional[str]:
+    # Dated names sort chronologically
+    paths = sorted(glob.glob(SENIORITY_LINK_PATTERN))
+    return paths[-1] if paths else None
+
+
+def _sources() -> list:
+    return [path for path in (TIME_ENTRIES_PATH, PROJECTS_PATH, _seniority_path()) if path is not None]
+
+
+def join_entries(
+    time_entries: pd.DataFrame,
+    projects: pd.DataFrame,
+    seniority: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Time entries at the cube's dimensions: one row per entry with every DIMENSION and hours/billable_hours."""
+    clients = projects.drop_duplicates('project_id').set_index('project_id')['client_anon']
+    if seniority is not None:
+        levels = seniority.dropna(subset=['user_id']).drop_duplicates('user_id').set_index('user_id')['seniority']
+        entry_seniority = time_entries['user_id'].map(levels).fillna(UNKNOWN)
+    else:
+        entry_seniority = UNKNOWN
+    billable = time_entries['billable'].astype(bool)
+    entries = pd.DataFrame({
+        'month': pd.to_datetime(time_entries['dt']).dt.to_period('M').dt.to_timestamp(),
+        'user_id': time_entries['user_id'],
+        'project_id': time_entries['project_id'],
+        'client': time_entries['project_id'].map(clients).fillna(UNKNOWN),
+        'billable': billable,
+        'seniority': entry_seniority,
+        'hours': time_entries['hours'].fillna(0.0),
+    })
+    entries['billable_hours'] = entries['hours'].where(billable, 0.0)
+    return entries.dropna(subset=['month'])
+
+
+def aggregate(entries: pd.DataFrame) -> pd.DataFrame:
+    """Cube rows of joined entries: MEASURES summed (entries counted) per combination of DIMENSIONS."""
+    return (
+        entries.groupby(list(DIMENSIONS), sort=True, observed=True)
+        .agg(hours=('hours', 'sum'), billable_hours=('billable_hours', 'sum'), entries=('hours', 'size'))
+        .reset_index()
+    )
+
+
+def _month_fingerprints(entries: pd.DataFrame) -> dict:
+    """{'YYYY-MM': fingerprint} of each month's joined entries, independent of row order."""
+    hashes = pd.util.hash_pandas_object(entries, index=False).to_numpy()
+    months = entries['month'].dt.strftime('%Y-%m').to_numpy()
+    order = np.lexsort((hashes, months))
+    labels, starts = np.unique(months[order], return_index=True)
+    fingerprints = {}
+    for label, rows in zip(labels, np.split(hashes[order], starts[1:])):
+        fingerprints[str(label)] = hashlib.blake2b(rows.tobytes(), digest_size=16).hexdigest()
+    return fingerprints
+
+
+def _part_path(cube_dir: str, month: str) -> str:
+    return os.path.join(cube_dir, f"month-{month}.parquet")
+
+
+def _is_cube_file(name: str) -> bool:
+    """Whether a file name is one refresh() writes: a part, a part being written, or the manifest."""
+    return name == MANIFEST_NAME or (name.startswith('month-') and name.endswith(('.parquet', '.parquet.tmp')))
+
+
+def _clear(cube_dir: str) -> None:
+    """Remove the cube's own files from cube_dir, refusing if it holds anything else."""
+    names = os.listdir(cube_dir)
+    others = [name for name in names if not _is_cube_file(name)]
+    if others:
+        raise ValueError(
+            f"{cube_dir} is not empty and holds files that are not part of a cube "
+            f"({', '.join(sorted(others)[:3])}{', ...' if len(others) > 3 else ''}); pick another directory"
+        )
+    for name in names:
+        os.remove(os.path.join(cube_dir, name))
+
+
+def _read_manifest(cube_dir: str) -> Optional[dict]:
+    path = os.path.join(cube_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('version') == CUBE_VERSION else None
+
+
+def _source_mtimes() -> dict:
+    return {os.path.basename(path): os.path.getmtime(path) for path in _sources()}
+
+
+def refresh(cube_dir: str = CUBE_DIR, restart: bool = False) -> dict:
+    """
+    Bring the cube in cube_dir up to date with the source files.
+
+    Only months whose joined entries changed are re-aggregated and
+    rewritten; parts of months that no longer have entries are removed.
+    Returns counts of rebuilt, unchanged and removed months.
+
+    Raises:
+        ValueError: If a full rebuild is due and cube_dir holds files other
+            than a cube's.
+    """
+    manifest = None if restart else _read_manifest(cube_dir)
+    if manifest is None and os.path.isdir(cube_dir):
+        _clear(cube_dir)
+    os.makedirs(cube_dir, exist_ok=True)
+    previous = manifest['months'] if manifest else {}
+
+    seniority_path = _seniority_path()
+    seniority = pd.read_csv(seniority_path) if seniority_path is not None else None
+    entries = join_entries(pd.read_csv(TIME_ENTRIES_PATH), pd.read_csv(PROJECTS_PATH), seniority)
+    fingerprints = _month_fingerprints(entries)
+    changed = [month for month, fingerprint in fingerprints.items() if previous.get(month) != fingerprint]
+
+    rows = aggregate(entries[entries['month'].dt.strftime('%Y-%m').isin(changed)])
+    for month, part in rows.groupby(rows['month'].dt.strftime('%Y-%m')):
+        path = _part_path(cube_dir, month)
+        part.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+    removed = [month for month in previous if month not in fingerprints]
+    for month in removed:
+        if os.path.exists(_part_path(cube_dir, month)):
+            os.remove(_part_path(cube_dir, month))
+
+    # Written last: an interrupted refresh leaves months that are rebuilt next time
+    with open(os.path.join(cube_dir, MANIFEST_NAME), 'w') as f:
+        json.dump({'version': CUBE_VERSION, 'sources': _source_mtimes(), 'months': fingerprints}, f, indent=2, sort_keys=True)
+    return {'rebuilt': len(changed), 'unchanged': len(fingerprints) - len(changed), 'removed': len(removed)}
+
+
+def load(cube_dir: str = CUBE_DIR) -> tuple:
+    """(cube, version key): every cube row, refreshed first if a source file changed since the last build."""
+    with _refresh_lock:
+        manifest = _read_manifest(cube_dir)
+        if manifest is None or manifest['sources'] != _source_mtimes():
+            refresh(cube_dir)
+    parts = sorted(name for name in os.listdir(cube_dir) if name.startswith('month-') and name.endswith('.parquet'))
+    # Re-read only when a part file was added or rewritten
+    key = make_key(cube_dir, [(name, os.path.getmtime(os.path.join(cube_dir, name))) for name in parts])
+    cube = _loaded.get(key)
+    if cube is None:
+        if parts:
+            cube = pd.concat([pd.read_parquet(os.path.join(cube_dir, name)) for name in parts], ignore_index=True)
+        else:
+            cube = pd.DataFrame(columns=[*DIMENSIONS, *MEASURES])
+        # Label dimensions as categoricals: filters and group-bys work on integer codes
+        cube = cube.astype({dimension: 'category' for dimension in ('user_id', 'project_id', 'client', 'seniority')})
+        _loaded.set(key, cube)
+    return cube, key
+
+
+def query(
+    by: tuple = (),
+    where: Optional[dict] = None,
+    measures: tuple = MEASURES,
+    cube_dir: str = CUBE_DIR,
+) -> pd.DataFrame:
+    """
+    Roll the cube up to the dimensions in by, over the cells matching where.
+
+    where maps dimensions to a value or a list of values (months as dates or
+    date strings). measures are any of MEASURES and DERIVED_MEASURES.
+    Returns one row per combination of by values, sorted by them (a single
+    total row when by is empty), with columns by + measures.
+    """
+    by, measures, where = list(by), list(measures), dict(where or {})
+    unknown = [name for name in by + list(where) if name not in DIMENSIONS]
+    unknown += [name for name in measures if name not in MEASURES and name not in DERIVED_MEASURES]
+    if unknown:
+        raise ValueError(
+            f"Unknown cube field(s) {', '.join(map(str, unknown))}. "
+            f"Dimensions: {', '.join(DIMENSIONS)}; measures: {', '.join([*MEASURES, *DERIVED_MEASURES])}"
+        )
+    cube, version = load(cube_dir)
+    key = make_key(version, by, sorted(where.items()), measures)
+    result = _queries.get(key)
+    if result is None:
+        mask = np.ones(len(cube), dtype=bool)
+        for dimension, values in where.items():
+            values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+            if dimension == 'month':
+                values = pd.to_datetime(values)
+            mask &= cube[dimension].isin(values).to_numpy()
+        cells = cube[mask]
+        if by:
+            totals = cells.groupby(by, sort=True, observed=True)[list(MEASURES)].sum().reset_index()
+        else:
+            totals = cells[list(MEASURES)].agg(['sum']).reset_index(drop=True)
+        for measure in measures:
+            if measure in DERIVED_MEASURES:
+                totals[measure] = DERIVED_MEASURES[measure](totals)
+        result = totals[by + measures]
+        # Plain labels for charts: categories left out by where would otherwise linger
+        result = result.astype({name: object for name in by if isinstance(result[name].dtype, pd.CategoricalDtype)})
+        _queries.set(key, result)
+    return result
+
+
+def query_config_df(config: dict) -> None:
+    """Set config['df'] to the cube slice config['cube'] asks for (query() keyword arguments)."""
+    if config.get('cube'):
+        config['df'] = query(**config['cube'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=CUBE_DIR, help="Cube directory (default: resources/cube)")
+    parser.add_argument('--restart', action='store_true', help="Rebuild every month instead of only changed ones")
+    args = parser.parse_args()
+
+    with _refresh_lock:
+        try:
+            counts = refresh(args.output, restart=args.restart)
+        except ValueError as e:
+            parser.error(str(e))
+    print(f"{counts['rebuilt']} months rebuilt, {counts['unchanged']} unchanged, {counts['removed']} removed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Output CSV loading with stale-while-revalidate refresh
+
+Config modules are imported once per server process, so a regenerated CSV
+would otherwise never reach the dashboard. Frames returned by read_csv are
+registered with their source file; when the file changes, the last good frame
+keeps being served while a background thread re-reads it and swaps it in.
+
+Only those exact frame objects are tracked. A frame filtered or aggregated
+from one is not, even though pandas copies attrs onto it, so it is never
+swapped for the raw file.
+"""
+
+import os
+import threading
+import weakref
+from typing import Optional, Tuple
+
+import pandas as pd
+
+class _Entry:
+    """Last good frame for one source file."""
+
+    def __init__(self, path: str, df: pd.DataFrame, mtime: float, read_kwargs: dict):
+        self.path = path
+        self.read_kwargs = read_kwargs
+        self.df = df
+        self.mtime = mtime
+        self.refreshing = False
+
+
+class DatasetStore:
+    """Process-wide registry of CSV-backed frames."""
+
+    def __init__(self):
+        self._entries = {}
+        self._sources = {}  # id(frame) -> (weak reference to the frame, source path)
+        self._lock = threading.Lock()
+
+    def load(self, path: str, **read_kwargs) -> pd.DataFrame:
+        """Read a CSV synchronously and start tracking it."""
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        df = _read(path, read_kwargs)
+        with self._lock:
+            self._entries[path] = _Entry(path, df, mtime, read_kwargs)
+            self._register(df, path)
+        return df
+
+    def source(self, df: pd.DataFrame) -> Optional[str]:
+        """Source file of a frame returned by load or a reload, None for any other frame."""
+        with self._lock:
+            entry = self._sources.get(id(df))
+            # The id of a collected frame can be reused: check the entry is for this one
+            return entry[1] if entry is not None and entry[0]() is df else None
+
+    def _register(self, df: pd.DataFrame, path: str) -> None:
+        """Record df as read from path (caller holds the lock)."""
+        key = id(df)
+
+        def forget(ref):
+            # Runs during garbage collection, possibly under the lock: single dict operations only
+            if self._sources.get(key, (None,))[0] is ref:
+                self._sources.pop(key, None)
+
+        self._sources[key] = (weakref.ref(df, forget), path)
+
+    def current(self, path: str) -> Tuple[Optional[pd.DataFrame], bool]:
+        """
+        Return (frame, refreshing) for a tracked file.
+
+        If the file changed since it was read, a background reload is started
+        and the previous frame is returned with refreshing=True.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None, False
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                return entry.df, False  # file removed: keep serving what we have
+            if mtime != entry.mtime and not entry.refreshing:
+                entry.refreshing = True
+                threading.Thread(target=self._reload, args=(entry, mtime), daemon=True).start()
+            return entry.df, entry.refreshing
+
+    def is_refreshing(self, path: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(path)
+            return entry is not None and entry.refreshing
+
+    def _reload(self, entry: _Entry, mtime: float) -> None:
+        try:
+            df = _read(entry.path, entry.read_kwargs)
+        except Exception:
+            # Half-written or broken file: keep the last good frame, retry on the next change
+            with self._lock:
+                entry.mtime = mtime
+                entry.refreshing = False
+            return
+        with self._lock:
+            entry.df, entry.mtime, entry.refreshing = df, mtime, False
+            self._register(df, entry.path)
+
+
+def _read(path: str, read_kwargs: dict) -> pd.DataFrame:
+    return pd.read_csv(path, **read_kwargs)
+
+
+_store = DatasetStore()
+
+
+def read_csv(path, **read_kwargs) -> pd.DataFrame:
+    """Read an output CSV whose changes should be picked up without a restart."""
+    return _store.load(str(path), **read_kwargs)
+
+
+def dataset_source(df) -> Optional[str]:
+    """Path of the CSV df was loaded from by read_csv, or None if df is not such a frame."""
+    return _store.source(df) if isinstance(df, pd.DataFrame) else None
+
+
+def refresh_config_df(config: dict) -> bool:
+    """
+    Swap config['df'] for the latest loaded version of its source file.
+
+    Returns True while a newer version is still being loaded.
+    """
+    path = dataset_source(config.get('df'))
+    if path is None:
+        return False
+    current, refreshing = _store.current(path)
+    if current is not None:
+        config['df'] = current
+    return refreshing
+
+
+def is_refreshing(path: str) -> bool:
+    return _store.is_refreshing(path)
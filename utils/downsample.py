@@ -0,0 +1,98 @@
+"""Largest-Triangle-Three-Buckets downsampling for dense line charts
+
+LTTB (Steinarsson, 2013) keeps the first and last point of a series and,
+from each of max_points - 2 equal-count buckets in between, the point that
+forms the largest triangle with the point kept from the previous bucket and
+the average of the next bucket. Peaks and troughs survive, so a line drawn
+from about two points per horizontal pixel looks like the full series.
+
+Buckets are visited in order (each choice depends on the previous one), but
+every step handles all series of a chart at once in NumPy.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.series_store import SeriesStore
+
+DEFAULT_MAX_POINTS = 1000  # Per series; about two points per pixel of a full-width chart
+
+
+def lttb_indices(series: list, max_points: int = DEFAULT_MAX_POINTS) -> list:
+    """
+    Indices kept by LTTB for each (x, y) pair of float arrays sorted by x.
+
+    Series with at most max_points points (or a budget below 3) keep every index.
+    """
+    kept = [np.arange(len(x)) for x, _ in series]
+    long = [i for i, (x, _) in enumerate(series) if max_points >= 3 and len(x) > max_points]
+    if not long:
+        return kept
+
+    n_buckets = max_points - 2
+    lengths = np.array([len(series[i][0]) for i in long])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    flat_x = np.concatenate([series[i][0] - series[i][0][0] for i in long])  # small magnitudes
+    flat_y = np.concatenate([series[i][1] for i in long])
+
+    # Equal-count buckets over the points between first and last: edges[s, b] .. edges[s, b + 1]
+    steps = np.linspace(0.0, 1.0, n_buckets + 1)
+    edges = np.floor(1 + steps[None, :] * (lengths[:, None] - 2)).astype(np.int64)
+    edges[:, -1] = lengths - 1
+    width = int((edges[:, 1:] - edges[:, :-1]).max())
+    member = edges[:, :-1, None] + np.arange(width)               # (series, bucket, slot)
+    valid = member < edges[:, 1:, None]
+    flat_member = np.where(valid, member, edges[:, 1:, None] - 1) + offsets[:, None, None]
+    bucket_x, bucket_y = flat_x[flat_member], flat_y[flat_member]
+    counts = valid.sum(axis=2)
+    mean_x = np.where(valid, bucket_x, 0.0).sum(axis=2) / counts
+    mean_y = np.where(valid, bucket_y, 0.0).sum(axis=2) / counts
+    # The last bucket looks ahead to the final point
+    last = offsets + lengths - 1
+    next_x = np.column_stack([mean_x[:, 1:], flat_x[last]])
+    next_y = np.column_stack([mean_y[:, 1:], flat_y[last]])
+
+    rows = np.arange(len(long))
+    chosen = np.empty((len(long), n_buckets), dtype=np.int64)
+    anchor_x, anchor_y = flat_x[offsets], flat_y[offsets]
+    for b in range(n_buckets):
+        px, py = bucket_x[:, b], bucket_y[:, b]
+        # Twice the triangle area (anchor, candidate, next-bucket mean)
+        area = np.abs(
+            (anchor_x - next_x[:, b])[:, None] * (py - anchor_y[:, None])
+            - (anchor_x[:, None] - px) * (next_y[:, b] - anchor_y)[:, None]
+        )
+        best = np.where(valid[:, b], area, -1.0).argmax(axis=1)
+        chosen[:, b] = member[rows, b, best]
+        anchor_x, anchor_y = px[rows, best], py[rows, best]
+
+    for row, i in enumerate(long):
+        kept[i] = np.concatenate([[0], chosen[row], [lengths[row] - 1]])
+    return kept
+
+
+def downsample(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    category_field: Optional[str] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+) -> pd.DataFrame:
+    """
+    Rows of df kept by LTTB within each category, in x order.
+
+    Rows without an x or y value are dropped (a line skips them anyway);
+    series within the budget keep every row.
+    """
+    valid = (df[x_field].notna() & df[y_field].notna()).to_numpy()
+    if valid.sum() <= max_points:
+        return df[valid]
+    store = SeriesStore(df, x_field, category_field, mask=valid)
+    x = store.column(x_field)
+    x = (x.view(np.int64) if x.dtype.kind == 'M' else x).astype(float)
+    y = store.column(y_field).astype(float)
+    kept = lttb_indices([(x[rows], y[rows]) for rows in store.slices()], max_points)
+    positions = np.concatenate([rows.start + index for rows, index in zip(store.slices(), kept)])
+    return df.iloc[store.order[positions]]
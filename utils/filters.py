@@ -0,0 +1,122 @@
+"""Dashboard-wide attribute filters backed by per-value bitmap indexes
+
+The sidebar filters (seniority, client, broker vs direct) cut across tabs:
+each applies to every chart whose frame has a column for that dimension, and
+is ignored by the others.
+
+Each (frame, column) gets a BitmapIndex once, when the frame is first seen:
+one packed bitmap (np.packbits, a bit per row) per distinct value. A filter
+ORs the bitmaps of its selected values and filters AND together, so
+evaluating any combination touches n / 8 bytes per selected value instead of
+comparing every row's label again.
+"""
+
+import weakref
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.cache import LRUCache
+from utils.time_index import DATE_RANGE_STATE, window_rows
+
+# Filter name -> (sidebar label, columns the dimension goes by in chart frames)
+FILTERS = {
+    'seniority': ("Seniority", ('seniority', 'person_seniority')),
+    'client': ("Client", ('client', 'client_anon')),
+    'channel': ("Broker vs direct", ('channel',)),
+}
+FILTER_STATE = "dashboard_filters"  # Session key of {filter name: selected values}, active filters only
+BITMAP_CACHE_SIZE = 256  # One per chart dataset and filterable column
+
+_bitmaps = LRUCache(max_size=BITMAP_CACHE_SIZE)
+
+
+class BitmapIndex:
+    """Packed bitmap of the rows holding each distinct value of a column (missing values in none)."""
+
+    def __init__(self, values: np.ndarray):
+        codes, labels = pd.factorize(values, sort=True)
+        self.size = len(values)
+        self.labels = [str(label) for label in labels]
+        self._positions = {label: i for i, label in enumerate(self.labels)}
+        rows = np.flatnonzero(codes >= 0)
+        # Bit (row & 7) of byte (row >> 3), most significant first as in np.packbits
+        self.bitmaps = np.zeros((len(self.labels), (self.size + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(self.bitmaps, (codes[rows], rows >> 3), (128 >> (rows & 7)).astype(np.uint8))
+
+    def select(self, labels: list) -> np.ndarray:
+        """Packed bitmap of the rows holding any of labels."""
+        selected = [self._positions[label] for label in labels if label in self._positions]
+        if not selected:
+            return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[selected], axis=0)
+
+
+def bitmap_index(df: pd.DataFrame, column: str) -> BitmapIndex:
+    """Cached BitmapIndex of df[column]."""
+    key = (id(df), column)
+    entry = _bitmaps.get(key)
+    # The id of a collected frame can be reused: check the entry is for this one
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    index = BitmapIndex(df[column].to_numpy())
+    _bitmaps.set(key, (weakref.ref(df), index))
+    return index
+
+
+def _filter_column(df: pd.DataFrame, name: str) -> Optional[str]:
+    """Column of df the filter applies to, if any."""
+    return next((column for column in FILTERS[name][1] if column in df.columns), None)
+
+
+def attribute_mask(df: pd.DataFrame, selected: dict) -> Optional[np.ndarray]:
+    """Boolean mask of the rows of df passing every applicable filter in selected, or None if none applies."""
+    combined = None
+    for name, labels in selected.items():
+        column = _filter_column(df, name)
+        if column is None:
+            continue
+        bitmap = bitmap_index(df, column).select(labels)
+        combined = bitmap if combined is None else combined & bitmap
+    if combined is None:
+        return None
+    return np.unpackbits(combined, count=len(df)).view(bool)
+
+
+def select_filters(configs: list) -> None:
+    """Sidebar multiselects for every filter some chart frame can be filtered by; empty means no filter."""
+    selected = {}
+    for name, (label, _) in FILTERS.items():
+        options = set()
+        for config in configs:
+            df = config.get('df')
+            column = _filter_column(df, name) if isinstance(df, pd.DataFrame) else None
+            if column is not None:
+                options.update(bitmap_index(df, column).labels)
+        if not options:
+            continue
+        picked = st.sidebar.multiselect(label, sorted(options), key=f"{FILTER_STATE}_{name}")
+        if picked:
+            selected[name] = picked
+    st.session_state[FILTER_STATE] = selected
+
+
+def filter_config(config: dict) -> dict:
+    """config with df narrowed to the dashboard's date range and filters (config itself when nothing is cut)."""
+    df = config['df']
+    rows = None  # All rows
+    window = st.session_state.get(DATE_RANGE_STATE)
+    if window is not None and config.get('x_field'):
+        rows = window_rows(df, config['x_field'], *window)
+    mask = attribute_mask(df, st.session_state.get(FILTER_STATE) or {})
+    if mask is not None:
+        if rows is None:
+            rows = np.flatnonzero(mask)
+        else:
+            positions = np.arange(len(df))[rows] if isinstance(rows, slice) else rows
+            rows = positions[mask[positions]]
+        if len(rows) == len(df):
+            rows = None
+    return config if rows is None else {**config, 'df': df.iloc[rows]}
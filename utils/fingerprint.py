@@ -0,0 +1,18 @@
+"""Content fingerprints for dataframes and cache keys"""
+
+import hashlib
+
+import pandas as pd
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Hash a dataframe's columns, dtypes and values (index ignored)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """Build a stable cache key from fingerprints and plain (repr-able) values."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
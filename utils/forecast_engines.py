@@ -0,0 +1,186 @@
+"""Forecast engines with a common fit/predict interface
+
+Prophet is the dashboard default. The lighter engines are cheap baselines
+that the backtest harness compares it against; any of them can be selected
+per chart with config['forecast_engine'].
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ENGINE = "prophet"
+
+# Settings used by the dashboard before engines were configurable
+PROPHET_DEFAULTS = {
+    'yearly_seasonality': True,     # Enable yearly seasonality
+    'weekly_seasonality': False,    # Disable weekly seasonality
+    'daily_seasonality': False,     # Disable daily seasonality
+    'n_changepoints': 10,           # Number of changepoints for trend flexibility
+    'seasonality_mode': "additive", # Use additive seasonality
+    'interval_width': 0.0,          # No uncertainty interval
+    'uncertainty_samples': 0,       # Skip Prophet's interval simulation (bands come from utils.forecast_intervals)
+}
+
+# Cap on the widening of Prophet's in-sample residuals (see ProphetEngine.residuals)
+MAX_RESIDUAL_INFLATION = 2.0
+
+# Observations per seasonal cycle, by pandas frequency prefix
+SEASON_LENGTHS = {"MS": 12, "M": 12, "ME": 12, "QS": 4, "Q": 4, "QE": 4, "W": 52, "D": 7}
+
+
+def season_length(freq: str) -> int:
+    """Seasonal period for a pandas frequency string (1 if unknown)."""
+    base = freq.lstrip("0123456789").split("-")[0]
+    return SEASON_LENGTHS.get(base, 1)
+
+
+def _future_dates(last: pd.Timestamp, periods: int, freq: str) -> pd.DatetimeIndex:
+    return pd.date_range(start=last, periods=periods + 1, freq=freq)[1:]
+
+
+class ForecastEngine:
+    """Base class: fit on (ds, y), then predict the next periods.
+
+    residuals() returns the in-sample errors that uncertainty bands are
+    built from: one-step-ahead errors for the baseline engines, fitted-value
+    errors widened to compensate for Prophet.
+    """
+
+    name = ""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._last_ds = None
+
+    def fit(self, ds: pd.Series, y: np.ndarray) -> "ForecastEngine":
+        self._last_ds = pd.Timestamp(pd.to_datetime(ds).max())
+        self._y = np.asarray(y, dtype=float)
+        self._fit(self._y)
+        return self
+
+    def predict(self, periods: int, freq: str) -> pd.DataFrame:
+        future = _future_dates(self._last_ds, periods, freq)
+        return pd.DataFrame({"ds": future, "yhat": self._predict(periods, freq)})
+
+    def residuals(self, freq: str) -> np.ndarray:
+        """In-sample one-step-ahead errors (NaN where there is no prediction)."""
+        return self._y - self._fitted(freq)
+
+    def _fit(self, y: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _predict(self, periods: int, freq: str) -> np.ndarray:
+        raise NotImplementedError
+
+    def _fitted(self, freq: str) -> np.ndarray:
+        raise NotImplementedError
+
+
+class ProphetEngine(ForecastEngine):
+    """Meta's Prophet with the dashboard's default settings."""
+
+    name = "prophet"
+
+    def fit(self, ds: pd.Series, y: np.ndarray) -> "ProphetEngine":
+        from prophet import Prophet
+
+        self.model = Prophet(**{**PROPHET_DEFAULTS, **self.settings})
+        self.model.fit(pd.DataFrame({"ds": pd.to_datetime(ds), "y": np.asarray(y, dtype=float)}))
+        self._residuals = None
+        return self
+
+    def predict(self, periods: int, freq: str) -> pd.DataFrame:
+        future = self.model.make_future_dataframe(periods=periods, freq=freq, include_history=False)
+        return self.model.predict(future)[["ds", "yhat"]]
+
+    def residuals(self, freq: str) -> np.ndarray:
+        """
+        Errors of the fitted history, widened by sqrt(n / (n - p)).
+
+        Prophet has no cheap one-step-ahead forecast (each origin would be a
+        refit), and its fitted values have seen the point they predict, so
+        raw errors would give bands that are too narrow. p counts the trend
+        and Fourier terms; the widening is capped at MAX_RESIDUAL_INFLATION.
+        Computed once per fit.
+        """
+        if self._residuals is None:
+            # predict() without a frame scores the training history
+            errors = self.model.history["y"].to_numpy() - self.model.predict()["yhat"].to_numpy()
+            n = len(errors)
+            p = 2 + sum(2 * seasonality['fourier_order'] for seasonality in self.model.seasonalities.values())
+            self._residuals = errors * min(np.sqrt(n / max(n - p, 1)), MAX_RESIDUAL_INFLATION)
+        return self._residuals
+
+
+class SeasonalNaiveEngine(ForecastEngine):
+    """Repeat the last observed season."""
+
+    name = "seasonal_naive"
+
+    def _fit(self, y):
+        self._y = y
+
+    def _predict(self, periods, freq):
+        m = min(season_length(freq), len(self._y))
+        last_season = self._y[-m:]
+        return np.resize(last_season, periods)
+
+    def _fitted(self, freq):
+        m = min(season_length(freq), len(self._y))
+        fitted = np.full(len(self._y), np.nan)
+        fitted[m:] = self._y[:-m]
+        return fitted
+
+
+class DriftEngine(ForecastEngine):
+    """Random walk with drift: extend the line from the first to the last point."""
+
+    name = "drift"
+
+    def _fit(self, y):
+        self._last = y[-1]
+        self._slope = (y[-1] - y[0]) / (len(y) - 1) if len(y) > 1 else 0.0
+
+    def _predict(self, periods, freq):
+        return self._last + self._slope * np.arange(1, periods + 1)
+
+    def _fitted(self, freq):
+        fitted = np.full(len(self._y), np.nan)
+        fitted[1:] = self._y[:-1] + self._slope
+        return fitted
+
+
+class HoltEngine(ForecastEngine):
+    """Holt's linear exponential smoothing (level + damped trend)."""
+
+    name = "holt"
+
+    def _fit(self, y):
+        alpha = self.settings.get('alpha', 0.5)
+        beta = self.settings.get('beta', 0.1)
+        level, trend = y[0], (y[1] - y[0]) if len(y) > 1 else 0.0
+        self._one_step = np.full(len(y), np.nan)
+        for t, value in enumerate(y[1:], start=1):
+            self._one_step[t] = level + trend
+            previous_level = level
+            level = alpha * value + (1 - alpha) * (level + trend)
+            trend = beta * (level - previous_level) + (1 - beta) * trend
+        self._level, self._trend = level, trend
+
+    def _predict(self, periods, freq):
+        phi = self.settings.get('damping', 0.98)
+        damped_steps = np.cumsum(phi ** np.arange(1, periods + 1))
+        return self._level + self._trend * damped_steps
+
+    def _fitted(self, freq):
+        return self._one_step
+
+
+ENGINES = {engine.name: engine for engine in (ProphetEngine, SeasonalNaiveEngine, DriftEngine, HoltEngine)}
+
+
+def get_engine(name: str = DEFAULT_ENGINE, **settings) -> ForecastEngine:
+    """Instantiate a forecast engine by name."""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown forecast engine '{name}'. Available: {', '.join(ENGINES)}")
+    return ENGINES[name](**settings)
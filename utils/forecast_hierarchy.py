@@ -0,0 +1,163 @@
+"""Coherent forecasts for category charts (categories sum to a total)
+
+All category series are put on one date grid and fitted in a single pass;
+reconciliation is then a single matrix product over the whole hierarchy:
+
+- 'bottom_up': the total is the sum of the category forecasts, so no model
+  is fitted for it.
+- 'mint': one extra fit of the total, then MinT with a shrunk covariance of
+  the in-sample residuals (Wickramasuriya, Athanasopoulos & Hyndman, 2019)
+  adjusts every level so that categories still add up to the total.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.forecast_engines import DEFAULT_ENGINE, get_engine
+from utils.forecast_intervals import LOWER_FIELD, UPPER_FIELD, add_interval
+
+HIERARCHY_METHODS = ("bottom_up", "mint")
+DEFAULT_HIERARCHY_METHOD = "bottom_up"
+
+# Category label of the reconciled aggregate (a chart may not have a category of its own by that name)
+TOTAL_LABEL = "Total"
+
+
+def hierarchy_method(setting) -> str:
+    """Normalise config['forecast_hierarchy'] (True or a method name) to a method name."""
+    method = DEFAULT_HIERARCHY_METHOD if setting is True else setting
+    if method not in HIERARCHY_METHODS:
+        raise ValueError(f"Unknown forecast hierarchy '{setting}'. Available: {', '.join(HIERARCHY_METHODS)}")
+    return method
+
+
+def check_categories(categories) -> None:
+    """Raise ValueError if a category is labelled TOTAL_LABEL, which the reconciled total would be mistaken for."""
+    if TOTAL_LABEL in {str(category) for category in categories}:
+        raise ValueError(
+            f"Cannot forecast a hierarchy with a category named '{TOTAL_LABEL}': it clashes with the reconciled "
+            f"total. Rename that category or turn off forecast_hierarchy."
+        )
+
+
+def summing_matrix(n_bottom: int) -> np.ndarray:
+    """S maps bottom-level values to [total, bottom...]."""
+    return np.vstack([np.ones((1, n_bottom)), np.eye(n_bottom)])
+
+
+def _shrunk_covariance(residuals: np.ndarray) -> np.ndarray:
+    """
+    Covariance of residuals (nodes x time) shrunk towards its diagonal.
+
+    Uses the Schäfer-Strimmer intensity, which keeps the estimate invertible
+    when there are few observations per node.
+    """
+    residuals = residuals[:, np.isfinite(residuals).all(axis=0)]
+    n_nodes, n_obs = residuals.shape
+    if n_obs < 2:
+        return np.eye(n_nodes)
+    centered = residuals - residuals.mean(axis=1, keepdims=True)
+    covariance = centered @ centered.T / n_obs
+    std = np.sqrt(np.diag(covariance))
+    std[std == 0] = 1.0
+    standardized = centered / std[:, None]
+    correlation = standardized @ standardized.T / n_obs
+    # Variance of the sample correlations, from per-observation cross products
+    products = standardized[:, None, :] * standardized[None, :, :]
+    correlation_var = products.var(axis=2) * n_obs / (n_obs - 1) ** 2
+    off_diagonal = ~np.eye(n_nodes, dtype=bool)
+    denominator = (correlation[off_diagonal] ** 2).sum()
+    intensity = correlation_var[off_diagonal].sum() / denominator if denominator else 1.0
+    intensity = min(max(intensity, 0.0), 1.0)
+    shrunk = covariance * (1 - intensity)
+    shrunk[np.diag_indices(n_nodes)] = np.diag(covariance)
+    # Guard against nodes with no residual variance (e.g. a constant series)
+    shrunk[np.diag_indices(n_nodes)] += 1e-9 * max(np.trace(covariance), 1.0)
+    return shrunk
+
+
+def reconcile(base: np.ndarray, residuals: np.ndarray, method: str = DEFAULT_HIERARCHY_METHOD) -> np.ndarray:
+    """
+    Reconcile base forecasts (nodes x horizon, total first) to coherent ones.
+
+    residuals holds the in-sample residuals of the same nodes and is only used
+    by MinT.
+    """
+    n_bottom = base.shape[0] - 1
+    S = summing_matrix(n_bottom)
+    if method == "bottom_up":
+        return S @ base[1:]
+    W_inv = np.linalg.pinv(_shrunk_covariance(residuals))
+    G = np.linalg.solve(S.T @ W_inv @ S, S.T @ W_inv)
+    return S @ (G @ base)
+
+
+def forecast_hierarchy(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    category_field: str,
+    periods: int,
+    freq: str,
+    method: str = DEFAULT_HIERARCHY_METHOD,
+    engine: str = DEFAULT_ENGINE,
+    tuned: Optional[dict] = None,
+    interval: Optional[tuple] = None,
+) -> pd.DataFrame:
+    """
+    Forecast every category plus their total, reconciled to be coherent.
+
+    Returns forecast rows for each category and for TOTAL_LABEL, with
+    uncertainty bounds when interval is a (method, level) pair.
+    """
+    tuned = tuned or {}
+    default = {'engine': engine, 'settings': {}}
+
+    # Bottom level on a shared date grid; a category missing on a date counts as zero
+    wide = df.pivot_table(index=x_field, columns=category_field, values=y_field, aggfunc='sum', fill_value=0)
+    wide = wide.sort_index()
+    wide.index = pd.to_datetime(wide.index)
+    categories = [str(category) for category in wide.columns]
+    check_categories(categories)
+    values = wide.to_numpy(dtype=float).T
+
+    models = []
+    for label, series in zip(categories, values):
+        params = tuned.get(label, default)
+        models.append(get_engine(params['engine'], **params['settings']).fit(wide.index, series))
+    bottom = np.vstack([model.predict(periods, freq)['yhat'].to_numpy() for model in models])
+    bottom_residuals = np.vstack([model.residuals(freq) for model in models])
+
+    if method == "mint":
+        total_model = get_engine(engine).fit(wide.index, values.sum(axis=0))
+        total = total_model.predict(periods, freq)['yhat'].to_numpy()
+        total_residuals = total_model.residuals(freq)
+    else:
+        total = bottom.sum(axis=0)
+        total_residuals = bottom_residuals.sum(axis=0)
+
+    residuals = np.vstack([total_residuals, bottom_residuals])
+    coherent = reconcile(np.vstack([total, bottom]), residuals, method)
+
+    future = pd.date_range(start=wide.index[-1], periods=periods + 1, freq=freq)[1:]
+    frames = []
+    for label, yhat, node_residuals in zip([TOTAL_LABEL] + categories, coherent, residuals):
+        frame = pd.DataFrame({x_field: future.to_numpy(), y_field: yhat, "type": "Forecast", category_field: label})
+        if interval is not None:
+            interval_method, level = interval
+            band = add_interval(pd.DataFrame({'yhat': yhat}), node_residuals, level, interval_method)
+            frame[LOWER_FIELD] = band['yhat_lower'].to_numpy()
+            frame[UPPER_FIELD] = band['yhat_upper'].to_numpy()
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def with_total(df: pd.DataFrame, x_field: str, y_field: str, category_field: str) -> pd.DataFrame:
+    """Append TOTAL_LABEL rows (sum over categories per date) to actual data."""
+    total = df.groupby(x_field, as_index=False)[y_field].sum()
+    total[category_field] = TOTAL_LABEL
+    if "type" in df.columns:
+        total["type"] = "Actual"
+    return pd.concat([df, total], ignore_index=True)
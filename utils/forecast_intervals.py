@@ -0,0 +1,80 @@
+"""Forecast uncertainty bands from in-sample residuals
+
+Both methods treat forecast errors as accumulating like a random walk of the
+engine's residuals (one-step-ahead errors, or Prophet's widened fitted-value
+errors), so the band widens with the horizon:
+
+- 'analytic': normal interval, yhat +/- z * sigma * sqrt(h)
+- 'bootstrap': quantiles of cumulative sums of resampled residuals, which
+  keeps skew in the residuals (drawn in one vectorized NumPy call)
+
+Either costs well under a millisecond on top of the point forecast, unlike
+Prophet's own sampling-based intervals.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+INTERVAL_METHODS = ("analytic", "bootstrap")
+DEFAULT_INTERVAL_METHOD = "analytic"
+DEFAULT_INTERVAL_LEVEL = 0.8
+
+# Bootstrap paths per forecast; the seed keeps bands stable across reruns
+BOOTSTRAP_PATHS = 1000
+BOOTSTRAP_SEED = 0
+
+# Columns added next to the point forecast
+LOWER_FIELD = "forecast_lower"
+UPPER_FIELD = "forecast_upper"
+
+
+def interval_method(setting) -> str:
+    """Normalise config['forecast_interval'] (True or a method name) to a method name."""
+    method = DEFAULT_INTERVAL_METHOD if setting is True else setting
+    if method not in INTERVAL_METHODS:
+        raise ValueError(f"Unknown forecast interval '{setting}'. Available: {', '.join(INTERVAL_METHODS)}")
+    return method
+
+
+def prediction_interval(
+    yhat: np.ndarray,
+    residuals: np.ndarray,
+    level: float = DEFAULT_INTERVAL_LEVEL,
+    method: str = DEFAULT_INTERVAL_METHOD,
+) -> tuple:
+    """
+    Lower and upper bounds around a point forecast.
+
+    Residuals are an engine's in-sample errors (NaNs are ignored). With
+    fewer than two residuals the band collapses onto the forecast.
+    """
+    yhat = np.asarray(yhat, dtype=float)
+    residuals = np.asarray(residuals, dtype=float)
+    residuals = residuals[np.isfinite(residuals)]
+    if len(residuals) < 2:
+        return yhat.copy(), yhat.copy()
+
+    steps = np.arange(1, len(yhat) + 1)
+    if method == "analytic":
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        half_width = z * residuals.std(ddof=1) * np.sqrt(steps)
+        return yhat - half_width, yhat + half_width
+
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    paths = rng.choice(residuals, size=(BOOTSTRAP_PATHS, len(yhat))).cumsum(axis=1)
+    alpha = (1 - level) / 2
+    lower, upper = np.quantile(paths, [alpha, 1 - alpha], axis=0)
+    return yhat + lower, yhat + upper
+
+
+def add_interval(
+    forecast: pd.DataFrame,
+    residuals: np.ndarray,
+    level: float = DEFAULT_INTERVAL_LEVEL,
+    method: str = DEFAULT_INTERVAL_METHOD,
+) -> pd.DataFrame:
+    """Return the engine forecast (ds, yhat) with yhat_lower/yhat_upper columns."""
+    lower, upper = prediction_interval(forecast["yhat"].to_numpy(), residuals, level, method)
+    return forecast.assign(yhat_lower=lower, yhat_upper=upper)
@@ -0,0 +1,330 @@
+"""Bounded, process-based worker pool for forecast fits
+
+Prophet fits are CPU heavy. Running them in the Streamlit script thread lets
+a burst of forecast requests starve every other session, so fits are handed
+to a fixed number of worker processes instead. Jobs wait in a priority queue,
+identical jobs are shared, and a job that exceeds its timeout has its worker
+killed and replaced.
+
+Jobs may carry a stale key naming the series they forecast independently of
+its data. When the data changes, the last good result for that stale key is
+served while the new fit runs in the background (stale-while-revalidate).
+"""
+
+import heapq
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from multiprocessing.connection import wait
+from functools import partial
+from typing import Callable, Optional
+
+import streamlit as st
+
+from utils.cache import LRUCache
+from utils.refresh import render_refreshing_badge
+
+# Pool sizing: leave at least one core for the Streamlit server itself
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_QUEUED_JOBS = 32
+MAX_QUEUED_BACKGROUND_JOBS = 8  # Background work never takes the queue slots interactive forecasts need
+
+# Seconds a job may run before its worker is killed
+JOB_TIMEOUT_SECONDS = 120
+
+# Finished results kept in memory (shared by all sessions)
+RESULT_CACHE_SIZE = 256
+
+# How often waiting callers refresh their placeholder
+POLL_INTERVAL_SECONDS = 0.2
+
+# Lower value runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class ForecastPoolBusy(RuntimeError):
+    """Raised when the forecast queue is full."""
+
+
+class ForecastTimeout(RuntimeError):
+    """Raised when a forecast job exceeds its time budget."""
+
+
+class ForecastJob:
+    """A unit of work tracked by the pool."""
+
+    def __init__(self, key: str, fn: Callable, args: tuple, priority: int, timeout: float,
+                 stale_key: Optional[str] = None):
+        self.key = key
+        self.stale_key = stale_key
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.timeout = timeout
+        self.state = "queued"
+        self.seq = 0
+        self.remember = True  # Keep the finished job in the pool's result cache
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self):
+        """Return the job result, re-raising the worker's exception on failure."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _finish(self, result=None, error: Optional[BaseException] = None) -> None:
+        self._result = result
+        self._error = error
+        self.state = "failed" if error is not None else "done"
+        self._done.set()
+
+    def _expired(self) -> bool:
+        return self.started_at is not None and time.monotonic() - self.started_at > self.timeout
+
+
+def _worker_main(conn) -> None:
+    """Worker process loop: run (fn, args) messages until the pipe closes."""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        fn, args = message
+        try:
+            conn.send((True, fn(*args)))
+        except Exception as exc:
+            try:
+                conn.send((False, exc))
+            except Exception:
+                # Exception itself is not picklable
+                conn.send((False, RuntimeError(repr(exc))))
+
+
+class _Worker:
+    """One long-lived worker process and the job it is currently running."""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job = None
+
+    def start(self, job: ForecastJob) -> None:
+        job.state = "running"
+        job.started_at = time.monotonic()
+        self.job = job
+        self.conn.send((job.fn, job.args))
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ForecastPool:
+    """Priority queue in front of a fixed set of forecast worker processes."""
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_queued: int = MAX_QUEUED_JOBS,
+        max_queued_background: int = MAX_QUEUED_BACKGROUND_JOBS,
+        job_timeout: float = JOB_TIMEOUT_SECONDS,
+    ):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_queued_background = max_queued_background
+        self.job_timeout = job_timeout
+        self._ctx = mp.get_context("spawn")  # forking a threaded server is unsafe
+        self._workers = []
+        self._queue = []  # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._inflight = {}
+        self._results = LRUCache(RESULT_CACHE_SIZE)
+        self._latest = LRUCache(RESULT_CACHE_SIZE)  # stale key -> last successful job
+        self._cond = threading.Condition()
+        threading.Thread(target=self._dispatch_loop, name="forecast-pool", daemon=True).start()
+
+    def submit(
+        self,
+        key: str,
+        fn: Callable,
+        *args,
+        priority: int = PRIORITY_INTERACTIVE,
+        stale_key: Optional[str] = None,
+        remember: bool = True,
+    ) -> ForecastJob:
+        """
+        Queue fn(*args) under key, or return the existing job for that key.
+
+        Jobs at background priority may hold at most max_queued_background
+        queue slots. With remember=False the finished job is not kept in the
+        result cache (for callers that keep their own results).
+
+        Raises:
+            ForecastPoolBusy: If the queue (or its background share) is already full.
+        """
+        with self._cond:
+            finished = self._results.get(key)
+            if finished is not None:
+                return finished
+            job = self._inflight.get(key)
+            if job is not None:
+                return job
+            if len(self._queue) >= self.max_queued:
+                raise ForecastPoolBusy("Forecast service is busy, please try again shortly.")
+            if priority >= PRIORITY_BACKGROUND:
+                background = sum(1 for entry in self._queue if entry[0] >= PRIORITY_BACKGROUND)
+                if background >= self.max_queued_background:
+                    raise ForecastPoolBusy("Background forecast queue is full.")
+            job = ForecastJob(key, fn, args, priority, self.job_timeout, stale_key)
+            job.remember = remember
+            job.seq = next(self._seq)
+            self._inflight[key] = job
+            heapq.heappush(self._queue, (priority, job.seq, job))
+            self._cond.notify()
+            return job
+
+    def latest(self, stale_key: str) -> Optional[ForecastJob]:
+        """Most recent successful job for a stale key, if any."""
+        return self._latest.get(stale_key)
+
+    def queue_position(self, job: ForecastJob) -> int:
+        """1-based position of a queued job, or 0 once it is running or done."""
+        with self._cond:
+            if job.state != "queued":
+                return 0
+            ahead = sum(1 for entry in self._queue if entry[:2] < (job.priority, job.seq))
+            return ahead + 1
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._busy_workers():
+                    self._cond.wait()
+                self._start_queued_jobs()
+                busy = self._busy_workers()
+            ready = wait([worker.conn for worker in busy], timeout=POLL_INTERVAL_SECONDS) if busy else []
+            with self._cond:
+                for worker in busy:
+                    if worker.conn in ready:
+                        self._collect(worker)
+                    elif worker.job._expired():
+                        self._replace(worker, ForecastTimeout(
+                            f"Forecast took longer than {worker.job.timeout:.0f}s and was cancelled."
+                        ))
+
+    def _busy_workers(self) -> list:
+        return [worker for worker in self._workers if worker.job is not None]
+
+    def _start_queued_jobs(self) -> None:
+        while self._queue:
+            idle = next((worker for worker in self._workers if worker.job is None), None)
+            if idle is None:
+                if len(self._workers) >= self.max_workers:
+                    return
+                idle = _Worker(self._ctx)
+                self._workers.append(idle)
+            _, _, job = heapq.heappop(self._queue)
+            idle.start(job)
+
+    def _collect(self, worker: _Worker) -> None:
+        job = worker.job
+        try:
+            ok, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            self._replace(worker, RuntimeError("Forecast worker exited unexpectedly."))
+            return
+        worker.job = None
+        if ok:
+            job._finish(result=payload)
+            if job.stale_key is not None:
+                self._latest.set(job.stale_key, job)  # atomic swap for stale readers
+        else:
+            job._finish(error=payload)
+        self._settle(job)
+
+    def _replace(self, worker: _Worker, error: BaseException) -> None:
+        job = worker.job
+        worker.kill()
+        self._workers.remove(worker)
+        job._finish(error=error)
+        # Timeouts and crashed workers are transient: the next render submits the job again
+        self._settle(job, remember=False)
+
+    def _settle(self, job: ForecastJob, remember: bool = True) -> None:
+        # Fit errors raised by fn are remembered too, so a failing fit is not retried on every rerun
+        self._inflight.pop(job.key, None)
+        if remember and job.remember:
+            self._results.set(job.key, job)
+
+
+@st.cache_resource(show_spinner=False)
+def get_forecast_pool() -> ForecastPool:
+    """Process-wide forecast pool shared by every session."""
+    return ForecastPool()
+
+
+def run_forecast(
+    key: str,
+    fn: Callable,
+    *args,
+    priority: int = PRIORITY_INTERACTIVE,
+    placeholder=None,
+    stale_key: Optional[str] = None,
+):
+    """
+    Run fn(*args) on the forecast pool and block until it finishes.
+
+    While waiting, the placeholder shows the job's queue position or that it
+    is running. The script thread only sleeps, so other sessions keep rendering.
+
+    If stale_key has an earlier result, that result is returned immediately
+    with a "refreshing" badge and the new job runs at background priority.
+    """
+    pool = get_forecast_pool()
+    stale = pool.latest(stale_key) if stale_key is not None else None
+    if stale is not None and stale.key != key:
+        try:
+            job = pool.submit(key, fn, *args, priority=PRIORITY_BACKGROUND, stale_key=stale_key)
+        except ForecastPoolBusy:
+            return stale.result()  # Revalidated on a later render
+        if not job.done:
+            render_refreshing_badge(partial(_is_pending, job), label="Refreshing forecast")
+            return stale.result()
+
+    job = pool.submit(key, fn, *args, priority=priority, stale_key=stale_key)
+    placeholder = placeholder if placeholder is not None else st.empty()
+
+    message = None
+    while not job.wait(POLL_INTERVAL_SECONDS):
+        position = pool.queue_position(job)
+        status = f"Forecast queued (position {position})..." if position else "Generating forecast..."
+        if status != message:
+            placeholder.caption(f":material/hourglass_top: {status}")
+            message = status
+    if message is not None:
+        placeholder.empty()
+    return job.result()
+
+
+def _is_pending(job: ForecastJob) -> bool:
+    return not job.done
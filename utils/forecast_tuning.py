@@ -0,0 +1,237 @@
+"""
+Automatic per-series tuning of forecast engines and hyperparameters.
+
+Opt in per chart with config['forecast_tuning'] = True. The first render
+forecasts with the configured engine and queues the series for tuning: a
+single background thread takes one series at a time and scores every
+candidate in TUNING_GRID by rolling-origin MASE on the forecast pool,
+TUNING_BATCH candidates at a time so interactive forecasts keep their queue
+slots; when the pool is busy, the scores so far are kept and a later render
+resumes from the next candidate. The winner is persisted under the series fingerprint and later
+renders of the same data reuse the tuned engine and settings.
+
+To tune offline across all cores:
+    python -m utils.forecast_tuning
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.backtesting import backtest_series
+from utils.cache import LRUCache
+from utils.fingerprint import frame_fingerprint, make_key
+from utils.forecast_pool import PRIORITY_BACKGROUND, ForecastPoolBusy, get_forecast_pool
+from utils.series_store import SeriesStore
+
+TUNING_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'forecast_tuning.json'
+)
+
+# Small grid: Prophet trend flexibility and seasonality mode, plus the cheap engines
+TUNING_GRID = [
+    ('prophet', {'n_changepoints': n, 'changepoint_prior_scale': scale, 'seasonality_mode': mode})
+    for n in (5, 10, 25)
+    for scale in (0.05, 0.5)
+    for mode in ('additive', 'multiplicative')
+] + [
+    ('holt', {'alpha': alpha, 'beta': beta})
+    for alpha in (0.3, 0.7)
+    for beta in (0.05, 0.2)
+] + [
+    ('drift', {}),
+    ('seasonal_naive', {}),
+]
+
+TUNING_HORIZON = 6
+TUNING_ORIGINS = 3
+TUNING_BATCH = 4  # Candidates on the forecast pool at once
+TUNING_QUEUE_SIZE = 16  # Series waiting to be tuned; more are requested again on a later render
+PARTIAL_SCORES_SIZE = 64  # Series whose tuning was interrupted by a busy pool, resumed where it stopped
+
+_lock = threading.Lock()
+_in_progress = set()
+_pending = queue.Queue(maxsize=TUNING_QUEUE_SIZE)
+_partial = LRUCache(max_size=PARTIAL_SCORES_SIZE)  # (fingerprint, freq) -> scores of the first candidates
+_tuner = None
+
+
+def series_fingerprint(ds: pd.Series, y: np.ndarray) -> str:
+    """Fingerprint of one series' dates and values."""
+    return frame_fingerprint(pd.DataFrame({'ds': pd.to_datetime(ds).to_numpy(), 'y': np.asarray(y, dtype=float)}))
+
+
+def split_series(df: pd.DataFrame, x_field: str, y_field: str, category_field: Optional[str] = None) -> dict:
+    """Map series label ('' for single-series charts) to its sorted (ds, y)."""
+    frame = pd.DataFrame({'ds': pd.to_datetime(df[x_field]), 'y': df[y_field].to_numpy(dtype=float)})
+    if category_field is not None:
+        frame['category'] = df[category_field].to_numpy()
+    store = SeriesStore(frame, 'ds', None if category_field is None else 'category')
+    ds, y = store.column('ds'), store.column('y')
+    return {
+        '' if category_field is None else str(label): (pd.Series(ds[rows]), y[rows])
+        for label, rows in zip(store.labels, store.slices())
+        if rows.stop > rows.start
+    }
+
+
+def _load() -> dict:
+    try:
+        with open(TUNING_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(fingerprint: str, params: dict) -> None:
+    with _lock:
+        tuned = _load()
+        tuned[fingerprint] = params
+        os.makedirs(os.path.dirname(TUNING_PATH), exist_ok=True)
+        tmp_path = f"{TUNING_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(tuned, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, TUNING_PATH)
+
+
+def tuned_params(series: dict) -> dict:
+    """Persisted {'engine', 'settings'} for each series label that has been tuned."""
+    tuned = _load()
+    params = {}
+    for label, (ds, y) in series.items():
+        entry = tuned.get(series_fingerprint(ds, y))
+        if entry is not None:
+            params[label] = {'engine': entry['engine'], 'settings': entry['settings']}
+    return params
+
+
+def evaluate_candidate(ds: pd.Series, y: np.ndarray, freq: str, engine: str, settings: dict) -> Optional[dict]:
+    """Rolling-origin score of one candidate. Runs on a worker process."""
+    return backtest_series(ds, y, freq, engine, settings, TUNING_HORIZON, TUNING_ORIGINS, measure_memory=False)
+
+
+def pick_best(candidates: list, scores: list) -> Optional[dict]:
+    """Lowest MASE wins; fit time breaks ties."""
+    scored = [
+        (score['mase'], score['fit_seconds'], engine, settings)
+        for (engine, settings), score in zip(candidates, scores)
+        if score is not None and np.isfinite(score['mase'])
+    ]
+    if not scored:
+        return None
+    mase, fit_seconds, engine, settings = min(scored, key=lambda item: item[:2])
+    return {'engine': engine, 'settings': settings, 'mase': mase, 'fit_seconds': fit_seconds}
+
+
+def _tune_on_pool(fingerprint: str, ds: pd.Series, y: np.ndarray, freq: str) -> None:
+    pool = get_forecast_pool()
+    # Candidates scored before the pool last turned the series away are not run again
+    scores = list(_partial.get((fingerprint, freq)) or [])
+    for start in range(len(scores), len(TUNING_GRID), TUNING_BATCH):
+        jobs, busy = [], False
+        try:
+            for engine, settings in TUNING_GRID[start:start + TUNING_BATCH]:
+                # Scores stay out of the pool's result cache, which chart forecasts rely on
+                jobs.append(pool.submit(
+                    make_key(__name__, fingerprint, freq, engine, settings),
+                    evaluate_candidate, ds, y, freq, engine, settings,
+                    priority=PRIORITY_BACKGROUND, remember=False,
+                ))
+        except ForecastPoolBusy:
+            busy = True
+        # Wait for whatever was submitted, so no job is left running for nobody
+        for job in jobs:
+            try:
+                scores.append(job.result())
+            except Exception:
+                scores.append(None)  # a failing candidate just drops out
+        if busy:
+            _partial.set((fingerprint, freq), scores)
+            return  # resumed on a later render
+    _partial.pop((fingerprint, freq))
+    best = pick_best(TUNING_GRID, scores)
+    if best is not None:
+        _save(fingerprint, best)
+
+
+def _tune_pending() -> None:
+    while True:
+        fingerprint, ds, y, freq = _pending.get()
+        try:
+            _tune_on_pool(fingerprint, ds, y, freq)
+        except Exception:
+            pass  # retried on a later render
+        finally:
+            with _lock:
+                _in_progress.discard(fingerprint)
+
+
+def request_tuning(series: dict, infer_frequency: Callable[[pd.Series], str]) -> None:
+    """Queue background tuning for every series that has no persisted result yet."""
+    global _tuner
+    tuned = _load()
+    for ds, y in series.values():
+        fingerprint = series_fingerprint(ds, y)
+        with _lock:
+            if fingerprint in tuned or fingerprint in _in_progress:
+                continue
+            try:
+                _pending.put_nowait((fingerprint, ds, y, infer_frequency(ds)))
+            except queue.Full:
+                return  # retried on a later render
+            _in_progress.add(fingerprint)
+            if _tuner is None:
+                _tuner = threading.Thread(target=_tune_pending, daemon=True)
+                _tuner.start()
+
+
+def main() -> None:
+    import logging
+    import warnings
+
+    from benchmarks.forecast_backtest import iter_chart_configs, iter_series
+    from streamlit_app import all_configs
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--all', action='store_true', help="Tune every chart, not only those with 'forecast_tuning'")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    warnings.filterwarnings('ignore')
+
+    series = {}
+    for chart in iter_chart_configs(all_configs):
+        if args.all or chart.get('forecast_tuning'):
+            for category, ds, y, freq in iter_series(chart):
+                series[series_fingerprint(ds, y)] = (f"{chart['title']} / {category or '-'}", ds, y, freq)
+
+    # One task per (series, candidate) so all cores stay busy
+    tasks = [
+        (ds, y, freq, engine, settings)
+        for _, ds, y, freq in series.values()
+        for engine, settings in TUNING_GRID
+    ]
+    if not tasks:
+        print("No charts to tune (set 'forecast_tuning' on a chart or pass --all).")
+        return
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        scores = list(executor.map(evaluate_candidate, *zip(*tasks)))
+
+    for i, (fingerprint, (label, *_)) in enumerate(series.items()):
+        block = scores[i * len(TUNING_GRID):(i + 1) * len(TUNING_GRID)]
+        best = pick_best(TUNING_GRID, block)
+        if best is not None:
+            _save(fingerprint, best)
+            print(f"{label}: {best['engine']} {best['settings']} (MASE {best['mase']:.3f})")
+
+
+if __name__ == '__main__':
+    main()
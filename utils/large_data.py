@@ -0,0 +1,114 @@
+"""Server-side reduction of large chart frames
+
+Altair refuses to embed more than 5,000 rows (MaxRowsError), and whatever
+is sent has to be filtered and aggregated in the browser. In large-data
+mode a chart's frame is reduced on the server to the rows it will draw, the
+way Vega-Lite's own transforms would: rows with no x or y value are dropped
+(Vega-Lite filters invalid values) and rows sharing an x value and category
+are aggregated, so a raw per-entry frame becomes one row per mark.
+
+High-cardinality breakdowns (per client, per project) can also be capped
+with config['max_categories']: the categories with the largest y total
+are kept and the rest are folded into a single OTHER_LABEL series, so the
+legend, the spec and any forecast cover N + 1 series instead of hundreds.
+
+Charts shown at a coarser time granularity (config['granularity_level'],
+set from the chart's selector) are first rolled up by utils.resample.
+"""
+
+import pandas as pd
+
+from utils.resample import rollup
+
+LARGE_DATA_ROWS = 5000  # Altair's default max_rows; larger frames switch to large-data mode
+
+AGGREGATES = ("sum", "mean", "median", "min", "max", "count")
+DEFAULT_AGGREGATE = "sum"
+
+OTHER_LABEL = "Other"  # Category that collects everything below the top max_categories
+
+
+def is_large(df: pd.DataFrame, config: dict) -> bool:
+    """config['large_data'] when set, otherwise whether the frame exceeds LARGE_DATA_ROWS."""
+    return config.get('large_data', len(df) > LARGE_DATA_ROWS)
+
+
+def chart_rows(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+    """The frame a chart should plot: df itself, or its reduction in large-data mode."""
+    large = is_large(df, config)
+    category_field = config.get('category_field')
+    if config.get('granularity_level'):
+        df = rollup(
+            df,
+            config['x_field'],
+            config['y_field'],
+            category_field,
+            config['granularity_level'],
+            config.get('aggregate', DEFAULT_AGGREGATE),
+        )
+    if category_field and config.get('max_categories'):
+        df = collapse_categories(
+            df,
+            config['x_field'],
+            config['y_field'],
+            category_field,
+            config['max_categories'],
+            keep=config.get('category_area_highlight', ()),
+            aggregate=config.get('aggregate', DEFAULT_AGGREGATE),
+        )
+    if not large:
+        return df
+    return reduce_frame(
+        df,
+        config['x_field'],
+        config['y_field'],
+        [category_field] if category_field else [],
+        config.get('aggregate', DEFAULT_AGGREGATE),
+    )
+
+
+def reduce_frame(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    group_fields: list = (),
+    aggregate: str = DEFAULT_AGGREGATE,
+) -> pd.DataFrame:
+    """One row per x value (and group) with y aggregated; other columns are dropped."""
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate '{aggregate}'. Available: {', '.join(AGGREGATES)}")
+    keys = [x_field, *group_fields]
+    valid = df[[*keys, y_field]].dropna(subset=[x_field, y_field])
+    return (
+        valid.groupby(keys, sort=True, observed=True, dropna=False)[y_field]
+        .agg(aggregate)
+        .reset_index()
+    )
+
+
+def collapse_categories(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    category_field: str,
+    max_categories: int,
+    keep: list = (),
+    aggregate: str = DEFAULT_AGGREGATE,
+) -> pd.DataFrame:
+    """
+    df with only its max_categories largest categories (by total y) plus OTHER_LABEL.
+
+    Rows of the other categories are aggregated per x value into one
+    OTHER_LABEL row; categories in keep are never folded. Frames with at
+    most max_categories categories are returned as they are.
+    """
+    totals = df.groupby(category_field, observed=True, dropna=True)[y_field].sum()
+    if len(totals) <= max_categories:
+        return df
+    # Largest totals first, ties broken by label so the cut is deterministic
+    ranked = totals.reset_index().sort_values([y_field, category_field], ascending=[False, True], kind='mergesort')
+    top = set(ranked[category_field].iloc[:max_categories]) | set(keep)
+    is_top = df[category_field].isin(top).to_numpy()
+    other = reduce_frame(df[~is_top & df[category_field].notna().to_numpy()], x_field, y_field, aggregate=aggregate)
+    other[category_field] = OTHER_LABEL
+    return pd.concat([df[is_top], other], ignore_index=True)
@@ -0,0 +1,123 @@
+"""Trend and rolling-statistics overlays for every series of a chart at once
+
+Three overlays can be drawn over line and bar charts, per category:
+
+- trendline: a least-squares line through each series (y against the
+  point's position in x order), drawn between its first and last x.
+- moving_average: the trailing mean of the last `window` points.
+- rolling_regression: the end point of a least-squares line fitted to the
+  last `window` points, a trend that follows changes of slope.
+
+Series come from a SeriesStore, so each one is a contiguous run of a single
+array. The trendline is closed-form least squares from per-series sums
+(np.bincount), and the rolling overlays are sliding-window kernels over the
+whole array, with windows that straddle two series masked out; nothing
+loops over categories in Python.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.series_store import SeriesStore
+
+OVERLAY_FIELD = "overlay"  # Which overlay a row belongs to (its legend label)
+TREND_LABEL = "Trend"
+
+
+def moving_average_label(window: int) -> str:
+    return f"{window}-point moving average"
+
+
+def rolling_regression_label(window: int) -> str:
+    return f"{window}-point rolling trend"
+
+
+def overlay_labels(config: dict) -> list:
+    """Labels of the overlays config asks for, in drawing order."""
+    labels = [TREND_LABEL] if config.get('trendline', False) else []
+    if config.get('moving_average'):
+        labels.append(moving_average_label(config['moving_average']))
+    if config.get('rolling_regression'):
+        labels.append(rolling_regression_label(config['rolling_regression']))
+    return labels
+
+
+def overlay_frame(df: pd.DataFrame, config: dict) -> Optional[pd.DataFrame]:
+    """
+    Long frame of every requested overlay for every series of df.
+
+    Columns are x_field, y_field, category_field (if set) and OVERLAY_FIELD.
+    Rows without an x or y value are ignored. Returns None when config asks
+    for no overlay.
+    """
+    if not overlay_labels(config):
+        return None
+    x_field, y_field = config['x_field'], config['y_field']
+    category_field = config.get('category_field')
+    valid = (df[x_field].notna() & df[y_field].notna()).to_numpy()
+    store = SeriesStore(df, x_field, category_field, mask=valid)
+    y = store.column(y_field).astype(float)
+    ranks = np.arange(len(y)) - np.repeat(store.offsets[:-1], store.lengths)
+
+    parts = []  # (store positions, values, label)
+    if config.get('trendline', False):
+        parts.append(_trend_ends(store, y, ranks) + (TREND_LABEL,))
+    for key, kernel, label in (
+        ('moving_average', _moving_average, moving_average_label),
+        ('rolling_regression', _rolling_regression, rolling_regression_label),
+    ):
+        window = config.get(key)
+        if window:
+            values = kernel(y, window)
+            positions = np.flatnonzero(ranks >= window - 1)  # Windows within one series
+            parts.append((positions, values[positions - (window - 1)], label(window)))
+
+    positions = np.concatenate([part[0] for part in parts])
+    frame = {
+        x_field: store.column(x_field)[positions],
+        y_field: np.concatenate([part[1] for part in parts]),
+    }
+    if category_field:
+        frame[category_field] = store.column(category_field)[positions]
+    labels = np.array([part[2] for part in parts], dtype=object)
+    frame[OVERLAY_FIELD] = np.repeat(labels, [len(part[0]) for part in parts])
+    return pd.DataFrame(frame)
+
+
+def _trend_ends(store: SeriesStore, y: np.ndarray, ranks: np.ndarray) -> tuple:
+    """Store positions of each series' first and last point, with the fitted values there."""
+    codes = np.repeat(np.arange(len(store)), store.lengths)
+    half_span = (store.lengths - 1) / 2
+    t = ranks - half_span[codes]  # Centered positions: the line passes through the series mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.bincount(codes, t * y, len(store)) / np.bincount(codes, t * t, len(store))
+        mean = np.bincount(codes, y, len(store)) / store.lengths
+    fitted = np.flatnonzero(store.lengths >= 2)  # A line needs two points
+    first, last = store.offsets[fitted], store.offsets[fitted + 1] - 1
+    rise = slope[fitted] * half_span[fitted]
+    positions = np.column_stack([first, last]).ravel()
+    values = np.column_stack([mean[fitted] - rise, mean[fitted] + rise]).ravel()
+    return positions, values
+
+
+def _moving_average(y: np.ndarray, window: int) -> np.ndarray:
+    """Mean of every window of y (entry i covers y[i:i + window])."""
+    if len(y) < window:
+        return np.empty(0)
+    return sliding_window_view(y, window).mean(axis=1)
+
+
+def _rolling_regression(y: np.ndarray, window: int) -> np.ndarray:
+    """Least-squares line through every window of y, evaluated at the window's last point."""
+    if len(y) < window:
+        return np.empty(0)
+    windows = sliding_window_view(y, window)
+    t = np.arange(window) - (window - 1) / 2  # Centered positions: slope is a dot product
+    mean = windows.mean(axis=1)
+    if window < 2:
+        return mean
+    slope = windows @ t / (t @ t)
+    return mean + slope * t[-1]
@@ -0,0 +1,191 @@
+"""Declarative transform pipelines over the raw tables
+
+Instead of a prebuilt df, a chart config can declare config['pipeline']: a
+list of steps run on the CSV tables in resources/raw_data. The first step
+names the source table; every other step transforms the previous result.
+
+    {'source': 'fct__time_entries'}
+    {'filter': {'billable': True, 'hours': {'>': 0}, 'user_id': [...]}}
+    {'join': 'dim__projects__anonymized', 'on': 'project_id', 'columns': ['client_anon'], 'how': 'left'}
+    {'groupby': ['project_id'], 'agg': {'hours': 'sum', 'entries': ['hours', 'count']}}
+    {'resample': 'month', 'on': 'dt', 'groupby': ['client_anon'], 'agg': {'hours': 'sum'}}
+    {'pivot': 'billable', 'index': 'month', 'values': 'hours'}
+
+A join's right side is a table name or a pipeline of its own. Filters take
+a value, a list of values, or {operator: value} with ==, !=, >, >=, <, <=,
+in, not in. Aggregations map an output column to a function of the column
+of the same name, or to [column, function]. Resample truncates `on` to the
+start of its day, week, month, quarter or year and, with agg, aggregates
+per period (and groupby columns).
+
+Every intermediate result is memoized under a key chained from the content
+fingerprint of the source table and the steps applied to it, so charts that
+share a prefix (the same source and join, say) compute it once, and a
+changed source file only invalidates the pipelines that read it.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache
+from utils.fingerprint import frame_fingerprint, make_key
+from utils.resample import to_datetime, truncate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_DATA_DIR = os.path.join(ROOT, 'resources', 'raw_data')
+
+PIPELINE_CACHE_SIZE = 64  # Intermediate results, shared prefixes counted once
+STEPS = ('source', 'filter', 'join', 'groupby', 'resample', 'pivot')
+
+_OPERATORS = {
+    '==': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    'in': lambda column, value: column.isin(value),
+    'not in': lambda column, value: ~column.isin(value),
+}
+
+_sources = LRUCache(max_size=16)
+_results = LRUCache(max_size=PIPELINE_CACHE_SIZE)
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _kind(step: dict) -> str:
+    kinds = [key for key in step if key in STEPS]
+    if 'resample' in kinds and 'groupby' in kinds:
+        kinds.remove('groupby')  # A resample's groupby lists the keys kept next to the period
+    if len(kinds) != 1:
+        raise ValueError(f"A pipeline step needs exactly one of {', '.join(STEPS)}; got {sorted(step)}")
+    return kinds[0]
+
+
+def _load_source(name: str) -> tuple:
+    """(table, content key) of a raw table, re-read when its file changes."""
+    path = os.path.join(RAW_DATA_DIR, f"{name}.csv")
+    if not os.path.exists(path):
+        available = sorted(file[:-4] for file in os.listdir(RAW_DATA_DIR) if file.endswith('.csv'))
+        raise ValueError(f"Unknown source '{name}'. Available: {', '.join(available)}")
+    version = (path, os.path.getmtime(path))
+    entry = _sources.get(version)
+    if entry is None:
+        table = pd.read_csv(path)
+        entry = (table, make_key('source', frame_fingerprint(table)))
+        _sources.set(version, entry)
+    return entry
+
+
+def _filter(df: pd.DataFrame, step: dict) -> pd.DataFrame:
+    mask = np.ones(len(df), dtype=bool)
+    for column, condition in step['filter'].items():
+        if isinstance(condition, dict):
+            for operator, value in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unknown filter operator '{operator}'. Available: {', '.join(_OPERATORS)}")
+                mask &= _OPERATORS[operator](df[column], value).to_numpy()
+        elif isinstance(condition, (list, tuple, set)):
+            mask &= df[column].isin(condition).to_numpy()
+        else:
+            mask &= (df[column] == condition).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+def _join(df: pd.DataFrame, step: dict, right: pd.DataFrame) -> pd.DataFrame:
+    left_on = _as_list(step.get('left_on', step.get('on')))
+    right_on = _as_list(step.get('right_on', step.get('on')))
+    if 'columns' in step:
+        right = right[list(dict.fromkeys(right_on + _as_list(step['columns'])))]
+    return df.merge(right, how=step.get('how', 'left'), left_on=left_on, right_on=right_on)
+
+
+def _aggregate(df: pd.DataFrame, by: list, agg: dict) -> pd.DataFrame:
+    named = {
+        output: tuple(spec) if isinstance(spec, (list, tuple)) else (output, spec)
+        for output, spec in agg.items()
+    }
+    return df.groupby(by, sort=True, observed=True).agg(**named).reset_index()
+
+
+def _groupby(df: pd.DataFrame, step: dict) -> pd.DataFrame:
+    return _aggregate(df, _as_list(step['groupby']), step['agg'])
+
+
+def _resample(df: pd.DataFrame, step: dict) -> pd.DataFrame:
+    on = step['on']
+    times = to_datetime(df[on])
+    if times is None:
+        raise ValueError(f"Cannot resample on '{on}': it does not hold dates")
+    df = df.assign(**{on: truncate(times.to_numpy(dtype='datetime64[ns]'), step['resample'])})
+    if 'agg' not in step:
+        return df
+    return _aggregate(df, [on, *_as_list(step.get('groupby', []))], step['agg'])
+
+
+def _pivot(df: pd.DataFrame, step: dict) -> pd.DataFrame:
+    wide = df.pivot_table(
+        index=_as_list(step['index']),
+        columns=step['pivot'],
+        values=step['values'],
+        aggfunc=step.get('aggfunc', 'sum'),
+        fill_value=step.get('fill_value', 0),
+        observed=True,
+    )
+    wide.columns = [str(column) for column in wide.columns]
+    return wide.reset_index()
+
+
+_TRANSFORMS = {
+    'filter': _filter,
+    'groupby': _groupby,
+    'resample': _resample,
+    'pivot': _pivot,
+}
+
+
+def _step_key(parent: str, step: dict) -> str:
+    # Sorted JSON: the same step written with its keys in another order shares the entry
+    return make_key(parent, json.dumps(step, sort_keys=True, default=str))
+
+
+def _run(pipeline) -> tuple:
+    """(result, key) of a pipeline, or of a bare table name."""
+    if isinstance(pipeline, str):
+        pipeline = [{'source': pipeline}]
+    if not pipeline or _kind(pipeline[0]) != 'source':
+        raise ValueError("A pipeline starts with a 'source' step")
+    df, key = _load_source(pipeline[0]['source'])
+    for step in pipeline[1:]:
+        kind = _kind(step)
+        right = None
+        if kind == 'join':
+            right, right_key = _run(step['join'])
+            key = _step_key(key, {**step, 'join': right_key})
+        elif kind == 'source':
+            raise ValueError("Only the first step of a pipeline can be a 'source'")
+        else:
+            key = _step_key(key, step)
+        result = _results.get(key)
+        if result is None:
+            result = _join(df, step, right) if kind == 'join' else _TRANSFORMS[kind](df, step)
+            _results.set(key, result)
+        df = result
+    return df, key
+
+
+def run(pipeline: list) -> pd.DataFrame:
+    """Result of a pipeline (shared with other callers: do not modify it in place)."""
+    return _run(pipeline)[0]
+
+
+def pipeline_config_df(config: dict) -> None:
+    """Set config['df'] to the result of config['pipeline'] (a list of steps)."""
+    if config.get('pipeline'):
+        config['df'] = run(config['pipeline'])
@@ -0,0 +1,21 @@
+"""'Refreshing' badge for content served from a stale cache"""
+
+from typing import Callable
+
+import streamlit as st
+
+# How often a refreshing badge checks whether fresh data is ready
+REFRESH_POLL_SECONDS = 2
+
+
+@st.fragment(run_every=REFRESH_POLL_SECONDS)
+def render_refreshing_badge(is_refreshing: Callable[[], bool], label: str = "Refreshing") -> None:
+    """
+    Show a badge while stale content is displayed.
+
+    The fragment polls is_refreshing and reruns the app once the fresh result
+    has been swapped in, which also removes the badge.
+    """
+    if not is_refreshing():
+        st.rerun()
+    st.badge(label, icon=":material/sync:", color="orange")
@@ -0,0 +1,187 @@
+"""Time-granularity rollups for time-based charts
+
+Output CSVs are written at one granularity (a row per month, per quarter,
+...). Charts with config['granularity'] get a selector that re-buckets
+their x values to day, week, month, quarter or year start, with y
+aggregated per bucket and category.
+
+Rollups are cached per dataset version (content fingerprint) and level.
+Only the day level is computed from raw rows; coarser levels are derived
+from the cached level below them (week and month from day, quarter from
+month, year from quarter). Levels keep partial aggregates (sum, count,
+min, max) so that every aggregate except the median can be derived
+without going back to raw rows.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.cache import LRUCache
+from utils.fingerprint import frame_fingerprint, make_key
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")  # Finest first
+ROLLUP_CACHE_SIZE = 128  # Levels of a few dozen chart datasets
+
+# Level each coarser level is derived from
+_DERIVED_FROM = {"week": "day", "month": "day", "quarter": "month", "year": "quarter"}
+
+# Partial aggregates kept per bucket and how two buckets' partials combine
+_PARTIALS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+_rollups = LRUCache(max_size=ROLLUP_CACHE_SIZE)
+
+
+def truncate(values: np.ndarray, level: str) -> np.ndarray:
+    """Start of the level's period containing each datetime64 value (NaT stays NaT)."""
+    if level not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{level}'. Available: {', '.join(GRANULARITIES)}")
+    values = np.asarray(values, dtype='datetime64[ns]')
+    missing = np.isnat(values)
+    if level == "day":
+        start = values.astype('datetime64[D]')
+    elif level == "week":
+        days = values.astype('datetime64[D]').view(np.int64)
+        start = (days - (days + 3) % 7).view('datetime64[D]')  # 1970-01-01 was a Thursday; weeks start Monday
+    elif level == "month":
+        start = values.astype('datetime64[M]')
+    elif level == "quarter":
+        months = values.astype('datetime64[M]').view(np.int64)
+        start = (months - months % 3).view('datetime64[M]')
+    else:
+        start = values.astype('datetime64[Y]')
+    start = start.astype('datetime64[ns]')
+    start[missing] = np.datetime64('NaT')
+    return start
+
+
+def to_datetime(series: pd.Series) -> Optional[pd.Series]:
+    """series as datetimes (quarter labels like '2021Q1' included), or None if it is not time-based."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return None  # Years, indexes, measures: not timestamps
+    try:
+        return pd.to_datetime(series)
+    except (ValueError, TypeError):
+        pass
+    try:
+        return pd.Series(pd.PeriodIndex(series, freq='Q').to_timestamp(), index=series.index)
+    except (ValueError, TypeError):
+        return None
+
+
+def native_granularity(x: pd.Series) -> Optional[str]:
+    """Coarsest level that keeps every distinct x value apart (None if x is not time-based)."""
+    x = to_datetime(x)
+    if x is None:
+        return None
+    distinct = np.unique(x.dropna().to_numpy(dtype='datetime64[ns]').view(np.int64)).view('datetime64[ns]')
+    native = GRANULARITIES[0]
+    for level in GRANULARITIES:
+        if len(np.unique(truncate(distinct, level))) < len(distinct):
+            break
+        native = level
+    return native
+
+
+def granularity_options(x: pd.Series) -> list:
+    """Levels a chart of x can be shown at: its native level and every coarser one it rolls up to."""
+    native = native_granularity(x)
+    if native is None:
+        return []
+    coarser = GRANULARITIES[GRANULARITIES.index(native):]
+    # Weeks straddle months: only daily data rolls up to weeks
+    return [level for level in coarser if level != "week" or native == "day"]
+
+
+def rollup(
+    df: pd.DataFrame,
+    x_field: str,
+    y_field: str,
+    category_field: Optional[str],
+    level: str,
+    aggregate: str = "sum",
+) -> pd.DataFrame:
+    """
+    One row per period start (and category) with y aggregated: x_field, [category_field], y_field.
+
+    aggregate is 'sum', 'mean', 'median', 'min', 'max' or 'count'.
+    Rows without x or y are ignored. Frames whose x is not time-based are
+    returned unchanged.
+    """
+    x = to_datetime(df[x_field])
+    if x is None:
+        return df
+    keys = [category_field] if category_field else []
+    frame = pd.DataFrame({x_field: x.to_numpy(dtype='datetime64[ns]'), y_field: df[y_field].to_numpy()})
+    for key in keys:
+        frame[key] = df[key].to_numpy()
+    frame = frame.dropna(subset=[x_field, y_field])
+    dataset = make_key(frame_fingerprint(frame), x_field, y_field, category_field)
+
+    if aggregate == "median":
+        # Medians do not combine: computed from raw rows, once per level
+        key = make_key(dataset, level, aggregate)
+        result = _rollups.get(key)
+        if result is None:
+            buckets = frame.assign(**{x_field: truncate(frame[x_field].to_numpy(), level)})
+            result = buckets.groupby([x_field, *keys], sort=True, observed=True)[y_field].median().reset_index()
+            _rollups.set(key, result)
+        return result[[x_field, *keys, y_field]]
+
+    partials = _partials(dataset, frame, x_field, y_field, keys, level)
+    if aggregate == "mean":
+        values = partials['sum'] / partials['count']
+    elif aggregate in _PARTIALS:
+        values = partials[aggregate]
+    else:
+        raise ValueError(f"Unknown aggregate '{aggregate}'")
+    result = partials[[x_field, *keys]].copy()
+    result[y_field] = values.to_numpy()
+    return result
+
+
+def _partials(dataset: str, frame: pd.DataFrame, x_field: str, y_field: str, keys: list, level: str) -> pd.DataFrame:
+    """Cached (sum, count, min, max) per bucket of level, derived from the level below when possible."""
+    cache_key = make_key(dataset, level)
+    partials = _rollups.get(cache_key)
+    if partials is not None:
+        return partials
+    if level in _DERIVED_FROM:
+        finer = _partials(dataset, frame, x_field, y_field, keys, _DERIVED_FROM[level])
+        buckets = finer.assign(**{x_field: truncate(finer[x_field].to_numpy(), level)})
+        partials = buckets.groupby([x_field, *keys], sort=True, observed=True).agg(_PARTIALS).reset_index()
+    else:
+        buckets = frame.assign(**{x_field: truncate(frame[x_field].to_numpy(), level)})
+        partials = buckets.groupby([x_field, *keys], sort=True, observed=True)[y_field].agg(list(_PARTIALS)).reset_index()
+    _rollups.set(cache_key, partials)
+    return partials
+
+
+def select_granularity(config: dict, key: str) -> Optional[str]:
+    """
+    Granularity picked in the chart's selector, or None for charts without one.
+
+    Shown for time-based charts with config['granularity']: True starts at
+    the data's own level, a level name at that level.
+    """
+    if not config.get('granularity'):
+        return None
+    options = granularity_options(config['df'][config['x_field']])
+    if len(options) < 2:
+        return None
+    default = config['granularity'] if config['granularity'] in options else options[0]
+    level = st.segmented_control(
+        "Granularity",
+        options,
+        default=default,
+        format_func=str.title,
+        key=f"{key}_granularity",
+        label_visibility="collapsed",
+    )
+    # Deselecting the active option leaves no selection: keep the default
+    level = level or default
+    return None if level == options[0] else level
@@ -0,0 +1,120 @@
+"""Columnar store of the per-category series in a long frame
+
+Charts keep every series in one long frame (one row per x value and
+category). Taking a series out with df[df[category_field] == category]
+scans the whole frame, so a loop over K categories costs O(N * K), and
+most callers sort each slice by x again.
+
+SeriesStore sorts the rows once, by category and then x, and keeps
+CSR-style offsets: series i is order[offsets[i]:offsets[i + 1]]. Slices,
+columns in that order, and the first or last rows of every series are
+then views or single vectorized gathers.
+"""
+
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class SeriesStore:
+    """
+    Rows of df grouped into series by category_field, each sorted by x_field.
+
+    Without category_field the whole frame is one series. Rows with a missing
+    category are left out, as a comparison-based filter would; rows can also
+    be restricted to some categories (the others stay as empty series) or
+    with a boolean mask. Sorting is stable and puts missing x values last.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        x_field: str,
+        category_field: Optional[str] = None,
+        mask: Optional[np.ndarray] = None,
+        categories: Optional[list] = None,
+    ):
+        self.df = df
+        self.x_field = x_field
+        self.category_field = category_field
+        if category_field is None:
+            codes, self.labels = np.zeros(len(df), dtype=np.intp), np.array([None], dtype=object)
+        else:
+            codes, self.labels = pd.factorize(df[category_field].to_numpy(), sort=True)
+        kept = codes >= 0
+        if categories is not None:
+            kept &= np.append(pd.Index(self.labels).isin(categories), False)[codes]  # code -1 -> False
+        rows = np.flatnonzero(kept if mask is None else kept & mask)
+        by_x = rows[np.argsort(_sort_key(df[x_field].to_numpy())[rows], kind='stable')]
+        self.order = by_x[np.argsort(codes[by_x], kind='stable')]
+        self.offsets = np.r_[0, np.cumsum(np.bincount(codes[self.order], minlength=len(self.labels)))]
+        self._columns = {}
+
+    def __len__(self) -> int:
+        """Number of series (including empty ones left by the mask)."""
+        return len(self.labels)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def slices(self) -> list:
+        """Slice of each series into order and column()."""
+        return [slice(start, end) for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    def index(self, label) -> int:
+        """Position of the series with this category label (KeyError if absent)."""
+        position = int(np.searchsorted(self.labels, label)) if self.category_field else 0
+        if position == len(self.labels) or self.labels[position] != label:
+            raise KeyError(label)
+        return position
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of a column in store order, so each series is a contiguous slice."""
+        if name not in self._columns:
+            self._columns[name] = self.df[name].to_numpy()[self.order]
+        return self._columns[name]
+
+    def frame(self, i: int) -> pd.DataFrame:
+        """Rows of series i, sorted by x."""
+        return self.df.iloc[self.order[self.offsets[i]:self.offsets[i + 1]]]
+
+    def items(self) -> Iterator:
+        """(label, frame) for every non-empty series, in label order."""
+        for i, label in enumerate(self.labels):
+            if self.offsets[i + 1] > self.offsets[i]:
+                yield label, self.frame(i)
+
+    def head(self, n: int = 1) -> pd.DataFrame:
+        """First n rows of every series (fewer for short ones), grouped by series."""
+        return self.df.iloc[self.order[self._within(n, from_end=False)]]
+
+    def tail(self, n: int = 1) -> pd.DataFrame:
+        """Last n rows of every series (fewer for short ones), grouped by series."""
+        return self.df.iloc[self.order[self._within(n, from_end=True)]]
+
+    def ranks(self) -> np.ndarray:
+        """Position of each row of df within its series (-1 for rows outside the store)."""
+        ranks = np.full(len(self.df), -1, dtype=np.int64)
+        ranks[self.order] = np.arange(len(self.order)) - np.repeat(self.offsets[:-1], self.lengths)
+        return ranks
+
+    def _within(self, n: int, from_end: bool) -> np.ndarray:
+        """Store positions of the first (or last) n rows of every series."""
+        counts = np.minimum(self.lengths, max(n, 0))
+        starts = self.offsets[1:] - counts if from_end else self.offsets[:-1]
+        return np.repeat(starts - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+
+
+def _sort_key(values: np.ndarray) -> np.ndarray:
+    """Array whose stable argsort orders values ascending, missing values last."""
+    if values.dtype.kind in 'mM':
+        key = values.view(np.int64).copy()
+        key[np.isnat(values)] = np.iinfo(np.int64).max
+        return key
+    if values.dtype.kind in 'biuf':
+        return values
+    # Labels, dates as objects, mixed: rank by sorted distinct value
+    codes, _ = pd.factorize(values, sort=True)
+    return np.where(codes < 0, len(codes), codes)
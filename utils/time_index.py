@@ -0,0 +1,124 @@
+"""Sorted time indexes for slicing chart frames to a date range
+
+The dashboard-wide date range applies to every chart whose x values are
+dates. Rather than comparing every row of a frame against the range on each
+rerun, each (frame, x_field) gets a TimeIndex once: its x values as sorted
+int64 nanoseconds plus the row order. A range is then two binary searches
+(np.searchsorted) and a slice, so the work per rerun grows with the rows in
+the window, not with the frame.
+
+The range itself is picked once in the sidebar (select_date_range) and kept
+in the session; utils.filters applies it together with the attribute filters.
+"""
+
+import weakref
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.cache import LRUCache
+from utils.resample import to_datetime
+
+TIME_INDEX_CACHE_SIZE = 256  # One per chart dataset, plus frames replaced by refreshes
+
+DATE_RANGE_STATE = "dashboard_date_range"  # Session key of the picked (start, end), None for all dates
+
+_indexes = LRUCache(max_size=TIME_INDEX_CACHE_SIZE)
+
+
+class TimeIndex:
+    """x values of a frame sorted once, for binary-search range lookups."""
+
+    def __init__(self, x: np.ndarray):
+        times = x.view(np.int64)
+        valid = np.flatnonzero(~np.isnat(x))  # Missing dates are never inside a range
+        if len(valid) == len(times) and np.all(times[1:] >= times[:-1]):
+            self.order = None  # Already sorted: ranges are plain slices of the frame
+            self.times = times
+        else:
+            self.order = valid[np.argsort(times[valid], kind='stable')]
+            self.times = times[self.order]
+
+    def bounds(self) -> Optional[tuple]:
+        """(first, last) timestamp, or None when there is no date."""
+        if not len(self.times):
+            return None
+        return pd.Timestamp(self.times[0]), pd.Timestamp(self.times[-1])
+
+    def rows(self, start: pd.Timestamp, end: pd.Timestamp):
+        """Rows with start <= x < end: a slice, or sorted row positions."""
+        lo, hi = np.searchsorted(self.times, [start.value, end.value], side='left')
+        if self.order is None:
+            return slice(lo, hi)
+        return np.sort(self.order[lo:hi])  # Keep the frame's row order
+
+
+def time_index(df: pd.DataFrame, x_field: str) -> Optional[TimeIndex]:
+    """Cached TimeIndex of df[x_field], or None if x_field is not time-based."""
+    key = (id(df), x_field)
+    entry = _indexes.get(key)
+    # The id of a collected frame can be reused: check the entry is for this one
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    if x_field not in df.columns:
+        return None
+    x = to_datetime(df[x_field])
+    index = None if x is None else TimeIndex(x.to_numpy(dtype='datetime64[ns]'))
+    _indexes.set(key, (weakref.ref(df), index))
+    return index
+
+
+def window_rows(df: pd.DataFrame, x_field: str, start: pd.Timestamp, end: pd.Timestamp):
+    """
+    Rows of df with x on a day from start to end (inclusive): a slice or
+    sorted row positions. None when every row is kept or x is not time-based.
+    """
+    index = time_index(df, x_field)
+    if index is None:
+        return None
+    rows = index.rows(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize() + pd.Timedelta(days=1))
+    if isinstance(rows, slice):
+        whole = rows.start == 0 and rows.stop == len(df)
+    else:
+        whole = len(rows) == len(df)
+    return None if whole else rows
+
+
+def slice_frame(df: pd.DataFrame, x_field: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Rows of df with x on a day from start to end (inclusive); df itself if x is not time-based."""
+    rows = window_rows(df, x_field, start, end)
+    return df if rows is None else df.iloc[rows]
+
+
+def time_bounds(configs: list) -> Optional[tuple]:
+    """(first, last) date over the frames of every time-based chart config, or None if there is none."""
+    bounds = []
+    for config in configs:
+        if isinstance(config.get('df'), pd.DataFrame) and config.get('x_field'):
+            index = time_index(config['df'], config['x_field'])
+            if index is not None and index.bounds() is not None:
+                bounds.append(index.bounds())
+    if not bounds:
+        return None
+    return min(first for first, _ in bounds), max(last for _, last in bounds)
+
+
+def select_date_range(bounds: Optional[tuple]) -> None:
+    """Sidebar date-range control over bounds; the picked window applies to every time-based chart."""
+    window = None
+    if bounds is not None:
+        first, last = bounds[0].date(), bounds[1].date()
+        picked = st.sidebar.date_input(
+            "Date range",
+            value=(first, last),
+            min_value=first,
+            max_value=last,
+            key=f"{DATE_RANGE_STATE}_input",
+        )
+        # A range being picked has only its start date: keep showing everything until it is complete
+        if isinstance(picked, (tuple, list)) and len(picked) == 2 and (picked[0] > first or picked[1] < last):
+            window = (pd.Timestamp(picked[0]), pd.Timestamp(picked[1]))
+    st.session_state[DATE_RANGE_STATE] = window
+
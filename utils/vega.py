@@ -0,0 +1,211 @@
+"""Vega-Lite spec cache for Altair charts
+
+Building a chart means constructing many Altair objects, serializing them
+and validating the result. Charts whose data and options have not changed
+since the last rerun reuse the finished Vega-Lite dict instead; its data is
+stored as Arrow bytes, which st.vega_lite_chart passes through as-is.
+
+Charts that read named datasets are also compiled to templates: the spec
+without its data, built once per set of options and data "variant" (the
+facts about the data that change the spec's structure, such as category
+names). New data is then filled into the template without touching Altair.
+Set DASHBOARD_DEV_MODE=1 to rebuild and schema-validate every chart instead.
+
+Filled datasets carry only the columns the template references, with
+numbers rounded to display precision, whole numbers as small integers,
+midnight timestamps as dates and repeated labels dictionary-encoded.
+"""
+
+import json
+import os
+import re
+from typing import Callable
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.cache import LRUCache
+from utils.fingerprint import frame_fingerprint, make_key
+
+SPEC_CACHE_SIZE = 256  # Roughly every chart of every tab, in a couple of forecast states
+TEMPLATE_CACHE_SIZE = 256
+DISPLAY_DECIMALS = 2  # Rounding of sent values (overridable via config['display_decimals'])
+
+# Development mode: no templates, every chart goes through Altair's validation
+DEV_MODE = os.environ.get("DASHBOARD_DEV_MODE", "").lower() in ("1", "true", "yes")
+
+_specs = LRUCache(max_size=SPEC_CACHE_SIZE)
+_templates = LRUCache(max_size=TEMPLATE_CACHE_SIZE)
+
+# Containers whose children can carry their own data
+_COMPOSITE_ATTRS = ('layer', 'hconcat', 'vconcat', 'concat')
+
+# Field references inside Vega expressions (filters, conditions)
+_DATUM_FIELD = re.compile(r"datum\.([A-Za-z_$][\w$]*)|datum\[['\"](.+?)['\"]\]")
+
+
+def _options(config: dict) -> list:
+    """Every chart option except the source frame, in a stable order."""
+    return sorted(((key, value) for key, value in config.items() if key != 'df'), key=lambda item: item[0])
+
+
+def spec_key(kind: str, plot_df: pd.DataFrame, config: dict) -> str:
+    """Cache key from the plotted frame and every option except the source frame."""
+    return make_key(kind, frame_fingerprint(plot_df), _options(config))
+
+
+def cached_spec(key: str, build: Callable[[], dict]) -> dict:
+    """Return the Vega-Lite dict for key, calling build only on a miss."""
+    spec = _specs.get(key)
+    if spec is None:
+        spec = build()
+        _specs.set(key, spec)
+    return spec
+
+
+def template_spec(
+    kind: str,
+    config: dict,
+    variant: dict,
+    datasets: dict,
+    build: Callable[[], alt.TopLevelMixin],
+) -> dict:
+    """
+    Vega-Lite dict for a chart whose layers read named datasets.
+
+    build must depend only on config and variant; datasets maps each dataset
+    name to its frame. The template is compiled (without validation) the
+    first time a kind/config/variant combination is seen.
+    """
+    if DEV_MODE:
+        template, fields = _compile(build(), validate=True)
+    else:
+        key = make_key(kind, _options(config), sorted(variant.items()))
+        compiled = _templates.get(key)
+        if compiled is None:
+            compiled = _compile(build(), validate=False)
+            _templates.set(key, compiled)
+        template, fields = compiled
+    decimals = config.get('display_decimals', DISPLAY_DECIMALS)
+    return {
+        **template,
+        'datasets': {name: _to_arrow_bytes(compact_frame(frame, fields, decimals)) for name, frame in datasets.items()},
+    }
+
+
+def _compile(chart: alt.TopLevelMixin, validate: bool) -> tuple:
+    """Template spec plus the set of fields it reads."""
+    template = to_vega_lite(chart, validate=validate)
+    if template.pop('datasets'):
+        raise ValueError("Chart templates must read named datasets, not embed frames")
+    fields = set()
+    _collect_fields(template, fields)
+    return template, frozenset(fields)
+
+
+def _collect_fields(node, fields: set) -> None:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == 'field' and isinstance(value, str):
+                fields.add(value.replace('\\', ''))  # Vega-Lite escapes dots and brackets
+            elif key == 'fields' and isinstance(value, list):
+                fields.update(field for field in value if isinstance(field, str))
+            else:
+                _collect_fields(value, fields)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_fields(item, fields)
+    elif isinstance(node, str):
+        for dotted, bracketed in _DATUM_FIELD.findall(node):
+            fields.add(dotted or bracketed)
+
+
+def compact_frame(df: pd.DataFrame, fields, decimals: int = DISPLAY_DECIMALS) -> pd.DataFrame:
+    """
+    The columns of df named in fields, in the smallest types that display the same.
+
+    Floats are rounded to decimals and become nullable integers when whole;
+    timestamps at midnight become dates; text with repeats becomes categorical.
+    """
+    columns = {}
+    for name, series in df.items():
+        if str(name) not in fields:
+            continue
+        if pd.api.types.is_float_dtype(series):
+            series = _compact_numbers(series.round(decimals))
+        elif pd.api.types.is_datetime64_dtype(series):
+            # tz-naive only: aware timestamps keep their zone for the frontend
+            present = series.dropna()
+            if (present == present.dt.normalize()).all():
+                series = series.astype(pd.ArrowDtype(pa.date32()))
+        elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == 'string':
+            if series.nunique() * 2 <= len(series):
+                series = series.astype('category')
+        columns[name] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _compact_numbers(series: pd.Series) -> pd.Series:
+    values = series.to_numpy()
+    present = values[~np.isnan(values)]
+    if len(present) == 0 or not np.isfinite(present).all() or not (present == np.floor(present)).all():
+        return series
+    dtype = pd.to_numeric(pd.Series(present), downcast='integer').dtype
+    return series.astype(dtype.name.capitalize())  # e.g. int8 -> nullable Int8
+
+
+def to_vega_lite(chart: alt.TopLevelMixin, validate: bool = True) -> dict:
+    """
+    Serialize a chart the way st.altair_chart does, without global Altair state.
+
+    Frames are swapped for datasets named by content hash and holding Arrow
+    bytes, and the active theme's defaults are left out (Streamlit applies
+    its own theme).
+    """
+    datasets = {}
+    _name_datasets(chart, datasets)
+    spec = chart.to_dict(validate=validate)
+    _drop_theme_defaults(spec, alt.theme.get()())
+    # Sorted keys: equal charts give byte-identical JSON however they were built
+    spec = json.loads(json.dumps(spec, sort_keys=True))
+    spec['datasets'] = datasets
+    return spec
+
+
+def _name_datasets(chart, datasets: dict) -> None:
+    data = getattr(chart, 'data', alt.Undefined)
+    if isinstance(data, pd.DataFrame):
+        name = f"data-{frame_fingerprint(data)}"
+        if name not in datasets:
+            datasets[name] = _to_arrow_bytes(data)
+        chart.data = alt.NamedData(name=name)
+    for attr in _COMPOSITE_ATTRS:
+        for child in getattr(chart, attr, None) or []:
+            _name_datasets(child, datasets)
+
+
+def _to_arrow_bytes(df: pd.DataFrame) -> bytes:
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Mixed-type object columns (e.g. numbers and labels) are sent as text
+        mixed = {column: str for column in df.columns if df[column].dtype == object}
+        table = pa.Table.from_pandas(df.astype(mixed), preserve_index=False)
+    # The frontend reads types from the Arrow schema; pandas metadata is dead weight
+    table = table.replace_schema_metadata(None)
+    sink = pa.BufferOutputStream()
+    with pa.RecordBatchStreamWriter(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _drop_theme_defaults(spec: dict, theme: dict) -> None:
+    for key, value in theme.items():
+        if isinstance(value, dict) and isinstance(spec.get(key), dict):
+            _drop_theme_defaults(spec[key], value)
+            if not spec[key]:
+                del spec[key]
+        elif spec.get(key) == value:
+            del spec[key]